@@ -0,0 +1,70 @@
+import os
+import random
+import subprocess
+import sys
+
+import pytest
+
+import blackjack_utils.game_config as gc
+import generate_odds
+import house_edge
+from blackjack_utils.batch import simulate_batch
+from blackjack_utils.session import Session
+from blackjack_utils.shared_tables import SharedStrategyTables
+from blackjack_utils.strategy_table import StrategyTable
+
+GAME_CONFIG = gc.GameConfig(6, dealer_hit_soft_17=True, double_after_split=False, surrender_allowed=True, blackjack_pays=1.2)
+STRATEGY = StrategyTable.from_csv(os.path.join(os.path.dirname(__file__), '..', 'data2', GAME_CONFIG.odds_file_name()))
+
+HOUSE_EDGE_HANDS = 20_000
+CELL_HANDS = 5_000
+
+
+@pytest.fixture
+def tables():
+    with SharedStrategyTables(1) as tables:
+        tables.publish(0, STRATEGY)
+        yield tables
+
+
+def bench_house_edge(benchmark, tables):
+    # the hand by hand worker house_edge.py runs in each pool process
+    house_edge.init_worker(tables.name, GAME_CONFIG)
+    random.seed(0)
+    try:
+        benchmark(lambda: house_edge.run_simulation_batch((HOUSE_EDGE_HANDS, 0)), number=1, repeat=3, units=HOUSE_EDGE_HANDS, unit='hands')
+    finally:
+        house_edge._worker['tables'].close()
+
+
+def bench_house_edge_batch(benchmark):
+    benchmark(lambda: simulate_batch(GAME_CONFIG, STRATEGY, 200_000, seed=0), number=1, repeat=3, units=200_000, unit='hands')
+
+
+@pytest.mark.parametrize('player_total, worker', [('16', generate_odds.simulate_player_total_worker),
+                                                  ('paired_16', generate_odds.simulate_player_total_worker_splitable)])
+def bench_generate_odds_cell(benchmark, tables, player_total, worker):
+    # one (player total, dealer 10) cell of generate_odds.py, as a pool worker runs it
+    generate_odds.init_worker(tables.name, 1, [GAME_CONFIG], [0], generate_odds.ENGINE, seed=0, shoe_kind=generate_odds.SHOE)
+    try:
+        benchmark(lambda: worker((CELL_HANDS, 8, player_total, 0, 0)), number=1, repeat=3, units=CELL_HANDS, unit='hands')
+    finally:
+        generate_odds._worker['tables'].close()
+
+
+@pytest.mark.parametrize('num_seats', [1, 7])
+def bench_session(benchmark, num_seats):
+    # rounds dealt from one shoe until the cut card, so the shuffle is paid once per shoe
+    random.seed(0)
+    session = Session(GAME_CONFIG, STRATEGY, num_seats=num_seats)
+    rounds = HOUSE_EDGE_HANDS // num_seats
+    benchmark(lambda: session.play(rounds), number=1, repeat=3, units=rounds * num_seats, unit='hands')
+
+
+@pytest.mark.parametrize('module', ['blackjack_utils.utils', 'generate_odds', 'pandas'])
+def bench_import(benchmark, module):
+    # a fresh interpreter importing the module, what every spawned pool worker pays before its first hand.
+    # The engine and the worker scripts must not pull in pandas (pandas itself is timed for comparison)
+    check = f"import sys, {module}; assert {module == 'pandas'} or 'pandas' not in sys.modules, 'pandas was imported'"
+    benchmark(lambda: subprocess.run([sys.executable, '-c', check], check=True, cwd=os.path.join(os.path.dirname(__file__), '..')),
+              number=1, repeat=5, unit='imports')
@@ -0,0 +1,74 @@
+import os
+import random
+
+import pytest
+
+import blackjack_utils.game_config as gc
+import blackjack_utils.shoe as shoe
+from blackjack_utils.card import Card
+from blackjack_utils.compact import HandState
+from blackjack_utils.strategy_table import StrategyTable
+from blackjack_utils.utils import simulate_hand, build_combos
+
+GAME_CONFIG = gc.GameConfig(6, dealer_hit_soft_17=True, double_after_split=True, surrender_allowed=True, blackjack_pays=1.5)
+STRATEGY = StrategyTable.from_csv(os.path.join(os.path.dirname(__file__), '..', 'data2', GAME_CONFIG.odds_file_name()))
+
+
+def cards(*ranks):
+    return [Card().from_ints(rank, 0) for rank in ranks]
+
+
+@pytest.fixture(autouse=True)
+def seed():
+    random.seed(0)
+
+
+def bench_score_hand(benchmark):
+    hand = cards(12, 5, 9)
+    benchmark(lambda: GAME_CONFIG.score_hand(hand), number=100_000)
+
+
+def bench_does_dealer_hit(benchmark):
+    hand = cards(12, 4)
+    benchmark(lambda: GAME_CONFIG.does_dealer_hit(hand), number=100_000)
+
+
+def bench_evaluate(benchmark):
+    deck = shoe.LazyShoe(6)
+    deck.mark()
+
+    def evaluate():
+        deck.reset()
+        GAME_CONFIG.evaluate(cards(11, 7), cards(8, 4), deck)
+
+    benchmark(evaluate, number=20_000)
+
+
+def bench_shoe_construct_shuffle(benchmark):
+    def construct_shuffle():
+        shoe.Shoe(6).shuffle()
+
+    benchmark(construct_shuffle, number=200)
+
+
+@pytest.mark.parametrize('engine', ['cards', 'compact'])
+@pytest.mark.parametrize('action', ['stand', 'hit', 'double', 'split'])
+def bench_simulate_hand(benchmark, action, engine):
+    # an 8-8 against a 6, with the first decision forced to the action
+    strategy = STRATEGY.with_action('paired_16', action)
+    deck = shoe.LazyShoe(6, compact=engine == 'compact')
+    deck.mark()
+    if engine == 'compact':
+        player_cards, dealer_card_up = HandState.from_ranks(6, 6), 4
+    else:
+        player_cards, dealer_card_up = cards(6, 6), Card().from_ints(4, 0)
+
+    def play():
+        deck.reset()
+        simulate_hand(GAME_CONFIG, player_cards, dealer_card_up, deck, strategy, ignore_dealer_blackjack=True)
+
+    benchmark(play, number=10_000, unit='hands')
+
+
+def bench_build_combos(benchmark):
+    benchmark(build_combos, number=5)
@@ -0,0 +1,107 @@
+import json
+import os
+import platform
+import time
+import timeit
+
+import pytest
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup('benchmark')
+    group.addoption('--benchmark-json', default=os.path.join(BENCHMARK_DIR, 'results.json'),
+                    help='File the results are written to (default: benchmarks/results.json)')
+    group.addoption('--benchmark-baseline', default=os.path.join(BENCHMARK_DIR, 'baseline.json'),
+                    help='Results file to compare against (default: benchmarks/baseline.json)')
+    group.addoption('--benchmark-save-baseline', action='store_true',
+                    help='Write the results to the baseline file too, instead of comparing against it')
+    group.addoption('--benchmark-tolerance', type=float, default=0.3,
+                    help='Fraction below the baseline rate a benchmark may run before it fails (default: 0.3)')
+
+
+def _load_results(file_name):
+    if not os.path.exists(file_name):
+        return {}
+    with open(file_name) as f:
+        return json.load(f)['benchmarks']
+
+
+def pytest_configure(config):
+    config._benchmark_results = {}
+    config._benchmark_baseline = {} if config.getoption('--benchmark-save-baseline') else _load_results(config.getoption('--benchmark-baseline'))
+
+
+def _write_results(file_name, results):
+    report = {
+        'machine': {'python': platform.python_version(), 'platform': platform.platform(), 'processor': platform.processor(), 'cpu_count': os.cpu_count()},
+        'created': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'benchmarks': results,
+    }
+    with open(file_name, 'w') as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+
+
+def pytest_sessionfinish(session):
+    config = session.config
+    results = getattr(config, '_benchmark_results', None)
+    if not results:
+        return
+    _write_results(config.getoption('--benchmark-json'), results)
+    if config.getoption('--benchmark-save-baseline'):
+        _write_results(config.getoption('--benchmark-baseline'), results)
+
+
+def pytest_terminal_summary(terminalreporter, config):
+    results = getattr(config, '_benchmark_results', None)
+    if not results:
+        return
+    baseline = config._benchmark_baseline
+    terminalreporter.section('benchmarks')
+    for name, result in sorted(results.items()):
+        line = f"{name:<60} {result['rate']:>14,.0f} {result['unit']}/s"
+        if name in baseline:
+            line += f"  ({result['rate'] / baseline[name]['rate'] - 1:+.1%} vs baseline)"
+        elif not config.getoption('--benchmark-save-baseline'):
+            line += "  (no baseline)"
+        terminalreporter.write_line(line)
+
+
+class Benchmark:
+    """
+    Times a function (best of repeat runs of number calls) and records its rate under the test's name.
+    Fails the test if the rate is more than the tolerance below the baseline's, or if the baseline has no rate for it
+    (record one with --benchmark-save-baseline when adding a benchmark).
+    """
+
+    def __init__(self, request):
+        self.name = request.node.name
+        self.config = request.config
+
+    def __call__(self, function, number=1000, repeat=5, units=1, unit='calls'):
+        """
+        :param function: called with no arguments
+        :param number: calls per timed run
+        :param repeat: timed runs, the fastest one is kept
+        :param units: work done per call (e.g. hands played), the rate is units per second
+        :param unit: what units counts, for the report
+        :return: the rate in units per second
+        """
+        best = min(timeit.repeat(function, number=number, repeat=repeat))
+        rate = number * units / best
+        self.config._benchmark_results[self.name] = {'rate': rate, 'unit': unit, 'seconds_per_call': best / number, 'number': number, 'repeat': repeat}
+        if self.config.getoption('--benchmark-save-baseline'):
+            return rate
+        baseline = self.config._benchmark_baseline.get(self.name)
+        if baseline is None:
+            pytest.fail(f"{self.name} has no rate in the baseline {self.config.getoption('--benchmark-baseline')}, record one with --benchmark-save-baseline")
+        tolerance = self.config.getoption('--benchmark-tolerance')
+        if rate < baseline['rate'] * (1 - tolerance):
+            pytest.fail(f"{self.name} ran at {rate:,.0f} {unit}/s, {1 - rate / baseline['rate']:.0%} below the baseline {baseline['rate']:,.0f} {unit}/s")
+        return rate
+
+
+@pytest.fixture
+def benchmark(request):
+    return Benchmark(request)
@@ -0,0 +1,205 @@
+import numpy as np
+
+import blackjack_utils.game_config as gc
+from blackjack_utils.strategy_table import StrategyTable, STAND, HIT, DOUBLE, SPLIT, SURRENDER, SOFT_OFFSET, PAIRED_OFFSET, PAIRED_ACES, NUM_UPCARDS
+
+# card values 2-11, counts are indexed by value - 2
+NUM_VALUES = 10
+# most hands a single starting hand can be split into, further splits are played as hits
+MAX_HANDS = 8
+
+
+class BatchResult:
+    def __init__(self, num_hands: int, total: float, total_squares: float, histogram: dict):
+        self.num_hands = num_hands
+        self.total = total
+        self.total_squares = total_squares
+        self.histogram = histogram
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.num_hands
+
+    @property
+    def standard_error(self) -> float:
+        variance = (self.total_squares - self.total * self.total / self.num_hands) / (self.num_hands - 1)
+        return float(np.sqrt(max(variance, 0.0) / self.num_hands))
+
+    def __str__(self):
+        return f"mean: {self.mean:.6f}, standard error: {self.standard_error:.6f}, hands: {self.num_hands:,}"
+
+
+def shoe_counts(decks_in_shoe: int) -> np.ndarray:
+    """
+    :return: number of cards of each value (2-11) in a fresh shoe
+    """
+    counts = np.full(NUM_VALUES, 4 * decks_in_shoe, dtype=np.int16)
+    counts[8] = 16 * decks_in_shoe
+    return counts
+
+
+def _draw(counts: np.ndarray, rows: np.ndarray, rng: np.random.Generator) -> np.ndarray:
+    """
+    Draws one card without replacement from each row's shoe (rows must be unique)
+    :return: the values of the cards drawn
+    """
+    cumulative = np.cumsum(counts[rows], axis=1)
+    picks = (rng.random(len(rows)) * cumulative[:, -1]).astype(np.int64)
+    indexes = (cumulative <= picks[:, None]).sum(axis=1)
+    counts[rows, indexes] -= 1
+    return indexes + 2
+
+
+def _add_card(total: np.ndarray, soft: np.ndarray, values: np.ndarray):
+    """adds card values to (total, soft ace) hand state arrays in place"""
+    total += values
+    soft += values == 11
+    for _ in range(2):
+        adjust = (total > 21) & (soft > 0)
+        total -= 10 * adjust
+        soft -= adjust
+
+
+def _hand_classes(total, soft, paired, first_value):
+    """vectorized strategy_table.hand_class"""
+    is_soft = (total > 10) & (soft > 0)
+    classes = np.where(is_soft, SOFT_OFFSET + total - 12, total - 2)
+    classes = np.where(paired, PAIRED_OFFSET + total // 2 - 1, classes)
+    return np.where(paired & (first_value == 11), PAIRED_ACES, classes)
+
+
+def _play_batch(game_config: gc.GameConfig, actions: np.ndarray, num_hands: int, rng: np.random.Generator, ignore_dealer_blackjack: bool) -> np.ndarray:
+    """
+    Plays num_hands hands from fresh shoes the same way simulate_hand does (each split hand is settled
+    against its own dealer hole card, splits can be resplit, surrender pays -0.5)
+    :return: the outcome of each hand
+    """
+    counts = np.tile(shoe_counts(game_config.decks_in_shoe), (num_hands, 1))
+    all_rows = np.arange(num_hands)
+
+    shape = (num_hands, MAX_HANDS)
+    total = np.zeros(shape, dtype=np.int16)
+    soft = np.zeros(shape, dtype=np.int16)
+    num_cards = np.zeros(shape, dtype=np.int16)
+    first_value = np.zeros(shape, dtype=np.int16)
+    paired = np.zeros(shape, dtype=bool)
+    multiplier = np.ones(shape, dtype=np.float64)
+    active = np.zeros(shape, dtype=bool)
+    finished = np.zeros(shape, dtype=bool)
+    outcome = np.zeros(shape, dtype=np.float64)
+    num_slots = np.ones(num_hands, dtype=np.int64)
+
+    def deal(rows, slots, values):
+        t, s = total[rows, slots], soft[rows, slots]
+        _add_card(t, s, values)
+        total[rows, slots], soft[rows, slots] = t, s
+        n = num_cards[rows, slots] + 1
+        num_cards[rows, slots] = n
+        paired[rows, slots] = (n == 2) & (values == first_value[rows, slots])
+        first_value[rows, slots] = np.where(n == 1, values, first_value[rows, slots])
+
+    # starting cards, slot 0 of every hand
+    zeros = np.zeros(num_hands, dtype=np.int64)
+    deal(all_rows, zeros, _draw(counts, all_rows, rng))
+    deal(all_rows, zeros, _draw(counts, all_rows, rng))
+    dealer_card_up = _draw(counts, all_rows, rng)
+    active[:, 0] = True
+
+    while active.any():
+        for slot in range(MAX_HANDS):
+            rows = np.flatnonzero(active[:, slot])
+            if len(rows) == 0:
+                continue
+            slots = np.full(len(rows), slot)
+            t = total[rows, slot]
+            codes = actions[_hand_classes(t, soft[rows, slot], paired[rows, slot], first_value[rows, slot]) * NUM_UPCARDS + dealer_card_up[rows] - 2]
+            codes = np.where(t > 20, STAND, codes)
+            # out of room for another hand, hit instead
+            codes = np.where((codes == SPLIT) & (num_slots[rows] >= MAX_HANDS), HIT, codes)
+
+            stand = rows[codes == STAND]
+            active[stand, slot] = False
+            finished[stand, slot] = True
+
+            surrender = rows[codes == SURRENDER]
+            active[surrender, slot] = False
+            outcome[surrender, slot] = -0.5
+
+            hit = rows[(codes == HIT) | (codes == DOUBLE)]
+            deal(hit, slots[:len(hit)], _draw(counts, hit, rng))
+            double = rows[codes == DOUBLE]
+            multiplier[double, slot] = 2
+            done = np.union1d(double, hit[total[hit, slot] > 20])
+            active[done, slot] = False
+            finished[done, slot] = True
+
+            split = rows[codes == SPLIT]
+            if len(split):
+                new_slots = num_slots[split]
+                num_slots[split] += 1
+                pair_value = first_value[split, slot]
+                for rows_, slots_ in ((split, np.full(len(split), slot)), (split, new_slots)):
+                    total[rows_, slots_] = 0
+                    soft[rows_, slots_] = 0
+                    num_cards[rows_, slots_] = 0
+                    deal(rows_, slots_, pair_value)
+                    deal(rows_, slots_, _draw(counts, rows_, rng))
+                active[split, new_slots] = True
+
+    # dealer plays out a hole card against each finished hand
+    for slot in range(MAX_HANDS):
+        rows = np.flatnonzero(finished[:, slot])
+        if len(rows) == 0:
+            continue
+        dealer_total = dealer_card_up[rows].astype(np.int16)
+        dealer_soft = (dealer_total == 11).astype(np.int16)
+        _add_card(dealer_total, dealer_soft, _draw(counts, rows, rng))
+        dealer_blackjack = dealer_total == 21
+        while True:
+            hits = (dealer_total < 17) | ((dealer_total == 17) & (dealer_soft > 0) & game_config.dealer_hit_soft_17)
+            if not hits.any():
+                break
+            hit_rows = np.flatnonzero(hits)
+            t, s = dealer_total[hit_rows], dealer_soft[hit_rows]
+            _add_card(t, s, _draw(counts, rows[hit_rows], rng))
+            dealer_total[hit_rows], dealer_soft[hit_rows] = t, s
+
+        player_total = total[rows, slot]
+        player_blackjack = (num_cards[rows, slot] == 2) & (player_total == 21)
+        result = np.select(
+            [player_blackjack & dealer_blackjack, player_blackjack, dealer_blackjack,
+             player_total > 21, dealer_total > 21, player_total > dealer_total, player_total < dealer_total],
+            [0, game_config.blackjack_pays, 0 if ignore_dealer_blackjack else -1,
+             -1, 1, 1, -1],
+            0)
+        outcome[rows, slot] = multiplier[rows, slot] * result
+
+    return outcome.sum(axis=1)
+
+
+def simulate_batch(game_config: gc.GameConfig, strategy: StrategyTable, num_hands: int, batch_size=250_000, seed=None, ignore_dealer_blackjack=False) -> BatchResult:
+    """
+    Plays num_hands hands (each from a fresh shoe) as arrays, batch_size hands at a time
+    :param game_config: the game rules
+    :param strategy: the strategy to play (see StrategyTable.from_csv)
+    :param num_hands: the number of hands to play
+    :param batch_size: hands played at once, bounds memory use
+    :param seed: seed for the numpy random generator
+    :return: BatchResult with the mean, standard error and outcome histogram
+    """
+    rng = np.random.default_rng(seed)
+    actions = np.frombuffer(strategy.actions, dtype=np.int8).astype(np.int64)
+    total = 0.0
+    total_squares = 0.0
+    histogram = {}
+    remaining = num_hands
+    while remaining > 0:
+        size = min(batch_size, remaining)
+        outcomes = _play_batch(game_config, actions, size, rng, ignore_dealer_blackjack)
+        total += float(outcomes.sum())
+        total_squares += float((outcomes * outcomes).sum())
+        values, value_counts = np.unique(outcomes.round(6), return_counts=True)
+        for value, count in zip(values.tolist(), value_counts.tolist()):
+            histogram[value] = histogram.get(value, 0) + count
+        remaining -= size
+    return BatchResult(num_hands, total, total_squares, dict(sorted(histogram.items())))
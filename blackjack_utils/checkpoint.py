@@ -0,0 +1,115 @@
+import json
+import os
+import time
+from typing import Dict, Tuple
+
+from blackjack_utils.stats import CellStats
+
+
+class RunCheckpoint:
+    """
+    Checkpoint of an odds table run, kept next to the output csv:
+      <output>.manifest.json - the run's config and seed, written once when the run starts
+      <output>.cells.jsonl   - append-only log with one line per finished (player_total, dealer_card_up) cell
+    Each finished cell costs one appended line, so a crash loses at most the cells that were still running,
+    and the output csv can be rebuilt from the log at any time.
+    """
+
+    def __init__(self, output_file_name: str):
+        """
+        :param output_file_name: the odds csv the run writes
+        """
+        self.manifest_path = f"{output_file_name}.manifest.json"
+        self.log_path = f"{output_file_name}.cells.jsonl"
+        self._log = None
+
+    def exists(self) -> bool:
+        return os.path.exists(self.manifest_path)
+
+    def load_manifest(self) -> dict:
+        with open(self.manifest_path) as f:
+            return json.load(f)
+
+    def start(self, config: dict, seed: int):
+        """
+        Writes the manifest for a new run (replacing any old checkpoint)
+        :param config: the settings that must match for the run to be resumed
+        :param seed: the run's random seed
+        """
+        self.discard()
+        manifest = {'config': config, 'seed': seed, 'log': os.path.basename(self.log_path), 'started': time.strftime('%Y-%m-%d %H:%M:%S')}
+        temp_path = f"{self.manifest_path}.tmp"
+        with open(temp_path, 'w') as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(temp_path, self.manifest_path)
+
+    def completed_cells(self) -> Dict[Tuple[str, str], dict]:
+        """
+        :return: (player_total, dealer_card_up) -> row for every cell in the log (a later line for a cell replaces an earlier one)
+        """
+        cells = {}
+        if not os.path.exists(self.log_path):
+            return cells
+        with open(self.log_path) as f:
+            for line in f:
+                try:
+                    row = json.loads(line)
+                except json.JSONDecodeError:
+                    # a line cut short by a crash, the cell gets rerun
+                    continue
+                cells[(row['player_total'], row['dealer_card_up'])] = row
+        return cells
+
+    def append(self, row: dict):
+        """
+        Logs a finished cell, and flushes it to disk before returning
+        :param row: odds row with (at least) player_total and dealer_card_up
+        """
+        if self._log is None:
+            self._log = open(self.log_path, 'a')
+        self._log.write(json.dumps(row) + '\n')
+        self._log.flush()
+        os.fsync(self._log.fileno())
+
+    def close(self):
+        if self._log is not None:
+            self._log.close()
+            self._log = None
+
+    def discard(self):
+        """Removes the manifest and log"""
+        self.close()
+        for path in (self.manifest_path, self.log_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def stats_path(output_file_name: str) -> str:
+    """:return: the file next to an odds csv with its cells' sufficient statistics"""
+    return f"{output_file_name}.stats.jsonl"
+
+
+def write_cell_stats(output_file_name: str, cells: Dict[Tuple[str, str], CellStats]):
+    """
+    Writes the sufficient statistics of an odds table's cells, one line per (player_total, dealer_card_up) cell
+    :param cells: (player_total, dealer_card_up) -> CellStats
+    """
+    temp_path = f"{stats_path(output_file_name)}.tmp"
+    with open(temp_path, 'w') as f:
+        for (player_total, dealer_card_up), cell_stats in cells.items():
+            f.write(json.dumps({'player_total': player_total, 'dealer_card_up': dealer_card_up, **cell_stats.to_dict()}) + '\n')
+    os.replace(temp_path, stats_path(output_file_name))
+
+
+def read_cell_stats(output_file_name: str) -> Dict[Tuple[str, str], CellStats]:
+    """
+    :return: (player_total, dealer_card_up) -> CellStats for an odds csv (empty if it has no stats file)
+    """
+    cells = {}
+    if not os.path.exists(stats_path(output_file_name)):
+        return cells
+    with open(stats_path(output_file_name)) as f:
+        for line in f:
+            data = json.loads(line)
+            cells[(data['player_total'], data['dealer_card_up'])] = CellStats.from_dict(data)
+    return cells
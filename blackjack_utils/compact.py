@@ -0,0 +1,134 @@
+from array import array
+from typing import List
+import random
+
+# value of each rank (0 indexed, "2" = 0, "A" = 12), same encoding as Card.rank
+RANK_VALUES = [2, 3, 4, 5, 6, 7, 8, 9, 10, 10, 10, 10, 11]
+ACE = 12
+
+
+class CompactShoe:
+    """
+    Shoe stored as a flat array of rank ints instead of Card objects.
+    Has the same draw/remove/shuffle/len API as Shoe, but draw and remove work with ranks.
+    """
+    __slots__ = ('ranks',)
+
+    _templates = {}
+
+    def __init__(self, decks_in_shoe=6):
+        """
+        :param decks_in_shoe: the number of 52 card decks in the shoe
+        Initializes an (unshuffled) shoe in the same card order as Shoe
+        """
+        template = self._templates.get(decks_in_shoe)
+        if template is None:
+            template = array('b', range(13)) * (4 * decks_in_shoe)
+            self._templates[decks_in_shoe] = template
+        self.ranks = array('b', template)
+
+    def shuffle(self):
+        random.shuffle(self.ranks)
+
+    def draw(self) -> int:
+        """
+        :return: the rank of the card drawn
+        """
+        return self.ranks.pop()
+
+    def draw_excluding(self, ranks) -> int:
+        """
+        Removes a random card whose rank isn't in ranks, from a random position so the ranks left stay in random order
+        :return: the rank of the card drawn
+        """
+        if all(rank in ranks for rank in self.ranks):
+            raise IndexError("no card left outside the excluded ranks")
+        while True:
+            index = random.randrange(len(self.ranks))
+            if self.ranks[index] not in ranks:
+                return self.ranks.pop(index)
+
+    def remove(self, rank: int):
+        """
+        Removes a card of the given rank from the shoe
+        :param rank: the rank to be removed
+        """
+        self.ranks.remove(rank)
+
+    def copy(self):
+        shoe = CompactShoe.__new__(CompactShoe)
+        shoe.ranks = array('b', self.ranks)
+        return shoe
+
+    def __len__(self):
+        return len(self.ranks)
+
+
+class HandState:
+    """
+    Running state of a hand, updated in O(1) per card instead of re-scoring the card list.
+    total is the best score (aces counted as 11 where they fit), soft_aces is the number of aces still counted as 11.
+    """
+    __slots__ = ('total', 'soft_aces', 'num_cards', 'first_rank', 'is_paired')
+
+    def __init__(self):
+        self.total = 0
+        self.soft_aces = 0
+        self.num_cards = 0
+        self.first_rank = -1
+        self.is_paired = False
+
+    @classmethod
+    def from_ranks(cls, *ranks: int):
+        hand = cls()
+        for rank in ranks:
+            hand.add(rank)
+        return hand
+
+    @classmethod
+    def from_cards(cls, cards: List):
+        """
+        :param cards: list of Card
+        :return: the HandState for the cards
+        """
+        return cls.from_ranks(*(card.rank for card in cards))
+
+    def add(self, rank: int):
+        """
+        Adds a card to the hand
+        :param rank: rank of the card
+        """
+        value = RANK_VALUES[rank]
+        self.total += value
+        if value == 11:
+            self.soft_aces += 1
+        while self.total > 21 and self.soft_aces > 0:
+            self.total -= 10
+            self.soft_aces -= 1
+        self.num_cards += 1
+        if self.num_cards == 1:
+            self.first_rank = rank
+        else:
+            self.is_paired = self.num_cards == 2 and value == RANK_VALUES[self.first_rank]
+
+    # so dealer play can append cards the same way as with a list of Card
+    append = add
+
+    def is_soft(self) -> bool:
+        """same as utils.is_soft_count"""
+        return self.total > 10 and self.soft_aces > 0
+
+    def is_blackjack(self) -> bool:
+        return self.num_cards == 2 and self.total == 21
+
+    def copy(self):
+        hand = HandState.__new__(HandState)
+        hand.total = self.total
+        hand.soft_aces = self.soft_aces
+        hand.num_cards = self.num_cards
+        hand.first_rank = self.first_rank
+        hand.is_paired = self.is_paired
+        return hand
+
+    def __len__(self):
+        return self.num_cards
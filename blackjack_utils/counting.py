@@ -0,0 +1,140 @@
+import csv
+import math
+
+from blackjack_utils.strategy_table import StrategyTable, HAND_LABELS, UPCARD_VALUES
+
+# tag of each rank (0 indexed, "2" = 0, "A" = 12, same as Card.rank) for each counting system
+COUNT_SYSTEMS = {
+    'hi_lo': (1, 1, 1, 1, 1, 0, 0, 0, -1, -1, -1, -1, -1),
+    'hi_opt_i': (0, 1, 1, 1, 1, 0, 0, 0, -1, -1, -1, -1, 0),
+    'hi_opt_ii': (1, 1, 2, 2, 1, 1, 0, 0, -2, -2, -2, -2, 0),
+    'omega_ii': (1, 1, 2, 2, 2, 1, 0, -1, -2, -2, -2, -2, 0),
+    'zen': (1, 1, 2, 2, 2, 1, 0, 0, -2, -2, -2, -2, -1),
+}
+
+
+def count_bucket(true_count: float, max_bucket: int) -> int:
+    """
+    :return: the true count rounded down, clipped to -max_bucket..max_bucket (the end buckets take the tails)
+    """
+    return max(-max_bucket, min(max_bucket, math.floor(true_count)))
+
+
+class CountingShoe:
+    """
+    Wraps a shoe (Shoe, CompactShoe, LazyShoe or CountShoe) and keeps a running count of every card drawn or removed
+    from it, so the count is always the count of the cards that have left the shoe.
+    Same draw/remove/shuffle/len API as the shoe it wraps.
+    """
+    __slots__ = ('shoe', 'tags', 'running_count')
+
+    def __init__(self, deck, count_system='hi_lo'):
+        """
+        :param deck: the shoe to count, before any cards are dealt from it
+        :param count_system: a COUNT_SYSTEMS name, or 13 tags (one per rank)
+        """
+        self.shoe = deck
+        self.tags = COUNT_SYSTEMS[count_system] if isinstance(count_system, str) else tuple(count_system)
+        if len(self.tags) != 13:
+            raise ValueError(f"a count system needs a tag for each of the 13 ranks, got {len(self.tags)}")
+        self.running_count = 0
+
+    def _rank(self, card) -> int:
+        return card if isinstance(card, int) else card.rank
+
+    def draw(self):
+        """
+        Draws a card from the shoe and counts it
+        :return: the card drawn
+        """
+        card = self.shoe.draw()
+        self.running_count += self.tags[card if isinstance(card, int) else card.rank]
+        return card
+
+    def remove(self, card):
+        """
+        Removes a specific card from the shoe and counts it
+        """
+        self.shoe.remove(card)
+        self.running_count += self.tags[self._rank(card)]
+
+    def shuffle(self):
+        """Shuffles the shoe, the count starts over"""
+        self.shoe.shuffle()
+        self.running_count = 0
+
+    @property
+    def decks_left(self) -> float:
+        return len(self.shoe) / 52
+
+    @property
+    def true_count(self) -> float:
+        """running count per deck left in the shoe"""
+        return self.running_count / self.decks_left if len(self.shoe) else 0.0
+
+    def copy(self):
+        counting = CountingShoe.__new__(CountingShoe)
+        counting.shoe = self.shoe.copy()
+        counting.tags = self.tags
+        counting.running_count = self.running_count
+        return counting
+
+    def __len__(self):
+        return len(self.shoe)
+
+
+class CountStrategyTable:
+    """
+    StrategyTables indexed by true count bucket, built from a count bucketed odds table
+    (count_bucket, player_total, dealer_card_up, best_action rows, see generate_odds.py --true_count).
+    Cells a bucket's table doesn't have are taken from the fallback strategy.
+    """
+
+    def __init__(self, tables: dict, max_bucket: int, fallback: StrategyTable = None):
+        """
+        :param tables: count bucket -> StrategyTable
+        :param max_bucket: the largest bucket (true counts past it use the end buckets)
+        :param fallback: the table used for a bucket that has no rows
+        """
+        self.tables = tables
+        self.max_bucket = max_bucket
+        self.fallback = fallback if fallback is not None else StrategyTable()
+
+    @classmethod
+    def from_rows(cls, rows, fallback: StrategyTable = None):
+        """
+        :param rows: iterable of (count_bucket, player_total, dealer_card_up, best_action)
+        :param fallback: strategy for the cells missing from a bucket (default: stand)
+        :return: the CountStrategyTable
+        """
+        grouped = {}
+        for bucket, player_total, dealer_card_up, best_action in rows:
+            grouped.setdefault(int(float(bucket)), []).append((player_total, dealer_card_up, best_action))
+        # the bucket's rows come first, so they win over the fallback's (StrategyTable.from_rows keeps the first row)
+        fallback_rows = list(_table_rows(fallback)) if fallback is not None else []
+        tables = {bucket: StrategyTable.from_rows(bucket_rows + fallback_rows) for bucket, bucket_rows in grouped.items()}
+        return cls(tables, max(abs(bucket) for bucket in tables) if tables else 0, fallback)
+
+    @classmethod
+    def from_csv(cls, file_name: str, fallback: StrategyTable = None, min_samples: int = 0):
+        """
+        :param file_name: count bucketed odds csv (count_bucket,player_total,dealer_card_up,...,best_action)
+        :param min_samples: cells with fewer samples than this are left to the fallback
+        :return: the CountStrategyTable
+        """
+        with open(file_name, newline='') as f:
+            return cls.from_rows(((row['count_bucket'], row['player_total'], row['dealer_card_up'], row['best_action'])
+                                  for row in csv.DictReader(f) if int(row.get('samples') or 0) >= min_samples), fallback)
+
+    def table(self, true_count: float) -> StrategyTable:
+        """
+        :return: the StrategyTable for the true count's bucket
+        """
+        return self.tables.get(count_bucket(true_count, self.max_bucket), self.fallback)
+
+
+def _table_rows(table: StrategyTable):
+    """every (label, dealer card value, best action) of a StrategyTable"""
+    for label in HAND_LABELS:
+        for dealer_card_value in UPCARD_VALUES:
+            yield label, dealer_card_value, table.best_action(label, dealer_card_value)
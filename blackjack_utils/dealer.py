@@ -0,0 +1,136 @@
+from functools import lru_cache
+from typing import Tuple
+
+# dealer outcomes, in the order of the distribution tuples
+DEALER_OUTCOMES = ['17', '18', '19', '20', '21', 'bust', 'blackjack']
+BUST = 5
+BLACKJACK = 6
+
+# card values 2-11, counts tuples are indexed by value - 2
+CARD_VALUES = list(range(2, 12))
+
+
+def shoe_value_counts(decks_in_shoe=6) -> Tuple[int, ...]:
+    """
+    :return: number of cards of each value (2-11) in a fresh shoe
+    """
+    counts = [4 * decks_in_shoe] * len(CARD_VALUES)
+    counts[10 - 2] = 16 * decks_in_shoe
+    return tuple(counts)
+
+
+def remove_values(counts: Tuple[int, ...], *values: int) -> Tuple[int, ...]:
+    """
+    :param counts: value counts (see shoe_value_counts)
+    :param values: card values (2-11) to take out of the shoe
+    :return: the remaining value counts
+    """
+    counts = list(counts)
+    for value in values:
+        counts[value - 2] -= 1
+    return tuple(counts)
+
+
+def no_blackjack_probability(counts: Tuple[int, ...], up_card_value: int) -> float:
+    """
+    :param counts: value counts left in the shoe, with the up card already taken out
+    :param up_card_value: value of the dealer up card (2-11)
+    :return: the probability the hole card doesn't give the dealer blackjack
+    """
+    if up_card_value == 11:
+        return 1 - counts[10 - 2] / sum(counts)
+    if up_card_value == 10:
+        return 1 - counts[11 - 2] / sum(counts)
+    return 1.0
+
+
+def _add_value(total: int, soft: bool, value: int):
+    """adds a card value to a (total, soft) hand, soft meaning an ace is counted as 11"""
+    total += value
+    if value == 11:
+        if soft:
+            total -= 10
+        else:
+            soft = True
+    if total > 21 and soft:
+        total -= 10
+        soft = False
+    return total, soft
+
+
+@lru_cache(maxsize=None)
+def _dealer_play(counts: Tuple[int, ...], total: int, soft: bool, dealer_hit_soft_17: bool) -> Tuple[float, ...]:
+    """
+    :return: distribution over 17, 18, 19, 20, 21, bust for a dealer holding (total, soft) with counts left in the shoe
+    """
+    if total > 21:
+        return (0.0, 0.0, 0.0, 0.0, 0.0, 1.0)
+    if total > 17 or (total == 17 and not (soft and dealer_hit_soft_17)):
+        distribution = [0.0] * 6
+        distribution[total - 17] = 1.0
+        return tuple(distribution)
+
+    remaining = sum(counts)
+    distribution = [0.0] * 6
+    for index, count in enumerate(counts):
+        if count == 0:
+            continue
+        next_counts = counts[:index] + (count - 1,) + counts[index + 1:]
+        probability = count / remaining
+        next_total, next_soft = _add_value(total, soft, index + 2)
+        for outcome, outcome_probability in enumerate(_dealer_play(next_counts, next_total, next_soft, dealer_hit_soft_17)):
+            distribution[outcome] += probability * outcome_probability
+    return tuple(distribution)
+
+
+@lru_cache(maxsize=None)
+def dealer_distribution(dealer_card_value: int, counts: Tuple[int, ...], dealer_hit_soft_17: bool, no_blackjack=False) -> Tuple[float, ...]:
+    """
+    Exact distribution of the dealer's final hand, memoized on the shoe composition
+    :param dealer_card_value: value of the dealer up card (2-11)
+    :param counts: value counts left in the shoe, not including the up card (see shoe_value_counts/remove_values)
+    :param dealer_hit_soft_17: GameConfig.dealer_hit_soft_17
+    :param no_blackjack: condition on the dealer not having blackjack (hole card peek)
+    :return: probabilities for DEALER_OUTCOMES (17, 18, 19, 20, 21, bust, blackjack)
+    """
+    soft = dealer_card_value == 11
+    distribution = [0.0] * len(DEALER_OUTCOMES)
+    hole_cards = [(index, count) for index, count in enumerate(counts) if count > 0
+                  and not (no_blackjack and dealer_card_value + index + 2 == 21)]
+    remaining = sum(count for _, count in hole_cards)
+    for index, count in hole_cards:
+        probability = count / remaining
+        if dealer_card_value + index + 2 == 21:
+            distribution[BLACKJACK] += probability
+            continue
+        next_counts = counts[:index] + (count - 1,) + counts[index + 1:]
+        total, next_soft = _add_value(dealer_card_value, soft, index + 2)
+        for outcome, outcome_probability in enumerate(_dealer_play(next_counts, total, next_soft, dealer_hit_soft_17)):
+            distribution[outcome] += probability * outcome_probability
+    return tuple(distribution)
+
+
+def stand_ev(game_config, player_total: int, distribution: Tuple[float, ...], player_blackjack=False, ignore_dealer_blackjack=False) -> float:
+    """
+    Expected value of standing, scored the same way as GameConfig.evaluate
+    :param game_config: the game rules (for blackjack_pays)
+    :param player_total: the player's final score
+    :param distribution: dealer outcome probabilities from dealer_distribution
+    :param player_blackjack: the player's hand is a 2 card 21
+    :param ignore_dealer_blackjack: dealer blackjack is a push instead of a loss
+    :return: the expected result of the hand
+    """
+    dealer_blackjack = distribution[BLACKJACK]
+    if player_blackjack:
+        return (1 - dealer_blackjack) * game_config.blackjack_pays
+    if player_total > 21:
+        # a dealer blackjack is checked before the player's bust
+        return -1.0 + dealer_blackjack if ignore_dealer_blackjack else -1.0
+    ev = 0.0 if ignore_dealer_blackjack else -dealer_blackjack
+    ev += distribution[BUST]
+    for outcome, dealer_total in enumerate(range(17, 22)):
+        if player_total > dealer_total:
+            ev += distribution[outcome]
+        elif player_total < dealer_total:
+            ev -= distribution[outcome]
+    return ev
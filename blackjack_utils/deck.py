@@ -27,6 +27,20 @@ class Deck:
         """
         return self.cards.pop()
 
+    def draw_excluding(self, ranks):
+        """
+        Removes a random card whose rank isn't in ranks and returns it. The card is taken from a random position,
+        so the cards left stay in random order (taking the top one would leave excluded cards on top)
+        :param ranks: ranks that can't be drawn
+        :return: the card drawn
+        """
+        if all(card.rank in ranks for card in self.cards):
+            raise IndexError("no card left outside the excluded ranks")
+        while True:
+            index = random.randrange(len(self.cards))
+            if self.cards[index].rank not in ranks:
+                return self.cards.pop(index)
+
     def remove(self, card):
         """
         Removes a specific card from the deck
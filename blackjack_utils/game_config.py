@@ -1,6 +1,7 @@
 from typing import List
 from blackjack_utils.card import Card
 from blackjack_utils.shoe import Shoe
+from blackjack_utils.compact import HandState
 
 class GameConfig:
     decks_in_shoe = 6
@@ -23,7 +24,10 @@ class GameConfig:
         :param dealer_hand (List[Card]): the 2 cards of the dealer (before dealer play)
         :param remaining_shoe (Shoe): the remaining cards in the shoe (after player play)
         :return float: the result of the game (-1 for loss, 0 for push, 1 for win, blackjack_pays amount for blackjack)
+        HandState hands (with a CompactShoe) are evaluated by evaluate_state
         """
+        if isinstance(player_final_hand, HandState):
+            return self.evaluate_state(player_final_hand, dealer_hand, remaining_shoe, ignore_dealer_blackjack)
         # hit for dealer
         while self.does_dealer_hit(dealer_hand):
             dealer_hand.append(remaining_shoe.draw())
@@ -53,6 +57,49 @@ class GameConfig:
             return -1
         return 0
     
+    def evaluate_state(self, player_final_hand: HandState, dealer_hand: HandState, remaining_shoe, ignore_dealer_blackjack=False):
+        """
+        Same as evaluate, for the compact engine
+        :param player_final_hand (HandState): the final hand of the player
+        :param dealer_hand (HandState): the 2 cards of the dealer (before dealer play)
+        :param remaining_shoe (CompactShoe): the remaining cards in the shoe (after player play)
+        :return float: the result of the game
+        """
+        while self.does_dealer_hit_state(dealer_hand):
+            dealer_hand.add(remaining_shoe.draw())
+
+        if player_final_hand.is_blackjack():
+            if dealer_hand.is_blackjack():
+                return 0
+            return self.blackjack_pays
+
+        if dealer_hand.is_blackjack():
+            if ignore_dealer_blackjack:
+                return 0
+            return -1
+
+        player_score = player_final_hand.total
+        dealer_score = dealer_hand.total
+
+        if player_score > 21:
+            return -1
+        if dealer_score > 21:
+            return 1
+        if player_score > dealer_score:
+            return 1
+        if player_score < dealer_score:
+            return -1
+        return 0
+
+    def does_dealer_hit_state(self, hand: HandState):
+        if hand.total < 17:
+            return True
+        if hand.total > 17:
+            return False
+        if hand.soft_aces > 0:
+            return self.dealer_hit_soft_17
+        return False
+
     def score_hand(self, hand: List[Card]):
         # sum of cards with ace as 11
         hand_value = sum(card.get_card_value() for card in hand)
@@ -84,4 +131,21 @@ class GameConfig:
         return hand_value == 17 and num_aces > 0
     
     def hand_is_blackjack(self, hand: List[Card]):
-        return len(hand) == 2 and self.score_hand(hand) == 21
\ No newline at end of file
+        return len(hand) == 2 and self.score_hand(hand) == 21
+
+    def odds_file_name(self) -> str:
+        """
+        :return: the data2/ csv name for this config's odds table, in the naming load_data.parse_filename reads the rules from
+        """
+        if self.blackjack_pays not in (1.5, 1.2):
+            raise ValueError(f"no odds file naming for blackjack paying {self.blackjack_pays}")
+        six_five = self.blackjack_pays == 1.2
+        if self.double_after_split and self.dealer_hit_soft_17:
+            name = 'double_after_splitting_hit_soft_17'
+        elif self.double_after_split:
+            name = 'double_after_split' if six_five else 'double_after_splitting'
+        elif self.dealer_hit_soft_17:
+            name = 'hit_soft_17' if six_five else 'standard_hit_soft_17'
+        else:
+            name = 'stand_soft_17'
+        return f"{'6-5_' if six_five else ''}{name}_odds.csv"
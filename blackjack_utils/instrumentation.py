@@ -0,0 +1,130 @@
+import json
+import os
+import pickle
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+
+class EventLog:
+    """
+    Opt-in JSON-lines log of run events (one object per line, with the event name, the time and the seconds since
+    the log was opened). A log with no file name is disabled, and emit() does nothing, so callers can emit unconditionally.
+    """
+
+    def __init__(self, file_name: str = None):
+        """
+        :param file_name: the file events are appended to, or None for a disabled log
+        """
+        self.file_name = file_name
+        self.enabled = file_name is not None
+        self.start = time.time()
+        self._file = open(file_name, 'a') if self.enabled else None
+
+    def emit(self, event: str, **fields):
+        """
+        Writes an event (flushed straight away, so a run can be followed with tail -f)
+        :param event: the event name, e.g. 'task', 'cell', 'phase'
+        :param fields: the event's data, anything json can encode
+        """
+        if not self.enabled:
+            return
+        now = time.time()
+        record = {'event': event, 'time': round(now, 6), 'elapsed': round(now - self.start, 6)}
+        record.update(fields)
+        self._file.write(json.dumps(record, default=str) + '\n')
+        self._file.flush()
+
+    @contextmanager
+    def phase(self, name: str, **fields):
+        """
+        Emits a 'phase' event with the wall time of the with block
+        """
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.emit('phase', phase=name, seconds=time.time() - start, **fields)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class StackSampler:
+    """
+    Sampling profiler for one thread: a background thread records the thread's call stack every interval seconds.
+    Samples are counted by collapsed stack ('file:function;file:function;...', outermost first), the format flame graph tools read.
+    """
+
+    def __init__(self, interval: float = 0.005, thread_id: int = None):
+        """
+        :param interval: seconds between samples
+        :param thread_id: the thread to sample (default: the thread creating the sampler)
+        """
+        self.interval = interval
+        self.thread_id = thread_id if thread_id is not None else threading.get_ident()
+        self.samples = Counter()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> Counter:
+        """
+        :return: the samples taken since start()
+        """
+        self._stop.set()
+        self._thread.join()
+        samples, self.samples = self.samples, Counter()
+        return samples
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(f"{os.path.basename(frame.f_code.co_filename)}:{frame.f_code.co_name}")
+                frame = frame.f_back
+            if stack:
+                self.samples[';'.join(reversed(stack))] += 1
+
+
+def run_instrumented(task):
+    """
+    Pool task wrapper, runs a worker function and measures it in the worker process
+    :param task: (worker function, worker args, time the task was submitted, profiler interval in seconds or 0 for no profiling)
+    :return: (the worker's result, dict of metrics: pid, queue_wait, compute, result_bytes and profile if sampled)
+    """
+    worker, worker_args, submitted, profile_interval = task
+    started = time.time()
+    sampler = StackSampler(profile_interval) if profile_interval else None
+    if sampler:
+        sampler.start()
+    result = worker(worker_args)
+    finished = time.time()
+    metrics = {'pid': os.getpid(), 'queue_wait': started - submitted, 'compute': finished - started, 'result_bytes': len(pickle.dumps(result))}
+    if sampler:
+        metrics['profile'] = dict(sampler.stop())
+    return result, metrics
+
+
+def write_folded(file_name: str, samples: Counter):
+    """
+    Writes profiler samples as collapsed stacks ('stack count' per line), for flamegraph.pl / speedscope
+    """
+    with open(file_name, 'w') as f:
+        for stack, count in samples.most_common():
+            f.write(f"{stack} {count}\n")
@@ -0,0 +1,267 @@
+import argparse
+from array import array
+import json
+import os
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from itertools import product
+from urllib.parse import urlparse, parse_qs
+
+import numpy as np
+
+import blackjack_utils.game_config as gc
+from blackjack_utils.odds_file import OddsTable, EV_COLUMNS, table_arrays, binary_file_name
+from blackjack_utils.strategy_table import StrategyTable, ACTIONS, HAND_CLASSES, HAND_LABELS, NUM_UPCARDS
+
+RULE_COLUMNS = ['decks_in_shoe', 'dealer_hit_soft_17', 'double_after_split', 'blackjack_pays', 'surrender_allowed']
+
+
+def rules_index_key(decks_in_shoe, dealer_hit_soft_17, double_after_split, blackjack_pays, surrender_allowed=True) -> tuple:
+    """
+    :return: the key a rule set is indexed under, its RULE_COLUMNS values (blackjack_pays rounded, so 6/5 and 1.2 match)
+    """
+    return int(decks_in_shoe), bool(dealer_hit_soft_17), bool(double_after_split), round(float(blackjack_pays), 4), bool(surrender_allowed)
+
+
+def _rules_of(game_config: gc.GameConfig) -> tuple:
+    return rules_index_key(game_config.decks_in_shoe, game_config.dealer_hit_soft_17, game_config.double_after_split,
+                           game_config.blackjack_pays, game_config.surrender_allowed)
+
+
+class StrategyIndex:
+    """
+    Best actions and expected values for every loaded rule set, as dense (rule set x hand class x dealer up card)
+    arrays, so a lookup is an array index and a batch of lookups is one numpy fancy index.
+    Hand classes are StrategyTable's (see strategy_table.HAND_CLASSES), cells missing from a rule set's table
+    are stand with NaN expected values.
+    """
+
+    def __init__(self, rule_keys, actions: np.ndarray, expected_values: np.ndarray):
+        """
+        :param rule_keys: rules_index_key() of each rule set, in the order of the first axis of the arrays
+        :param actions: int8 action codes, shape (rule sets, hand classes, up cards)
+        :param expected_values: EV_COLUMNS expected values, shape (rule sets, hand classes, up cards, len(EV_COLUMNS))
+        """
+        self.rule_keys = list(rule_keys)
+        self.rule_indices = {key: index for index, key in enumerate(self.rule_keys)}
+        self.actions = actions
+        self.expected_values = expected_values
+
+    @classmethod
+    def from_rows(cls, rows, decks_in_shoe: int = 6):
+        """
+        :param rows: iterable of dicts with the rule columns, player_total, dealer_card_up, best_action and
+                     the expected values (named like the odds csvs, double/hit/..., or the database, double_ev/hit_ev/...)
+        :param decks_in_shoe: the decks in the shoe of rows without a decks_in_shoe column (the database doesn't store it)
+        If a cell appears more than once, the first row wins (like StrategyTable.from_rows)
+        :return: the StrategyIndex
+        """
+        grouped = {}
+        for row in rows:
+            key = rules_index_key(row.get('decks_in_shoe', decks_in_shoe), *(row[column] for column in RULE_COLUMNS[1:]))
+            grouped.setdefault(key, []).append(row)
+        tables = [table_arrays(group) for group in grouped.values()]
+        actions = np.stack([actions for actions, _ in tables]) if tables else np.empty((0, len(HAND_LABELS), NUM_UPCARDS), dtype=np.int8)
+        expected_values = (np.stack([expected_values for _, expected_values in tables]) if tables
+                           else np.empty((0, len(HAND_LABELS), NUM_UPCARDS, len(EV_COLUMNS))))
+        return cls(grouped, actions, expected_values)
+
+    @classmethod
+    def from_tables(cls, tables):
+        """
+        :param tables: OddsTables, one per rule set
+        :return: the StrategyIndex
+        """
+        tables = list(tables)
+        return cls([_rules_of(table.game_config) for table in tables],
+                   np.stack([table.actions for table in tables]),
+                   np.stack([np.asarray(table.expected_values, dtype=np.float64) for table in tables]))
+
+    @classmethod
+    def from_directory(cls, data_dir: str = 'data2', decks_in_shoe: int = 6):
+        """
+        Loads every rule set's odds table in a directory (named like GameConfig.odds_file_name), from its binary
+        odds file if there is one exported from the csv as it is now (see odds_file.export_directory), otherwise from the csv
+        :return: the StrategyIndex
+        """
+        tables = []
+        for dealer_hit_soft_17, double_after_split, blackjack_pays in product([True, False], [True, False], [1.5, 1.2]):
+            game_config = gc.GameConfig(decks_in_shoe, dealer_hit_soft_17, double_after_split, True, blackjack_pays)
+            file_name = os.path.join(data_dir, game_config.odds_file_name())
+            if os.path.exists(file_name):
+                tables.append(OddsTable.load_current(file_name, game_config))
+            elif os.path.exists(binary_file_name(file_name)):
+                tables.append(OddsTable.load(binary_file_name(file_name)))
+        return cls.from_tables(tables)
+
+    @classmethod
+    def from_database(cls, conn, decks_in_shoe: int = 6):
+        """
+        :param conn: an open DB-API connection (e.g. psycopg2) to a database with the blackjack_odds table
+        :param decks_in_shoe: the decks in the shoe the table's odds were run with
+        :return: the StrategyIndex of every rule set in the table
+        """
+        with conn.cursor() as cur:
+            cur.execute("SELECT * FROM blackjack_odds;")
+            columns = [description[0] for description in cur.description]
+            return cls.from_rows((dict(zip(columns, row)) for row in cur.fetchall()), decks_in_shoe)
+
+    def rule_index(self, game_config: gc.GameConfig) -> int:
+        """
+        :return: the index of the game config's rule set, for the batch lookups
+        """
+        key = _rules_of(game_config)
+        if key not in self.rule_indices:
+            raise KeyError(f"no odds table loaded for rules {dict(zip(RULE_COLUMNS, key))}")
+        return self.rule_indices[key]
+
+    def lookup(self, game_config: gc.GameConfig, label: str, dealer_card_value: int) -> str:
+        """
+        :param label: hand label, e.g. '16', 'soft_18', 'paired_8'
+        :param dealer_card_value: value of the dealer up card (2-11)
+        :return: the best action name
+        """
+        return ACTIONS[self.actions[self._cells(self.rule_index(game_config), HAND_CLASSES[label], dealer_card_value)]]
+
+    def _cells(self, rule_indices, hand_classes, dealer_card_values) -> tuple:
+        """
+        :return: the array index of the cells, after checking every index is in range (numpy would take a negative
+                 one from the end, e.g. an up card of 1 would answer for an ace)
+        :raises ValueError: if a rule index, hand class or up card is out of range
+        """
+        rule_indices, hand_classes, dealer_card_values = (np.asarray(values) for values in (rule_indices, hand_classes, dealer_card_values))
+        for name, values, low, high in (('rule indices', rule_indices, 0, len(self.rule_keys) - 1), ('hand classes', hand_classes, 0, len(HAND_LABELS) - 1),
+                                        ('up cards', dealer_card_values, 2, NUM_UPCARDS + 1)):
+            if not np.issubdtype(values.dtype, np.integer):
+                raise ValueError(f"{name} must be integers, got {values.dtype}")
+            if values.size and (values.min() < low or values.max() > high):
+                raise ValueError(f"{name} must be {low}-{high}, got {values.min() if values.min() < low else values.max()}")
+        return rule_indices, hand_classes, dealer_card_values - 2
+
+    def lookup_batch(self, rule_indices, hand_classes, dealer_card_values) -> np.ndarray:
+        """
+        Looks up a batch of hands at once. Each argument is an array (or a scalar used for every hand)
+        :param rule_indices: see rule_index()
+        :param hand_classes: see encode_hands() / strategy_table.hand_class()
+        :param dealer_card_values: values of the dealer up cards (2-11)
+        :return: int8 array of action codes (index into ACTIONS)
+        :raises ValueError: if a rule index, hand class or up card is out of range
+        """
+        return self.actions[self._cells(rule_indices, hand_classes, dealer_card_values)]
+
+    def expected_values_batch(self, rule_indices, hand_classes, dealer_card_values) -> np.ndarray:
+        """
+        :return: array of shape (hands, len(EV_COLUMNS)) with each hand's expected values (see lookup_batch)
+        """
+        return self.expected_values[self._cells(rule_indices, hand_classes, dealer_card_values)]
+
+    @staticmethod
+    def encode_hands(labels) -> np.ndarray:
+        """
+        :param labels: hand labels, e.g. ['16', 'soft_18', 'paired_8']
+        :return: their hand classes, for the batch lookups
+        """
+        return np.fromiter((HAND_CLASSES[label] for label in labels), dtype=np.intp)
+
+    def strategy_table(self, game_config: gc.GameConfig) -> StrategyTable:
+        """
+        :return: a StrategyTable of the game config's best actions
+        """
+        return StrategyTable(array('b', self.actions[self.rule_index(game_config)].tobytes()))
+
+
+def _parse_bool(value) -> bool:
+    if isinstance(value, str):
+        return value.lower() in ('true', '1', 'yes')
+    return bool(value)
+
+
+def _game_config(rules: dict) -> gc.GameConfig:
+    """GameConfig for rules given as query parameters or json (missing rules default to the GameConfig defaults)"""
+    return gc.GameConfig(decks_in_shoe=int(rules.get('decks_in_shoe', 6)),
+                         dealer_hit_soft_17=_parse_bool(rules.get('dealer_hit_soft_17', True)),
+                         double_after_split=_parse_bool(rules.get('double_after_split', True)),
+                         surrender_allowed=_parse_bool(rules.get('surrender_allowed', True)),
+                         blackjack_pays=float(rules.get('blackjack_pays', 1.5)))
+
+
+def make_handler(index: StrategyIndex):
+    """
+    :return: a BaseHTTPRequestHandler class answering lookups from the index:
+        GET  /rules                                   - the loaded rule sets
+        GET  /lookup?hand=16&upcard=10[&rules...]     - one hand's best action and expected values
+        POST /lookup {"rules": {...}, "hands": [...], "upcards": [...]} - best actions for a batch of hands
+    """
+    class LookupHandler(BaseHTTPRequestHandler):
+        def _reply(self, status, body):
+            payload = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            if url.path == '/rules':
+                self._reply(200, [dict(zip(RULE_COLUMNS, key)) for key in index.rule_keys])
+                return
+            if url.path != '/lookup':
+                self._reply(404, {'error': f"unknown path {url.path}"})
+                return
+            query = {name: values[0] for name, values in parse_qs(url.query).items()}
+            try:
+                rule = index.rule_index(_game_config(query))
+                hand_class = HAND_CLASSES[query['hand']]
+                dealer_card_value = int(query['upcard'])
+                action = index.lookup_batch(rule, hand_class, dealer_card_value)
+                evs = index.expected_values_batch(rule, hand_class, dealer_card_value)
+            except (KeyError, ValueError, IndexError) as e:
+                self._reply(400, {'error': str(e)})
+                return
+            self._reply(200, {'best_action': ACTIONS[action],
+                              'expected_values': {column: None if np.isnan(ev) else float(ev) for column, ev in zip(EV_COLUMNS, evs)}})
+
+        def do_POST(self):
+            if urlparse(self.path).path != '/lookup':
+                self._reply(404, {'error': f"unknown path {self.path}"})
+                return
+            try:
+                request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+                rule = index.rule_index(_game_config(request.get('rules', {})))
+                actions = index.lookup_batch(rule, index.encode_hands(request['hands']), np.asarray(request['upcards'], dtype=np.intp))
+            except (KeyError, ValueError, IndexError, TypeError) as e:
+                self._reply(400, {'error': str(e)})
+                return
+            self._reply(200, {'best_actions': [ACTIONS[action] for action in actions.tolist()]})
+
+        def log_message(self, format, *args):
+            # keep high volume lookup traffic out of the console
+            pass
+
+    return LookupHandler
+
+
+def serve(index: StrategyIndex, host: str = '127.0.0.1', port: int = 8000):
+    """
+    Serves lookups from the index over http until interrupted (see make_handler)
+    """
+    with ThreadingHTTPServer((host, port), make_handler(index)) as server:
+        print(f"Serving strategy lookups for {len(index.rule_keys)} rule sets on http://{host}:{port}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve best action lookups for every rule set in an odds directory')
+    parser.add_argument('--data_dir', type=str, default='data2', help='Directory of odds csvs (default: data2)')
+    parser.add_argument('--decks_in_shoe', type=int, default=6, help='Decks in the shoe the odds were run with (default: 6)')
+    parser.add_argument('--host', type=str, default='127.0.0.1', help='Address to listen on (default: 127.0.0.1)')
+    parser.add_argument('--port', type=int, default=8000, help='Port to listen on (default: 8000)')
+    args = parser.parse_args()
+    serve(StrategyIndex.from_directory(args.data_dir, args.decks_in_shoe), args.host, args.port)
+
+
+if __name__ == '__main__':
+    main()
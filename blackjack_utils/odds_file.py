@@ -0,0 +1,233 @@
+import argparse
+from array import array
+import csv
+import hashlib
+import mmap
+import os
+import struct
+from itertools import product
+
+import numpy as np
+
+import blackjack_utils.game_config as gc
+from blackjack_utils.strategy_table import StrategyTable, ACTIONS, ACTION_CODES, HAND_CLASSES, HAND_LABELS, NUM_UPCARDS, STAND, normalize_label, upcard_value
+
+# expected value columns kept for every cell, in the odds csv names
+EV_COLUMNS = ['double', 'hit', 'stand', 'split']
+
+# binary odds file layout (little endian):
+#   header (HEADER_SIZE bytes): magic, version, GameConfig rules, array shapes, EV item size, the array offsets and
+#                               the digest of the csv the table was exported from
+#   actions: int8 action codes, (hand classes x up cards)
+#   expected values: float32 or float64, (hand classes x up cards x EV columns), 8 byte aligned
+MAGIC = b'BJODDS\x00\x00'
+VERSION = 2
+HEADER = struct.Struct('<8sIIBBBBdIIIII16s')
+HEADER_SIZE = 64
+# digest of a table that wasn't read from a csv
+NO_SOURCE = bytes(16)
+EV_DTYPES = {4: np.float32, 8: np.float64}
+
+
+def _float(value) -> float:
+    return np.nan if value is None or value == '' else float(value)
+
+
+def table_arrays(rows):
+    """
+    :param rows: iterable of dicts for one odds table, with player_total, dealer_card_up, best_action and the expected
+                 values (named like the odds csvs, double/hit/..., or the database, double_ev/hit_ev/...)
+    If a cell appears more than once, the first row wins (like StrategyTable.from_rows). Missing cells are stand with NaN expected values
+    :return: (int8 actions of shape (hand classes, up cards), float64 expected values of shape (hand classes, up cards, EV columns))
+    """
+    actions = np.full((len(HAND_LABELS), NUM_UPCARDS), STAND, dtype=np.int8)
+    expected_values = np.full(actions.shape + (len(EV_COLUMNS),), np.nan)
+    seen = np.zeros(actions.shape, dtype=bool)
+    for row in rows:
+        label = normalize_label(row['player_total'])
+        if label not in HAND_CLASSES:
+            continue
+        cell = (HAND_CLASSES[label], upcard_value(row['dealer_card_up']) - 2)
+        if seen[cell]:
+            continue
+        seen[cell] = True
+        actions[cell] = ACTION_CODES.get(row['best_action'], STAND)
+        expected_values[cell] = [_float(row.get(column, row.get(f"{column}_ev"))) for column in EV_COLUMNS]
+    return actions, expected_values
+
+
+def game_config_for_file(file_name: str, decks_in_shoe: int = 6) -> gc.GameConfig:
+    """
+    :param file_name: an odds csv or binary odds file named like GameConfig.odds_file_name
+    :return: the GameConfig its name stands for
+    """
+    base_name = os.path.basename(file_name).replace('.odds', '.csv')
+    for dealer_hit_soft_17, double_after_split, blackjack_pays in product([True, False], [True, False], [1.5, 1.2]):
+        game_config = gc.GameConfig(decks_in_shoe, dealer_hit_soft_17, double_after_split, True, blackjack_pays)
+        if game_config.odds_file_name() == base_name:
+            return game_config
+    raise ValueError(f"can't tell the rules of {file_name} from its name")
+
+
+def binary_file_name(csv_file_name: str) -> str:
+    """:return: the binary odds file name for an odds csv (same name, .odds extension)"""
+    return os.path.splitext(csv_file_name)[0] + '.odds'
+
+
+def csv_digest(csv_file_name: str) -> bytes:
+    """:return: 16 byte digest of an odds csv's contents, kept in the binary odds file exported from it"""
+    with open(csv_file_name, 'rb') as f:
+        return hashlib.blake2b(f.read(), digest_size=16).digest()
+
+
+class OddsTable:
+    """
+    One rule set's odds table (best action and expected values for each hand class and dealer up card).
+    Saved in a fixed layout binary file, and loaded with mmap + np.frombuffer, so opening a table does no
+    parsing and processes that load the same file share its pages. A loaded table's arrays are read only.
+    """
+
+    def __init__(self, game_config: gc.GameConfig, actions: np.ndarray, expected_values: np.ndarray, source_digest: bytes = NO_SOURCE):
+        """
+        :param actions: int8 action codes, shape (hand classes, up cards)
+        :param expected_values: EV_COLUMNS expected values, shape (hand classes, up cards, len(EV_COLUMNS))
+        :param source_digest: csv_digest of the csv the table was read from
+        """
+        self.game_config = game_config
+        self.actions = actions
+        self.expected_values = expected_values
+        self.source_digest = source_digest
+        self._mmap = None
+
+    @classmethod
+    def from_csv(cls, file_name: str, game_config: gc.GameConfig = None):
+        """
+        :param file_name: odds csv (player_total,dealer_card_up,...,best_action)
+        :param game_config: the table's rules (default: read from the file name, see game_config_for_file)
+        :return: the OddsTable
+        """
+        game_config = game_config or game_config_for_file(file_name)
+        with open(file_name, newline='') as f:
+            return cls(game_config, *table_arrays(csv.DictReader(f)), csv_digest(file_name))
+
+    def save(self, file_name: str, dtype=np.float64):
+        """
+        Writes the table as a binary odds file
+        :param dtype: np.float32 or np.float64, the expected values' type in the file
+        """
+        dtype = np.dtype(dtype)
+        if dtype.itemsize not in EV_DTYPES:
+            raise ValueError(f"expected values must be float32 or float64, not {dtype}")
+        actions_offset = HEADER_SIZE
+        ev_offset = actions_offset + (self.actions.size + 7) // 8 * 8
+        game_config = self.game_config
+        header = HEADER.pack(MAGIC, VERSION, game_config.decks_in_shoe, game_config.dealer_hit_soft_17, game_config.double_after_split,
+                             game_config.surrender_allowed, dtype.itemsize, game_config.blackjack_pays,
+                             len(HAND_LABELS), NUM_UPCARDS, len(EV_COLUMNS), actions_offset, ev_offset, self.source_digest)
+        temp_name = f"{file_name}.tmp"
+        with open(temp_name, 'wb') as f:
+            f.write(header.ljust(HEADER_SIZE, b'\x00'))
+            f.write(np.ascontiguousarray(self.actions, dtype=np.int8).tobytes().ljust(ev_offset - actions_offset, b'\x00'))
+            f.write(np.ascontiguousarray(self.expected_values, dtype=dtype.newbyteorder('<')).tobytes())
+        os.replace(temp_name, file_name)
+
+    @classmethod
+    def load(cls, file_name: str):
+        """
+        Memory maps a binary odds file written by save()
+        :return: the OddsTable, its arrays are read only views of the mapped file
+        """
+        with open(file_name, 'rb') as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        # the version is checked before the rest of the header, which older versions laid out differently
+        magic, version = struct.unpack_from('<8sI', mapped)
+        if magic != MAGIC or version != VERSION:
+            mapped.close()
+            raise ValueError(f"{file_name} is not a version {VERSION} binary odds file")
+        (_, _, decks_in_shoe, dealer_hit_soft_17, double_after_split, surrender_allowed, ev_size, blackjack_pays,
+         num_hands, num_upcards, num_columns, actions_offset, ev_offset, source_digest) = HEADER.unpack_from(mapped)
+        if (num_hands, num_upcards, num_columns) != (len(HAND_LABELS), NUM_UPCARDS, len(EV_COLUMNS)):
+            mapped.close()
+            raise ValueError(f"{file_name} has a {num_hands}x{num_upcards}x{num_columns} layout, "
+                             f"expected {len(HAND_LABELS)}x{NUM_UPCARDS}x{len(EV_COLUMNS)}")
+        game_config = gc.GameConfig(decks_in_shoe, bool(dealer_hit_soft_17), bool(double_after_split), bool(surrender_allowed), blackjack_pays)
+        actions = np.frombuffer(mapped, dtype=np.int8, count=num_hands * num_upcards, offset=actions_offset).reshape(num_hands, num_upcards)
+        expected_values = np.frombuffer(mapped, dtype=np.dtype(EV_DTYPES[ev_size]).newbyteorder('<'), count=num_hands * num_upcards * num_columns,
+                                        offset=ev_offset).reshape(num_hands, num_upcards, num_columns)
+        table = cls(game_config, actions, expected_values, source_digest)
+        table._mmap = mapped
+        return table
+
+    @classmethod
+    def load_current(cls, csv_file_name: str, game_config: gc.GameConfig = None):
+        """
+        Loads an odds csv's table from its binary odds file if the binary was exported from the csv as it is now,
+        otherwise from the csv (a sweep, top up or merge rewrites the csv, and the binary would serve the old table)
+        :param game_config: the table's rules (default: read from the file name, see game_config_for_file)
+        :return: the OddsTable
+        """
+        binary_name = binary_file_name(csv_file_name)
+        if os.path.exists(binary_name):
+            try:
+                table = cls.load(binary_name)
+            except ValueError:
+                table = None
+            if table is not None and table.source_digest == csv_digest(csv_file_name):
+                return table
+            print(f"Warning: {binary_name} is out of date with {csv_file_name}, loading the csv (re-export with python -m blackjack_utils.odds_file)")
+        return cls.from_csv(csv_file_name, game_config)
+
+    def best_action(self, label: str, dealer_card_value: int) -> str:
+        """
+        :return: the action name for a hand label (e.g. 'soft_17') and dealer up card value (2-11)
+        """
+        return ACTIONS[self.actions[HAND_CLASSES[label], dealer_card_value - 2]]
+
+    def expected_value(self, label: str, dealer_card_value: int, action: str) -> float:
+        """
+        :param action: one of EV_COLUMNS
+        :return: the action's expected value (NaN if the table doesn't have it, e.g. split for unpaired hands)
+        """
+        return float(self.expected_values[HAND_CLASSES[label], dealer_card_value - 2, EV_COLUMNS.index(action)])
+
+    def strategy_table(self) -> StrategyTable:
+        """
+        :return: a StrategyTable of the best actions, for simulate_hand
+        """
+        return StrategyTable(array('b', self.actions.tobytes()))
+
+
+def export_directory(data_dir: str = 'data2', dtype=np.float64):
+    """
+    Writes a binary odds file next to every rule set's odds csv in a directory
+    :return: the binary files written
+    """
+    written = []
+    for dealer_hit_soft_17, double_after_split, blackjack_pays in product([True, False], [True, False], [1.5, 1.2]):
+        game_config = gc.GameConfig(6, dealer_hit_soft_17, double_after_split, True, blackjack_pays)
+        csv_file_name = os.path.join(data_dir, game_config.odds_file_name())
+        if os.path.exists(csv_file_name):
+            OddsTable.from_csv(csv_file_name, game_config).save(binary_file_name(csv_file_name), dtype)
+            written.append(binary_file_name(csv_file_name))
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Export odds csvs as memory mappable binary odds files')
+    parser.add_argument('files', nargs='*', help='Odds csvs to export (default: every rule set in --data_dir)')
+    parser.add_argument('--data_dir', type=str, default='data2', help='Directory of odds csvs (default: data2)')
+    parser.add_argument('--dtype', type=str, choices=['float32', 'float64'], default='float64', help='Type the expected values are stored as (default: float64)')
+    args = parser.parse_args()
+    if args.files:
+        written = []
+        for file_name in args.files:
+            OddsTable.from_csv(file_name).save(binary_file_name(file_name), args.dtype)
+            written.append(binary_file_name(file_name))
+    else:
+        written = export_directory(args.data_dir, args.dtype)
+    for file_name in written:
+        print(f"Wrote {file_name}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,166 @@
+import pickle
+import queue
+import time
+from collections import Counter, defaultdict
+from typing import Callable, Dict, List
+
+from blackjack_utils.instrumentation import EventLog, run_instrumented
+
+
+def player_total_dependencies(player_total: str) -> List[str]:
+    """
+    :param player_total: a hand label (e.g. '16', 'soft_18', 'paired_8')
+    :return: the hand labels whose best actions are looked up when playing out the hand after its first action
+    """
+    if player_total.startswith('paired'):
+        # a split hand is 1 card + a draw, which can become any hard or soft hand (or the same pair again,
+        # which plays the forced action being simulated)
+        return [str(total) for total in range(5, 21)] + [f"soft_{total}" for total in range(13, 21)]
+    if player_total.startswith('soft'):
+        total = int(player_total.split('_')[1])
+        # hits stay soft up to 21, or go hard from 12
+        return [f"soft_{next_total}" for next_total in range(total + 1, 21)] + [str(next_total) for next_total in range(12, 21)]
+    total = int(player_total)
+    dependencies = [str(next_total) for next_total in range(total + 1, 21)]
+    if total + 11 <= 20:
+        dependencies.append(f"soft_{total + 11}")
+    return dependencies
+
+
+class CellScheduler:
+    """
+    Runs the simulation tasks for a whole odds table on one persistent worker pool.
+    A player total's tasks are submitted as soon as every player total it depends on is done, so workers
+    move straight on to the next cell instead of waiting on a new pool at every cell boundary.
+    """
+
+    def __init__(self, pool, events: EventLog = None, task_units: Callable = None, profile_interval: float = 0):
+        """
+        :param pool: the multiprocessing.Pool to run tasks on
+        :param events: optional EventLog, if enabled every task is timed in its worker and task, cell, player total
+                       and worker throughput events are written to it
+        :param task_units: optional function(worker args) -> work done by the task (e.g. hands), for the throughput events
+        :param profile_interval: seconds between stack samples of each task in its worker (0 for no profiling),
+                                 the samples are added up in self.profile. Only used with an enabled EventLog
+        """
+        self.pool = pool
+        self.events = events or EventLog()
+        self.task_units = task_units
+        self.profile_interval = profile_interval
+        # collapsed stack -> samples, from every task
+        self.profile = Counter()
+        # pid -> [units, compute seconds]
+        self.worker_throughput = defaultdict(lambda: [0, 0.0])
+        self._results = queue.Queue()
+
+    def _submit(self, player_total, tasks, first_index=0):
+        for task_index, (cell, worker, worker_args) in enumerate(tasks, first_index):
+            key = (player_total, cell, task_index)
+            if self.events.enabled:
+                task = (worker, worker_args, time.time(), self.profile_interval)
+                self.events.emit('submit', player_total=player_total, cell=cell, task=task_index, worker=worker.__name__,
+                                 args_bytes=len(pickle.dumps(task)))
+                self.pool.apply_async(
+                    run_instrumented, (task,),
+                    callback=lambda result, key=key, worker=worker, worker_args=worker_args: self._results.put((key, result[0], None, (worker, worker_args, result[1]))),
+                    error_callback=lambda error, key=key: self._results.put((key, None, error, None)))
+                continue
+            self.pool.apply_async(
+                worker, (worker_args,),
+                callback=lambda result, key=key: self._results.put((key, result, None, None)),
+                error_callback=lambda error, key=key: self._results.put((key, None, error, None)))
+
+    def _task_done(self, player_total, cell, task_index, worker, worker_args, metrics):
+        units = self.task_units(worker_args) if self.task_units else None
+        profile = metrics.pop('profile', None)
+        if profile:
+            self.profile.update(profile)
+        if units is not None:
+            throughput = self.worker_throughput[metrics['pid']]
+            throughput[0] += units
+            throughput[1] += metrics['compute']
+            metrics['units'] = units
+            metrics['units_per_sec'] = units / metrics['compute'] if metrics['compute'] else None
+        self.events.emit('task', player_total=player_total, cell=cell, task=task_index, worker=worker.__name__, **metrics)
+
+    def run(self, player_totals: List[str], dependencies: Dict[str, List[str]], make_tasks: Callable, on_total_done: Callable, on_cell_done: Callable = None,
+            more_tasks: Callable = None):
+        """
+        :param player_totals: the player totals to simulate
+        :param dependencies: player total -> player totals it relies on (ones not in player_totals count as done)
+        :param make_tasks: function(player_total) -> list of (cell, worker function, worker args), called when the total is scheduled
+        :param on_total_done: function(player_total, results) with results a dict of cell -> list of worker results in task order
+        :param on_cell_done: optional function(player_total, cell, results) called as each cell finishes, with the cell's worker results in task order
+        :param more_tasks: optional function(player_total, cell, results) -> list of (worker function, worker args), called when all of a
+                           cell's tasks are in (results in task order). Tasks returned are run for the same cell, and the cell only
+                           finishes once it returns no more (for sampling a cell in rounds)
+        """
+        events = self.events
+        run_start = time.time()
+        num_totals = len(player_totals)
+        total_start_times = {}
+        cell_start_times = {}
+        waiting = {player_total: {dependency for dependency in dependencies.get(player_total, []) if dependency in player_totals}
+                   for player_total in player_totals}
+        outstanding = {}
+        results = {}
+
+        def schedule_ready():
+            for player_total in [player_total for player_total, needs in waiting.items() if not needs]:
+                if player_total not in waiting:
+                    continue
+                del waiting[player_total]
+                tasks = make_tasks(player_total)
+                total_start_times[player_total] = time.time()
+                for cell in dict.fromkeys(cell for cell, _, _ in tasks):
+                    cell_start_times[(player_total, cell)] = time.time()
+                outstanding[player_total] = dict(Counter(cell for cell, _, _ in tasks))
+                results[player_total] = {cell: None for cell in outstanding[player_total]}
+                self._submit(player_total, tasks)
+                if not tasks:
+                    finish(player_total)
+
+        def finish(player_total):
+            del outstanding[player_total]
+            on_total_done(player_total, results.pop(player_total))
+            if events.enabled:
+                done = num_totals - len(waiting) - len(outstanding)
+                elapsed = time.time() - run_start
+                events.emit('player_total', player_total=player_total, seconds=time.time() - total_start_times[player_total],
+                            done=done, of=num_totals, eta_seconds=elapsed / done * (num_totals - done))
+            for needs in waiting.values():
+                needs.discard(player_total)
+            schedule_ready()
+
+        task_positions = {}
+        schedule_ready()
+        while outstanding:
+            (player_total, cell, task_index), result, error, instrumented = self._results.get()
+            if error is not None:
+                raise error
+            if instrumented is not None:
+                self._task_done(player_total, cell, task_index, *instrumented)
+            position = task_positions.setdefault((player_total, cell), {})
+            position[task_index] = result
+            outstanding[player_total][cell] -= 1
+            if outstanding[player_total][cell] == 0 and more_tasks:
+                tasks = [(cell, worker, worker_args) for worker, worker_args in
+                         more_tasks(player_total, cell, [position[index] for index in sorted(position)])]
+                if tasks:
+                    outstanding[player_total][cell] = len(tasks)
+                    self._submit(player_total, tasks, len(position))
+                    continue
+            if outstanding[player_total][cell] == 0:
+                # results in task order, not arrival order
+                results[player_total][cell] = [position[index] for index in sorted(position)]
+                del task_positions[(player_total, cell)]
+                del outstanding[player_total][cell]
+                callback_start = time.time()
+                if on_cell_done:
+                    on_cell_done(player_total, cell, results[player_total][cell])
+                events.emit('cell', player_total=player_total, cell=cell, tasks=len(results[player_total][cell]),
+                            seconds=callback_start - cell_start_times.pop((player_total, cell)), callback_seconds=time.time() - callback_start)
+                if not outstanding[player_total]:
+                    finish(player_total)
+        for pid, (units, compute) in sorted(self.worker_throughput.items()):
+            events.emit('worker', pid=pid, units=units, compute=compute, units_per_sec=units / compute if compute else None)
@@ -0,0 +1,256 @@
+from typing import List
+
+import blackjack_utils.game_config as gc
+import blackjack_utils.shoe as shoe
+from blackjack_utils.compact import CompactShoe, HandState, RANK_VALUES
+from blackjack_utils.counting import CountingShoe, CountStrategyTable
+from blackjack_utils.stats import RunningStats
+from blackjack_utils.strategy_table import StrategyTable, hand_class, HIT, DOUBLE, SPLIT, SURRENDER
+from blackjack_utils.utils import is_soft_count
+
+MAX_SEATS = 7
+
+
+def worst_case_round_cards(decks_in_shoe: int, num_seats: int) -> int:
+    """
+    The most cards a round without splits can take from a full shoe. Every card of a hand but its last is part of a
+    total the hand still draws to (20 or less for a seat, 16 or less for the dealer, counting aces as 1), so a round
+    uses at most the smallest cards of the shoe that fit in those totals, plus a last card for each hand
+    :return: the number of cards
+    """
+    values = sorted(1 if value == 11 else value for value in RANK_VALUES * 4 * decks_in_shoe)
+    budget = 20 * num_seats + 16
+    cards = 0
+    for value in values:
+        if value > budget:
+            break
+        budget -= value
+        cards += 1
+    return cards + num_seats + 1
+
+
+class SessionRound:
+    """
+    Result of one round dealt by a Session
+    outcomes has one entry per seat, the seat's total result (split hands added up, like simulate_hand)
+    """
+    __slots__ = ('shoe_number', 'round_number', 'cards_dealt', 'outcomes', 'dealer_hand', 'true_count')
+
+    def __init__(self, shoe_number: int, round_number: int, cards_dealt: int, outcomes: List[float], dealer_hand, true_count=None):
+        """
+        :param shoe_number: how many shoes were shuffled before this one (0 for the first shoe)
+        :param round_number: the round's number in its shoe (0 for the first round after the shuffle)
+        :param cards_dealt: cards dealt from the shoe before the round started
+        :param outcomes: each seat's result
+        :param dealer_hand: the dealer's final hand (list of Card or HandState)
+        :param true_count: the true count before the round was dealt (None if the session doesn't count)
+        """
+        self.shoe_number = shoe_number
+        self.round_number = round_number
+        self.cards_dealt = cards_dealt
+        self.outcomes = outcomes
+        self.dealer_hand = dealer_hand
+        self.true_count = true_count
+
+    def __repr__(self):
+        return f"SessionRound(shoe_number={self.shoe_number}, round_number={self.round_number}, cards_dealt={self.cards_dealt}, true_count={self.true_count}, outcomes={self.outcomes})"
+
+
+class Session:
+    """
+    Deals consecutive rounds from one shuffled shoe to 1-7 seats, until the cut card (penetration) comes out,
+    then shuffles a new shoe. Each round is dealt like at a real table (a card to each seat, the up card, a second
+    card to each seat, the hole card), the dealer peeks for blackjack, every seat plays its hand with the strategy
+    and the dealer plays once against all of them.
+    Seats play the same way simulate_hand does (splits, doubles and surrenders wherever the strategy has them).
+    With a count system the shoe is a CountingShoe, and a CountStrategyTable strategy is played from the bucket
+    of the true count at the start of each round.
+    """
+
+    def __init__(self, game_config: gc.GameConfig, ev_actions: StrategyTable, num_seats=1, penetration=0.75, engine='compact', count_system=None):
+        """
+        :param ev_actions: the strategy every seat plays (a StrategyTable, a CountStrategyTable, or an odds DataFrame)
+        :param num_seats: the number of players at the table (1-7)
+        :param penetration: fraction of the shoe dealt before the cut card, the shoe is reshuffled after the round it comes out in,
+                            or before a round if fewer cards are left than a worst case round can take
+        :param engine: 'cards' (Shoe of Card objects) or 'compact' (CompactShoe of rank ints)
+        :param count_system: keep a running count with this counting.COUNT_SYSTEMS name (or 13 rank tags), hi_lo by default
+                             for a CountStrategyTable
+        """
+        if not 1 <= num_seats <= MAX_SEATS:
+            raise ValueError(f"num_seats must be 1-{MAX_SEATS}, got {num_seats}")
+        if not 0 < penetration < 1:
+            raise ValueError(f"penetration must be between 0 and 1, got {penetration}")
+        if engine not in ('cards', 'compact'):
+            raise ValueError(f"unknown engine {engine}")
+        if isinstance(ev_actions, CountStrategyTable) and count_system is None:
+            count_system = 'hi_lo'
+        elif not isinstance(ev_actions, (StrategyTable, CountStrategyTable)):
+            ev_actions = StrategyTable.from_dataframe(ev_actions)
+        self.game_config = game_config
+        self.ev_actions = ev_actions
+        self.num_seats = num_seats
+        self.engine = engine
+        self.count_system = count_system
+        self.shoe_size = 52 * game_config.decks_in_shoe
+        self.cut_card = int(self.shoe_size * penetration)
+        self.round_cards = worst_case_round_cards(game_config.decks_in_shoe, num_seats)
+        if self.round_cards > self.shoe_size:
+            raise ValueError(f"a {game_config.decks_in_shoe} deck shoe can't cover a round of {num_seats} seats (up to {self.round_cards} cards)")
+        self.shoe_number = -1
+        self.round_number = 0
+        self.shuffle()
+
+    def new_shoe(self):
+        """:return: a shuffled shoe for the engine"""
+        deck = CompactShoe(self.game_config.decks_in_shoe) if self.engine == 'compact' else shoe.Shoe(self.game_config.decks_in_shoe)
+        deck.shuffle()
+        return deck if self.count_system is None else CountingShoe(deck, self.count_system)
+
+    def shuffle(self):
+        """Starts a new shoe"""
+        self.shoe = self.new_shoe()
+        self.shoe_number += 1
+        self.round_number = 0
+
+    @property
+    def cards_dealt(self) -> int:
+        return self.shoe_size - len(self.shoe)
+
+    @property
+    def true_count(self) -> float:
+        """the true count of the shoe (None if the session doesn't count)"""
+        return self.shoe.true_count if self.count_system is not None else None
+
+    def rounds(self, num_rounds=None):
+        """
+        Plays rounds, reshuffling whenever the cut card comes out
+        :param num_rounds: the number of rounds to play (default: play forever)
+        :return: generator of SessionRound, one per round as it is played
+        """
+        played = 0
+        while num_rounds is None or played < num_rounds:
+            yield self.play_round()
+            played += 1
+
+    def play(self, num_rounds: int) -> List[RunningStats]:
+        """
+        :return: RunningStats of each seat's results over num_rounds rounds
+        """
+        stats = [RunningStats() for _ in range(self.num_seats)]
+        for session_round in self.rounds(num_rounds):
+            for seat_stats, outcome in zip(stats, session_round.outcomes):
+                seat_stats.add(outcome)
+        return stats
+
+    def play_round(self) -> SessionRound:
+        """
+        Deals and plays one round (shuffling first if too few cards are left), then shuffles a new shoe if the cut card came out
+        :return: the SessionRound
+        """
+        if len(self.shoe) < self.round_cards:
+            # the cut card is too deep to finish every round, shuffle early like a dealer would
+            self.shuffle()
+        game_config = self.game_config
+        deck = self.shoe
+        session_round = SessionRound(self.shoe_number, self.round_number, self.cards_dealt, [0.0] * self.num_seats, None, self.true_count)
+        strategy = self.ev_actions.table(session_round.true_count) if isinstance(self.ev_actions, CountStrategyTable) else self.ev_actions
+
+        first_cards = [deck.draw() for _ in range(self.num_seats)]
+        dealer_card_up = deck.draw()
+        starting_hands = [self._hand(first_card, deck.draw()) for first_card in first_cards]
+        dealer_hand = self._hand(dealer_card_up, deck.draw())
+        session_round.dealer_hand = dealer_hand
+
+        if self._is_blackjack(dealer_hand):
+            # the dealer peeks, nobody plays (a player blackjack pushes)
+            session_round.outcomes = [game_config.evaluate(hand, dealer_hand, deck) for hand in starting_hands]
+        else:
+            # (seat, hand, multiplier) of the hands still waiting on the dealer
+            standing = []
+            dealer_card_value = self._card_value(dealer_card_up)
+            for seat, hand in enumerate(starting_hands):
+                if self._is_blackjack(hand):
+                    session_round.outcomes[seat] = game_config.blackjack_pays
+                    continue
+                for final_hand, multiplier in self._play_seat(hand, dealer_card_value, strategy):
+                    if multiplier == 0:
+                        session_round.outcomes[seat] -= 0.5
+                    elif self._total(final_hand) > 21:
+                        session_round.outcomes[seat] -= multiplier
+                    else:
+                        standing.append((seat, final_hand, multiplier))
+            if standing:
+                # the dealer only plays out their hand if someone is still in the round
+                while self._dealer_hits(dealer_hand):
+                    dealer_hand.append(deck.draw())
+                for seat, final_hand, multiplier in standing:
+                    session_round.outcomes[seat] += multiplier * game_config.evaluate(final_hand, dealer_hand, deck)
+
+        self.round_number += 1
+        if self.cards_dealt >= self.cut_card:
+            self.shuffle()
+        return session_round
+
+    def _play_seat(self, hand, dealer_card_value: int, strategy: StrategyTable):
+        """
+        Plays a seat's hand with the strategy, the same way simulate_hand does
+        :return: list of (final hand, bet multiplier) for the hand and any split hands, multiplier 0 for a surrender
+        """
+        deck = self.shoe
+        finished = []
+        hands = [hand]
+        while hands:
+            hand = hands.pop()
+            multiplier = 1
+            while self._total(hand) <= 20:
+                action = strategy.lookup(hand_class(self._total(hand), self._is_soft(hand), self._is_paired(hand)), dealer_card_value)
+                if action == HIT:
+                    hand.append(deck.draw())
+                elif action == DOUBLE:
+                    multiplier = 2
+                    hand.append(deck.draw())
+                    break
+                elif action == SPLIT:
+                    # the second hand is played once this one is done, like simulate_hand's recursion
+                    first_card, second_card = self._split_cards(hand)
+                    hand_a = self._hand(first_card, deck.draw())
+                    hands.append(self._hand(second_card, deck.draw()))
+                    hand = hand_a
+                elif action == SURRENDER:
+                    multiplier = 0
+                    break
+                else:
+                    break
+            finished.append((hand, multiplier))
+        return finished
+
+    def _hand(self, first_card, second_card):
+        if self.engine == 'compact':
+            return HandState.from_ranks(first_card, second_card)
+        return [first_card, second_card]
+
+    def _split_cards(self, hand):
+        if self.engine == 'compact':
+            return hand.first_rank, hand.first_rank
+        return hand[0], hand[1]
+
+    def _card_value(self, dealer_card_up) -> int:
+        return RANK_VALUES[dealer_card_up] if self.engine == 'compact' else dealer_card_up.get_card_value()
+
+    def _total(self, hand) -> int:
+        return hand.total if self.engine == 'compact' else self.game_config.score_hand(hand)
+
+    def _is_soft(self, hand) -> bool:
+        return hand.is_soft() if self.engine == 'compact' else is_soft_count(hand)
+
+    def _is_paired(self, hand) -> bool:
+        if self.engine == 'compact':
+            return hand.is_paired
+        return len(hand) == 2 and hand[0].get_card_value() == hand[1].get_card_value()
+
+    def _is_blackjack(self, hand) -> bool:
+        return hand.is_blackjack() if self.engine == 'compact' else self.game_config.hand_is_blackjack(hand)
+
+    def _dealer_hits(self, hand) -> bool:
+        return self.game_config.does_dealer_hit_state(hand) if self.engine == 'compact' else self.game_config.does_dealer_hit(hand)
@@ -0,0 +1,242 @@
+import os
+import pickle
+import socket
+import threading
+import time
+from array import array
+
+from blackjack_utils.strategy_table import StrategyTable
+
+# the shared directory's layout
+RUN_FILE = 'run.pickle'
+DONE_FILE = 'done'
+PENDING = 'pending'
+CLAIMED = 'claimed'
+RESULTS = 'results'
+TABLES = 'tables'
+SHARD_SUFFIX = '.pickle'
+
+
+def _write_atomic(path: str, data: bytes):
+    """Writes a file under a temporary name and renames it into place, so readers never see part of it"""
+    temp_path = os.path.join(os.path.dirname(path), f".tmp-{socket.gethostname()}-{os.getpid()}-{os.path.basename(path)}")
+    with open(temp_path, 'wb') as f:
+        f.write(data)
+    os.replace(temp_path, path)
+
+
+def _shard_files(directory: str):
+    """:return: the shard files in a directory, oldest shard first"""
+    try:
+        return sorted(name for name in os.listdir(directory) if name.endswith(SHARD_SUFFIX) and not name.startswith('.'))
+    except FileNotFoundError:
+        return []
+
+
+class DirectoryStrategyTables:
+    """
+    StrategyTable slots kept as files in a shared directory, with the same API as SharedStrategyTables,
+    for workers on other hosts that mount the directory (shared memory only reaches the local machine)
+    """
+
+    def __init__(self, num_slots: int, name: str):
+        """
+        :param num_slots: the number of tables
+        :param name: the directory the tables are kept in (created if needed)
+        """
+        self.num_slots = num_slots
+        self.directory = name
+        os.makedirs(name, exist_ok=True)
+
+    @classmethod
+    def attach(cls, name: str, num_slots: int):
+        return cls(num_slots, name)
+
+    @property
+    def name(self) -> str:
+        return self.directory
+
+    def publish(self, slot: int, table: StrategyTable):
+        _write_atomic(os.path.join(self.directory, f"{slot}.bin"), table.actions.tobytes())
+
+    def table(self, slot: int) -> StrategyTable:
+        with open(os.path.join(self.directory, f"{slot}.bin"), 'rb') as f:
+            return StrategyTable(array('b', f.read()))
+
+    def close(self):
+        """Nothing to free, the files stay until the next run clears the directory"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class ShardPool:
+    """
+    Stand-in for a multiprocessing.Pool (apply_async only) that runs tasks on any number of shard workers, on this or
+    other hosts, through a shared directory:
+      run.pickle  - the pool initializer and its arguments, every worker runs it once
+      pending/    - one file per task (shard), workers claim one by renaming it into claimed/ (an atomic rename, so
+                    only one worker gets it)
+      claimed/    - shards being run, a worker touches its claim while it runs. Claims not touched for shard_timeout
+                    seconds (a worker that died) are moved back to pending/
+      results/    - the result of each shard, written by the worker, read and removed by the pool
+      done        - written when the pool closes, workers exit when they see it
+    """
+
+    def __init__(self, directory: str, initializer=None, initargs=(), poll_interval=0.1, shard_timeout=600.0):
+        """
+        :param directory: the shared directory (anything left from an earlier run is cleared)
+        :param initializer: function every worker calls with initargs before running shards
+        :param poll_interval: seconds between checks of results/ and the claims
+        :param shard_timeout: seconds a claim can go untouched before its shard is handed out again
+        """
+        self.directory = directory
+        self.poll_interval = poll_interval
+        self.shard_timeout = shard_timeout
+        for subdirectory in (PENDING, CLAIMED, RESULTS):
+            path = os.path.join(directory, subdirectory)
+            os.makedirs(path, exist_ok=True)
+            for name in os.listdir(path):
+                os.remove(os.path.join(path, name))
+        if os.path.exists(os.path.join(directory, DONE_FILE)):
+            os.remove(os.path.join(directory, DONE_FILE))
+        _write_atomic(os.path.join(directory, RUN_FILE), pickle.dumps((initializer, initargs)))
+        self._next_id = 0
+        # shard id -> (callback, error_callback) of the shards without a result yet
+        self._callbacks = {}
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+        self._poller = threading.Thread(target=self._poll, daemon=True)
+        self._poller.start()
+
+    def apply_async(self, func, args=(), callback=None, error_callback=None):
+        """
+        Writes func(*args) as a pending shard, callback(result) or error_callback(error) is called from the pool's
+        polling thread when its result comes back
+        """
+        with self._lock:
+            shard_id = f"{self._next_id:09d}"
+            self._next_id += 1
+            self._callbacks[shard_id] = (callback, error_callback)
+        _write_atomic(os.path.join(self.directory, PENDING, shard_id + SHARD_SUFFIX), pickle.dumps((func, args)))
+
+    def _poll(self):
+        while not self._closed.wait(self.poll_interval):
+            for name in _shard_files(os.path.join(self.directory, RESULTS)):
+                path = os.path.join(self.directory, RESULTS, name)
+                with open(path, 'rb') as f:
+                    ok, value = pickle.load(f)
+                os.remove(path)
+                with self._lock:
+                    # a shard that was handed out again can come back twice, the first result wins
+                    callbacks = self._callbacks.pop(name[:-len(SHARD_SUFFIX)], None)
+                if callbacks is None:
+                    continue
+                callback, error_callback = callbacks
+                if ok and callback is not None:
+                    callback(value)
+                elif not ok and error_callback is not None:
+                    error_callback(value)
+            self._requeue_stale()
+
+    def _requeue_stale(self):
+        claimed = os.path.join(self.directory, CLAIMED)
+        now = time.time()
+        for name in _shard_files(claimed):
+            path = os.path.join(claimed, name)
+            try:
+                if now - os.path.getmtime(path) > self.shard_timeout:
+                    # claimed/<id>.<worker>.pickle -> pending/<id>.pickle
+                    os.rename(path, os.path.join(self.directory, PENDING, name.split('.')[0] + SHARD_SUFFIX))
+            except FileNotFoundError:
+                # the worker finished it meanwhile
+                continue
+
+    def close(self):
+        """Stops polling and tells the workers to exit"""
+        self._closed.set()
+        self._poller.join()
+        _write_atomic(os.path.join(self.directory, DONE_FILE), b'')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def run_shard_worker(directory: str, poll_interval=0.1, worker_id: str = None) -> int:
+    """
+    Claims and runs shards from a ShardPool's directory until the pool is done
+    :param worker_id: name of the worker in its claims (default: host and pid)
+    :return: the number of shards run
+    """
+    worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+    pending = os.path.join(directory, PENDING)
+    claimed = os.path.join(directory, CLAIMED)
+    initialized = False
+    shards_run = 0
+    while not os.path.exists(os.path.join(directory, DONE_FILE)):
+        if not initialized:
+            if not os.path.exists(os.path.join(directory, RUN_FILE)):
+                time.sleep(poll_interval)
+                continue
+            with open(os.path.join(directory, RUN_FILE), 'rb') as f:
+                initializer, initargs = pickle.load(f)
+            if initializer is not None:
+                initializer(*initargs)
+            initialized = True
+        claim = None
+        for name in _shard_files(pending):
+            claim = os.path.join(claimed, f"{name[:-len(SHARD_SUFFIX)]}.{worker_id}{SHARD_SUFFIX}")
+            try:
+                os.rename(os.path.join(pending, name), claim)
+                break
+            except FileNotFoundError:
+                # another worker got it first
+                claim = None
+        if claim is None:
+            time.sleep(poll_interval)
+            continue
+        with open(claim, 'rb') as f:
+            func, args = pickle.load(f)
+        heartbeat = _Heartbeat(claim)
+        try:
+            result = (True, func(*args))
+        except Exception as error:
+            result = (False, error)
+        finally:
+            heartbeat.stop()
+        shard_id = os.path.basename(claim).split('.')[0]
+        _write_atomic(os.path.join(directory, RESULTS, shard_id + SHARD_SUFFIX), pickle.dumps(result))
+        try:
+            os.remove(claim)
+        except FileNotFoundError:
+            # the claim went stale and the shard was handed out again
+            pass
+        shards_run += 1
+    return shards_run
+
+
+class _Heartbeat:
+    """Touches a claim file every few seconds while its shard runs, so the pool doesn't hand the shard out again"""
+
+    def __init__(self, path: str, interval=5.0):
+        self.path = path
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, args=(interval,), daemon=True)
+        self._thread.start()
+
+    def _run(self, interval):
+        while not self._stopped.wait(interval):
+            try:
+                os.utime(self.path)
+            except FileNotFoundError:
+                return
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
@@ -0,0 +1,71 @@
+from array import array
+from multiprocessing import shared_memory
+
+from blackjack_utils.strategy_table import StrategyTable, HAND_LABELS, NUM_UPCARDS
+
+# bytes in one StrategyTable (one int8 action code per hand class x dealer up card)
+TABLE_SIZE = len(HAND_LABELS) * NUM_UPCARDS
+
+
+class SharedStrategyTables:
+    """
+    A fixed number of StrategyTable slots in one shared memory block.
+    The parent process publishes a table into a slot once, and pool workers attach to the block by name
+    (in a pool initializer), so tasks only need to pass the slot index instead of pickling the tables.
+    A slot should not be rewritten while tasks that read it are running.
+    """
+
+    def __init__(self, num_slots: int, name: str = None):
+        """
+        :param num_slots: the number of tables the block holds
+        :param name: name of an existing block to attach to, or None to create a new one
+        """
+        self.num_slots = num_slots
+        if name is None:
+            self.memory = shared_memory.SharedMemory(create=True, size=num_slots * TABLE_SIZE)
+            self.owner = True
+        else:
+            self.memory = shared_memory.SharedMemory(name=name)
+            self.owner = False
+
+    @classmethod
+    def attach(cls, name: str, num_slots: int):
+        """
+        :param name: SharedStrategyTables.name of the block created by the parent
+        :param num_slots: the number of slots the block was created with
+        :return: the attached SharedStrategyTables
+        """
+        return cls(num_slots, name)
+
+    @property
+    def name(self) -> str:
+        return self.memory.name
+
+    def publish(self, slot: int, table: StrategyTable):
+        """
+        Copies a table into a slot
+        :param slot: the slot index (0 to num_slots - 1)
+        :param table: the table to publish
+        """
+        start = slot * TABLE_SIZE
+        self.memory.buf[start:start + TABLE_SIZE] = table.actions.tobytes()
+
+    def table(self, slot: int) -> StrategyTable:
+        """
+        :param slot: the slot index (0 to num_slots - 1)
+        :return: a (private) copy of the table in the slot
+        """
+        start = slot * TABLE_SIZE
+        return StrategyTable(array('b', bytes(self.memory.buf[start:start + TABLE_SIZE])))
+
+    def close(self):
+        """Detaches from the block, and frees it if this process created it"""
+        self.memory.close()
+        if self.owner:
+            self.memory.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
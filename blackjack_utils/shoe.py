@@ -1,6 +1,7 @@
 from blackjack_utils.card import Card
 from blackjack_utils.deck import Deck
 
+from array import array
 import random
 
 
@@ -43,3 +44,264 @@ class Shoe(Deck):
 
     def __str__(self):
         return str([str(card) for card in self.cards])
+
+
+class LazyShoe(Shoe):
+    """
+    Shoe that draws straight from the cards left (a Fisher-Yates shuffle done one draw at a time), so a hand only
+    pays for the 4-10 cards it uses instead of a full shuffle. It is always shuffled, shuffle() does nothing.
+    mark() saves the current composition and reset() goes back to it in O(1), so a base shoe can be reused
+    for every iteration instead of being copied and reshuffled.
+    Same draw/remove/len API as Shoe. With compact=True cards are rank ints, like CompactShoe.
+    """
+
+    _templates = {}
+
+    def __init__(self, decks_in_shoe=6, compact=False):
+        """
+        :param decks_in_shoe: the number of 52 card decks in the shoe
+        :param compact: draw and remove rank ints instead of Card objects
+        """
+        template = self._templates.get((decks_in_shoe, compact))
+        if template is None:
+            # suit * 13 + rank for each card, in the same order as Shoe (just the rank if compact)
+            template = array('b', [rank if compact else suit * 13 + rank
+                                   for _ in range(decks_in_shoe) for suit in [0, 1, 2, 3] for rank in range(0, 13)])
+            self._templates[(decks_in_shoe, compact)] = template
+        # codes[:remaining] are the cards left, the cards drawn or removed are kept after them
+        self.codes = array('b', template)
+        self.compact = compact
+        self.remaining = len(self.codes)
+        self.marked = self.remaining
+        self._random = random.random
+
+    @property
+    def cards(self):
+        """the cards left in the shoe (in no particular order)"""
+        return [self._card(code) for code in self.codes[:self.remaining]]
+
+    def _card(self, code):
+        return code if self.compact else Card().from_ints(code % 13, code // 13)
+
+    def shuffle(self):
+        """
+        Does nothing, every draw is already random
+        :return:
+        """
+
+    def draw(self):
+        """
+        Removes a random card from the shoe and returns it
+        :return: the card drawn (its rank if compact)
+        """
+        last = self.remaining - 1
+        index = int(self._random() * self.remaining)
+        codes = self.codes
+        code = codes[index]
+        codes[index] = codes[last]
+        codes[last] = code
+        self.remaining = last
+        return code if self.compact else Card().from_ints(code % 13, code // 13)
+
+    def draw_excluding(self, ranks):
+        """
+        Removes a random card whose rank isn't in ranks and returns it (cards drawn with an excluded rank are put back)
+        :return: the card drawn (its rank if compact)
+        """
+        if all(code % 13 in ranks for code in self.codes[:self.remaining]):
+            raise IndexError("no card left outside the excluded ranks")
+        while True:
+            card = self.draw()
+            if (card if self.compact else card.rank) not in ranks:
+                return card
+            # the card drawn is the one just past the cards left
+            self.remaining += 1
+
+    def remove(self, card):
+        """
+        Removes a specific card from the shoe
+        :param card: the card to be removed (its rank if compact)
+        :return:
+        """
+        code = card if self.compact else card.suit * 13 + card.rank
+        index = self.codes.index(code, 0, self.remaining)
+        last = self.remaining - 1
+        self.codes[index] = self.codes[last]
+        self.codes[last] = code
+        self.remaining = last
+
+    def mark(self):
+        """
+        Saves the current composition for reset()
+        :return:
+        """
+        self.marked = self.remaining
+
+    def reset(self):
+        """
+        Puts back every card drawn or removed since mark(), in O(1)
+        :return:
+        """
+        self.remaining = self.marked
+
+    def copy(self, seed=None):
+        """
+        :param seed: if given, the copy draws from its own random generator seeded with it, so copies made with
+                     the same seed draw the same cards (for common random numbers)
+        :return: a copy of the shoe
+        """
+        shoe = LazyShoe.__new__(LazyShoe)
+        shoe.codes = array('b', self.codes)
+        shoe.compact = self.compact
+        shoe.remaining = self.remaining
+        shoe.marked = self.marked
+        shoe._random = random.Random(seed).random if seed is not None else self._random
+        return shoe
+
+    def __len__(self):
+        return self.remaining
+
+
+class CountShoe(Shoe):
+    """
+    Shoe kept as a count of the cards left of each rank (of each rank and suit if track_suits), so remove and add
+    are O(1) and a draw picks a rank in proportion to the counts. The shoe is always shuffled, shuffle() does nothing.
+    snapshot()/restore() (and mark()/reset()) save and restore the composition, so a conditioned deal like
+    "remove the player's cards and the up card" can be set up once and restored for every iteration.
+    Same draw/remove/len API as Shoe. With compact=True cards are rank ints, like CompactShoe.
+    """
+
+    def __init__(self, decks_in_shoe=6, compact=False, track_suits=False):
+        """
+        :param decks_in_shoe: the number of 52 card decks in the shoe
+        :param compact: draw and remove rank ints instead of Card objects
+        :param track_suits: count each rank and suit separately, so Cards drawn have their real suit and
+                            remove takes out that exact card. Otherwise Cards drawn are all Hearts and remove only looks at the rank
+        """
+        self.compact = compact
+        self.track_suits = track_suits and not compact
+        self.counts = [decks_in_shoe * (1 if self.track_suits else 4)] * (52 if self.track_suits else 13)
+        self.remaining = 52 * decks_in_shoe
+        self.marked = self.snapshot()
+        self._random = random.random
+
+    @property
+    def cards(self):
+        """the cards left in the shoe (in no particular order)"""
+        return [self._card(index) for index, count in enumerate(self.counts) for _ in range(count)]
+
+    def _card(self, index):
+        if self.compact:
+            return index
+        if self.track_suits:
+            return Card().from_ints(index % 13, index // 13)
+        return Card().from_ints(index, 0)
+
+    def _index(self, card):
+        if self.compact:
+            return card
+        if self.track_suits:
+            return card.suit * 13 + card.rank
+        return card.rank
+
+    def shuffle(self):
+        """
+        Does nothing, every draw is already random
+        :return:
+        """
+
+    def draw(self):
+        """
+        Removes a random card from the shoe and returns it
+        :return: the card drawn (its rank if compact)
+        """
+        pick = int(self._random() * self.remaining)
+        counts = self.counts
+        index = 0
+        pick -= counts[0]
+        while pick >= 0:
+            index += 1
+            pick -= counts[index]
+        counts[index] -= 1
+        self.remaining -= 1
+        return self._card(index)
+
+    def draw_excluding(self, ranks):
+        """
+        Removes a random card whose rank isn't in ranks and returns it (cards drawn with an excluded rank are put back)
+        :return: the card drawn (its rank if compact)
+        """
+        if all(index % 13 in ranks for index, count in enumerate(self.counts) if count):
+            raise IndexError("no card left outside the excluded ranks")
+        while True:
+            card = self.draw()
+            if (card if self.compact else card.rank) not in ranks:
+                return card
+            self.add(card)
+
+    def remove(self, card):
+        """
+        Removes a specific card from the shoe
+        :param card: the card to be removed (its rank if compact)
+        :return:
+        """
+        index = self._index(card)
+        if self.counts[index] == 0:
+            raise ValueError(f"{card} is not in the shoe")
+        self.counts[index] -= 1
+        self.remaining -= 1
+
+    def add(self, card):
+        """
+        Puts a card back in the shoe
+        :param card: the card to put back (its rank if compact)
+        :return:
+        """
+        self.counts[self._index(card)] += 1
+        self.remaining += 1
+
+    def snapshot(self):
+        """
+        :return: the current composition, for restore()
+        """
+        return tuple(self.counts), self.remaining
+
+    def restore(self, snapshot):
+        """
+        Sets the composition back to a snapshot() (13 or 52 counts copied, no matter how many cards were drawn)
+        :return:
+        """
+        counts, self.remaining = snapshot
+        self.counts[:] = counts
+
+    def mark(self):
+        """
+        Saves the current composition for reset()
+        :return:
+        """
+        self.marked = self.snapshot()
+
+    def reset(self):
+        """
+        Puts back every card drawn or removed since mark()
+        :return:
+        """
+        self.restore(self.marked)
+
+    def copy(self, seed=None):
+        """
+        :param seed: if given, the copy draws from its own random generator seeded with it, so copies made with
+                     the same seed draw the same cards (for common random numbers)
+        :return: a copy of the shoe
+        """
+        shoe = CountShoe.__new__(CountShoe)
+        shoe.compact = self.compact
+        shoe.track_suits = self.track_suits
+        shoe.counts = list(self.counts)
+        shoe.remaining = self.remaining
+        shoe.marked = self.marked
+        shoe._random = random.Random(seed).random if seed is not None else self._random
+        return shoe
+
+    def __len__(self):
+        return self.remaining
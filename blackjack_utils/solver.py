@@ -0,0 +1,144 @@
+from collections import Counter
+from functools import lru_cache
+from typing import Dict, Tuple
+
+import blackjack_utils.game_config as gc
+import blackjack_utils.dealer as dealer
+from blackjack_utils.utils import build_combos, determine_best_action, PLAYER_TOTALS, PAIRED_TOTALS, BASE_TOTAL
+
+# actions whose solved EVs are approximations (see Solver.split_ev), left out when validating the simulator
+APPROXIMATE_ACTIONS = {'split'}
+
+def _take(counts: Tuple[int, ...], index: int) -> Tuple[int, ...]:
+    return counts[:index] + (counts[index] - 1,) + counts[index + 1:]
+
+
+def dealer_blackjack_probability(dealer_card_value: int, counts: Tuple[int, ...]) -> float:
+    """
+    :return: probability the hole card gives the dealer blackjack
+    """
+    if dealer_card_value == 11:
+        return counts[10 - 2] / sum(counts)
+    if dealer_card_value == 10:
+        return counts[11 - 2] / sum(counts)
+    return 0.0
+
+
+class Solver:
+    """
+    Computes odds table EVs exactly by recursing over the cards left in the shoe (no Monte Carlo).
+    Hands are scored like the player total workers in generate_odds.py (simulate_hand with
+    ignore_dealer_blackjack=True, so a dealer blackjack is a push and a 2 card 21 after a split pays blackjack).
+    After the first action the player plays the best of stand/hit/double for the exact shoe composition.
+    The 20 row is scored with dealer blackjack as a loss, like the stand and hit/double phases of generate_odds.py.
+    Stand, hit and double EVs are exact. Split EVs are NOT: see split_ev, they are an approximation and shouldn't
+    be used as ground truth for the simulator (APPROXIMATE_ACTIONS).
+    """
+
+    def __init__(self, game_config: gc.GameConfig):
+        self.game_config = game_config
+        self.base_counts = dealer.shoe_value_counts(game_config.decks_in_shoe)
+        self.ignore_dealer_blackjack = True
+        self._best_ev = lru_cache(maxsize=None)(self._best_ev)
+
+    def clear_cache(self):
+        self._best_ev.cache_clear()
+        dealer.dealer_distribution.cache_clear()
+        dealer._dealer_play.cache_clear()
+
+    def stand_ev(self, dealer_card_value: int, counts: Tuple[int, ...], total: int, blackjack=False) -> float:
+        if total > 21:
+            return dealer.stand_ev(self.game_config, total, (0, 0, 0, 0, 0, 0, dealer_blackjack_probability(dealer_card_value, counts)),
+                                   ignore_dealer_blackjack=self.ignore_dealer_blackjack)
+        distribution = dealer.dealer_distribution(dealer_card_value, counts, self.game_config.dealer_hit_soft_17)
+        return dealer.stand_ev(self.game_config, total, distribution, blackjack, self.ignore_dealer_blackjack)
+
+    def _draws(self, counts: Tuple[int, ...], total: int, soft: bool):
+        """yields (probability, counts after the draw, new total, new soft) for each card value left in the shoe"""
+        remaining = sum(counts)
+        for index, count in enumerate(counts):
+            if count:
+                next_total, next_soft = dealer._add_value(total, soft, index + 2)
+                yield count / remaining, _take(counts, index), next_total, next_soft
+
+    def _best_ev(self, dealer_card_value: int, counts: Tuple[int, ...], total: int, soft: bool, can_double: bool) -> float:
+        """EV of a hand of 3 or more cards, playing the best of stand, hit and (like simulate_hand) double"""
+        stand = self.stand_ev(dealer_card_value, counts, total)
+        if total >= 21:
+            return stand
+        best = max(stand, self.hit_ev(dealer_card_value, counts, total, soft, can_double))
+        if can_double:
+            best = max(best, self.double_ev(dealer_card_value, counts, total, soft))
+        return best
+
+    def hit_ev(self, dealer_card_value: int, counts: Tuple[int, ...], total: int, soft: bool, can_double=True) -> float:
+        return sum(probability * self._best_ev(dealer_card_value, next_counts, next_total, next_soft, can_double)
+                   for probability, next_counts, next_total, next_soft in self._draws(counts, total, soft))
+
+    def double_ev(self, dealer_card_value: int, counts: Tuple[int, ...], total: int, soft: bool) -> float:
+        return 2 * sum(probability * self.stand_ev(dealer_card_value, next_counts, next_total)
+                       for probability, next_counts, next_total, _ in self._draws(counts, total, soft))
+
+    def split_ev(self, dealer_card_value: int, counts: Tuple[int, ...], pair_value: int) -> float:
+        """
+        Approximate EV of splitting a pair, counts has both pair cards and the up card removed.
+        Twice the EV of one post split hand played from the composition, so it ignores the cards the first hand
+        takes from the second one, and never resplits (the simulator resplits pairs the strategy splits).
+        Split hands can be doubled only if game_config.double_after_split
+        """
+        can_double = self.game_config.double_after_split
+        first_total, first_soft = dealer._add_value(0, False, pair_value)
+        ev = 0.0
+        for probability, next_counts, total, soft in self._draws(counts, first_total, first_soft):
+            if total == 21:
+                ev += probability * self.stand_ev(dealer_card_value, next_counts, total, blackjack=True)
+                continue
+            options = [self.stand_ev(dealer_card_value, next_counts, total), self.hit_ev(dealer_card_value, next_counts, total, soft, can_double)]
+            if can_double:
+                options.append(self.double_ev(dealer_card_value, next_counts, total, soft))
+            ev += probability * max(options)
+        return 2 * ev
+
+    def solve_cell(self, player_total: str, dealer_card_value: int, combos=None) -> Dict[str, float]:
+        """
+        :param player_total: hand label, e.g. '16', 'soft_18', 'paired_8'
+        :param dealer_card_value: value of the dealer up card (2-11)
+        :param combos: build_combos() output, dealt hands are weighted the same way the workers sample them
+        :return: dict of action -> EV (split only for paired hands)
+        """
+        combos = combos if combos is not None else build_combos()
+        weights = Counter(tuple(sorted((c1.get_card_value(), c2.get_card_value()))) for c1, c2 in combos[player_total])
+        num_combos = sum(weights.values())
+        evs = Counter()
+        for (value_1, value_2), weight in weights.items():
+            counts = dealer.remove_values(self.base_counts, value_1, value_2, dealer_card_value)
+            total, soft = dealer._add_value(*dealer._add_value(0, False, value_1), value_2)
+            probability = weight / num_combos
+            evs['double'] += probability * self.double_ev(dealer_card_value, counts, total, soft)
+            evs['hit'] += probability * self.hit_ev(dealer_card_value, counts, total, soft)
+            evs['stand'] += probability * self.stand_ev(dealer_card_value, counts, total)
+            if player_total.startswith('paired'):
+                evs['split'] += probability * self.split_ev(dealer_card_value, counts, value_1)
+        return dict(evs)
+
+    def solve_table(self, player_totals=None, progress=None) -> list:
+        """
+        :param player_totals: hand labels to solve (default: every hand generate_odds.py writes)
+        :param progress: optional callback(player_total) called after each hand is solved
+        :return: list of rows (dicts) in the odds csv schema
+        """
+        combos = build_combos()
+        rows = []
+        for player_total in player_totals or PLAYER_TOTALS + PAIRED_TOTALS:
+            self.ignore_dealer_blackjack = player_total != BASE_TOTAL
+            for dealer_card_value in dealer.CARD_VALUES:
+                row = self.solve_cell(player_total, dealer_card_value, combos)
+                row['best_action'] = determine_best_action(row)
+                row.update(player_total=player_total, dealer_card_up=str(dealer_card_value))
+                rows.append(row)
+            # compositions rarely repeat across hands, keep the caches from growing for the whole table
+            self.clear_cache()
+            if progress:
+                progress(player_total)
+        self.ignore_dealer_blackjack = True
+        return rows
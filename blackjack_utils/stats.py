@@ -0,0 +1,120 @@
+import math
+
+
+class RunningStats:
+    """
+    Count, sum and sum of squares of a stream of results, which is enough for the mean and its standard error.
+    Stats collected separately (in different workers or runs) combine exactly with merge.
+    """
+    __slots__ = ('n', 'total', 'total_squares')
+
+    def __init__(self, n=0, total=0.0, total_squares=0.0):
+        self.n = n
+        self.total = total
+        self.total_squares = total_squares
+
+    def add(self, value: float):
+        self.n += 1
+        self.total += value
+        self.total_squares += value * value
+
+    def merge(self, other):
+        """
+        Adds another RunningStats' results into this one
+        :return: self
+        """
+        self.n += other.n
+        self.total += other.total
+        self.total_squares += other.total_squares
+        return self
+
+    @classmethod
+    def combine(cls, stats):
+        """
+        :param stats: iterable of RunningStats
+        :return: a new RunningStats with all of their results
+        """
+        combined = cls()
+        for other in stats:
+            combined.merge(other)
+        return combined
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.n if self.n else math.nan
+
+    @property
+    def variance(self) -> float:
+        """sample variance of the results"""
+        if self.n < 2:
+            return math.nan
+        return max(self.total_squares - self.total * self.total / self.n, 0.0) / (self.n - 1)
+
+    @property
+    def standard_error(self) -> float:
+        """standard error of the mean"""
+        return math.sqrt(self.variance / self.n) if self.n >= 2 else math.nan
+
+    def __getstate__(self):
+        return (self.n, self.total, self.total_squares)
+
+    def __setstate__(self, state):
+        self.n, self.total, self.total_squares = state
+
+    def __repr__(self):
+        return f"RunningStats(n={self.n}, mean={self.mean:.6f}, standard_error={self.standard_error:.6f})"
+
+
+class CellStats:
+    """
+    Sufficient statistics of one odds table cell: a RunningStats for each simulated action, one for the per hand
+    difference of each pair of actions, and the EVs that were computed exactly instead (e.g. an exact stand).
+    Cells simulated in different runs merge exactly, so a cell can be topped up without rerunning it, as long as
+    the runs' samples are independent. The seeds of the runs are kept so a run can't be merged in twice.
+    """
+    __slots__ = ('stats', 'differences', 'exact', 'seeds')
+
+    def __init__(self, stats: dict = None, differences: dict = None, exact: dict = None, seeds: list = None):
+        """
+        :param stats: action -> RunningStats
+        :param differences: (action, action) -> RunningStats of the first action's outcome minus the second's
+        :param exact: action -> exact EV
+        :param seeds: the seeds of the runs whose samples are in the stats
+        """
+        self.stats = stats or {}
+        self.differences = differences or {}
+        self.exact = exact or {}
+        self.seeds = seeds or []
+
+    def merge(self, other):
+        """
+        Adds another run's results for the same cell into this one (exact EVs are kept from this one)
+        :return: self
+        """
+        if set(self.stats) != set(other.stats) or set(self.differences) != set(other.differences):
+            raise ValueError(f"can't merge stats for actions {sorted(other.stats)} into stats for {sorted(self.stats)}")
+        if set(self.seeds) & set(other.seeds):
+            raise ValueError(f"can't merge stats from seeds {other.seeds} into stats from seeds {self.seeds}, a run's samples would be counted twice")
+        for action, action_stats in other.stats.items():
+            self.stats[action].merge(action_stats)
+        for pair, pair_stats in other.differences.items():
+            self.differences[pair].merge(pair_stats)
+        self.seeds = self.seeds + other.seeds
+        return self
+
+    @property
+    def samples(self) -> int:
+        return max((action_stats.n for action_stats in self.stats.values()), default=0)
+
+    def to_dict(self) -> dict:
+        """:return: the stats as json-able lists of (n, total, total_squares)"""
+        return {'stats': {action: list(action_stats.__getstate__()) for action, action_stats in self.stats.items()},
+                'differences': {f"{first},{second}": list(pair_stats.__getstate__()) for (first, second), pair_stats in self.differences.items()},
+                'exact': dict(self.exact), 'seeds': list(self.seeds)}
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        """:return: the CellStats of a to_dict()"""
+        return cls({action: RunningStats(*values) for action, values in data['stats'].items()},
+                   {tuple(pair.split(',')): RunningStats(*values) for pair, values in data['differences'].items()},
+                   data.get('exact'), data.get('seeds'))
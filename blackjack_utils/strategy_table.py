@@ -0,0 +1,142 @@
+from array import array
+import csv
+
+ACTIONS = ['stand', 'hit', 'double', 'split', 'surrender']
+STAND, HIT, DOUBLE, SPLIT, SURRENDER = range(len(ACTIONS))
+ACTION_CODES = {action: code for code, action in enumerate(ACTIONS)}
+
+# hand classes, in the same labels used by the odds csv files / build_combos
+HAND_LABELS = ([str(total) for total in range(2, 22)]
+               + [f"soft_{total}" for total in range(12, 22)]
+               + [f"paired_{total}" for total in range(2, 21, 2)]
+               + ['paired_aces'])
+HAND_CLASSES = {label: index for index, label in enumerate(HAND_LABELS)}
+SOFT_OFFSET = HAND_CLASSES['soft_12']
+PAIRED_OFFSET = HAND_CLASSES['paired_2']
+PAIRED_ACES = HAND_CLASSES['paired_aces']
+
+# dealer up card values 2-11 (ace is 11)
+UPCARD_VALUES = list(range(2, 12))
+NUM_UPCARDS = len(UPCARD_VALUES)
+
+
+def hand_class(total: int, is_soft: bool, is_paired: bool) -> int:
+    """
+    :param total: the (best) score of the hand
+    :param is_soft: True if an ace is being counted as 11
+    :param is_paired: True if the hand is 2 cards of the same value
+    :return: the index of the hand's row in a StrategyTable
+    """
+    if is_paired:
+        if is_soft:
+            return PAIRED_ACES
+        return PAIRED_OFFSET + total // 2 - 1
+    if is_soft:
+        return SOFT_OFFSET + total - 12
+    return total - 2
+
+
+def normalize_label(value) -> str:
+    """
+    :param value: a player_total value read from a csv or DataFrame (20, 20.0, '20', 'soft_18')
+    :return: its hand label ('20', 'soft_18')
+    """
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value)
+
+
+def upcard_value(value) -> int:
+    """
+    :param value: a dealer_card_up value read from a csv or DataFrame (10, 10.0, '10')
+    :return: the up card's value (2-11)
+    """
+    return int(float(value))
+
+
+class StrategyTable:
+    """
+    Dense (hand class x dealer up card) table of integer action codes, built once from an odds table.
+    Lookups are a single array index, so it can be used in the simulation loop instead of a DataFrame.
+    Cells missing from the source table default to stand.
+    """
+    __slots__ = ('actions',)
+
+    def __init__(self, actions: array = None):
+        if actions is None:
+            actions = array('b', [STAND]) * (len(HAND_LABELS) * NUM_UPCARDS)
+        self.actions = actions
+
+    @classmethod
+    def from_rows(cls, rows):
+        """
+        :param rows: iterable of (player_total, dealer_card_up, best_action)
+        If a cell appears more than once, the first row wins (same as filtering a DataFrame and taking iloc[0])
+        :return: the StrategyTable
+        """
+        table = cls()
+        seen = bytearray(len(table.actions))
+        for player_total, dealer_card_up, best_action in rows:
+            label = normalize_label(player_total)
+            if label not in HAND_CLASSES or best_action not in ACTION_CODES:
+                continue
+            index = HAND_CLASSES[label] * NUM_UPCARDS + upcard_value(dealer_card_up) - 2
+            if not seen[index]:
+                seen[index] = 1
+                table.actions[index] = ACTION_CODES[best_action]
+        return table
+
+    @classmethod
+    def from_dataframe(cls, data):
+        """
+        :param data: odds DataFrame with player_total, dealer_card_up and best_action columns
+        :return: the StrategyTable
+        """
+        return cls.from_rows(zip(data['player_total'], data['dealer_card_up'], data['best_action']))
+
+    @classmethod
+    def from_csv(cls, file_name: str):
+        """
+        :param file_name: odds csv (player_total,dealer_card_up,...,best_action)
+        :return: the StrategyTable
+        """
+        with open(file_name, newline='') as f:
+            return cls.from_rows((row['player_total'], row['dealer_card_up'], row['best_action'])
+                                 for row in csv.DictReader(f))
+
+    def lookup(self, hand_class_index: int, dealer_card_value: int) -> int:
+        """
+        :param hand_class_index: see hand_class()
+        :param dealer_card_value: value of the dealer up card (2-11)
+        :return: the action code (STAND, HIT, DOUBLE, SPLIT, SURRENDER)
+        """
+        return self.actions[hand_class_index * NUM_UPCARDS + dealer_card_value - 2]
+
+    def best_action(self, label: str, dealer_card_value: int) -> str:
+        """
+        :return: the action name for a hand label (e.g. 'soft_17') and dealer up card value
+        """
+        return ACTIONS[self.lookup(HAND_CLASSES[label], dealer_card_value)]
+
+    def with_action(self, label: str, action: str):
+        """
+        :param label: the hand label whose row is overridden (e.g. '16', 'paired_8')
+        :param action: the action to take against every dealer up card
+        :return: a copy of this table with the row forced to the action
+        """
+        table = self.copy()
+        start = HAND_CLASSES[label] * NUM_UPCARDS
+        table.actions[start:start + NUM_UPCARDS] = array('b', [ACTION_CODES[action]]) * NUM_UPCARDS
+        return table
+
+    def copy(self):
+        return StrategyTable(array('b', self.actions))
+
+    def __eq__(self, other):
+        return isinstance(other, StrategyTable) and self.actions == other.actions
+
+    def __getstate__(self):
+        return self.actions.tobytes()
+
+    def __setstate__(self, state):
+        self.actions = array('b', state)
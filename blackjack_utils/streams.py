@@ -0,0 +1,36 @@
+import hashlib
+import random
+from typing import List
+
+
+def stream_seed(seed, *key) -> int:
+    """
+    Derives the seed of one chunk of work's random stream from the run's seed and the chunk's key, e.g.
+    (config rules, cell, chunk index). Like numpy's SeedSequence spawning, nearby keys give unrelated streams,
+    and the seed only depends on the key, so a chunk draws the same cards whichever worker runs it (and however many there are)
+    :param seed: the run's seed
+    :param key: ints, strings, floats, bools or tuples of them identifying the chunk
+    :return: a 64 bit seed
+    """
+    # hashed from the repr rather than with hash(), which is salted differently in every process
+    return int.from_bytes(hashlib.blake2b(repr((seed,) + key).encode(), digest_size=8).digest(), 'little')
+
+
+def seed_stream(seed, *key):
+    """
+    Seeds the random module (which the shoes and simulate_hand draw from) for a chunk of work, see stream_seed
+    Does nothing if seed is None
+    """
+    if seed is not None:
+        random.seed(stream_seed(seed, *key))
+
+
+def chunk_sizes(num_iterations: int, chunk_iterations: int) -> List[int]:
+    """
+    :return: num_iterations split into chunks of chunk_iterations (the last one takes the remainder), so the chunks
+             don't depend on the number of workers
+    """
+    chunks = [chunk_iterations] * (num_iterations // chunk_iterations)
+    if num_iterations % chunk_iterations:
+        chunks.append(num_iterations % chunk_iterations)
+    return chunks
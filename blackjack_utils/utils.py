@@ -1,9 +1,22 @@
-from typing import List
-import pandas as pd
+from typing import List, Mapping, Union, TYPE_CHECKING
 import blackjack_utils.game_config as gc
 import blackjack_utils.shoe as shoe
 import blackjack_utils.card as card
 import blackjack_utils.deck as deck
+from blackjack_utils.compact import HandState, RANK_VALUES
+from blackjack_utils.strategy_table import StrategyTable, hand_class, ACTION_CODES, STAND, HIT, DOUBLE, SPLIT, SURRENDER
+
+if TYPE_CHECKING:
+    # only for the annotations, the engine runs without pandas (a DataFrame passed in is only indexed)
+    import pandas as pd
+
+# player hands in an odds table, in the order generate_odds.py simulates them
+PLAYER_TOTALS = ['20', '19', '18', '17', '16', '15', '14', '13', '12', '11', '10',
+                 'soft_20', 'soft_19', 'soft_18', 'soft_17', 'soft_16', 'soft_15', 'soft_14', 'soft_13',
+                 '9', '8', '7', '6', '5']
+PAIRED_TOTALS = ['paired_20', 'paired_18', 'paired_16', 'paired_14', 'paired_12', 'paired_10', 'paired_8', 'paired_6', 'paired_4', 'paired_aces']
+# the row generate_odds.py simulates first (from a king and a queen), against the full dealer hand
+BASE_TOTAL = '20'
 
 
 def is_soft_count(player_cards):
@@ -14,56 +27,98 @@ def is_soft_count(player_cards):
         aces -= 1
     return total > 10 and aces > 0
 
-def simulate_hand(game_config: gc.GameConfig, player_starting_cards: List[card.Card], dealer_card_up:card.Card, deck: shoe.Shoe, ev_actions: pd.DataFrame, ignore_dealer_blackjack=False):
+def simulate_hand(game_config: gc.GameConfig, player_starting_cards: List[card.Card], dealer_card_up:card.Card, deck: shoe.Shoe, ev_actions: Union[StrategyTable, 'pd.DataFrame'], ignore_dealer_blackjack=False, dealer_hole_card=None):
     """
         uses an EV action table like above to make a decision, then play through the hand
+        ev_actions can be a StrategyTable (fast, O(1) lookups) or an odds DataFrame
+        a HandState hand (with an int dealer up card rank and a CompactShoe) is played by simulate_hand_state
+        dealer_hole_card is the dealer's hole card if it was already dealt, otherwise it is drawn once the player is done
     """
+    if isinstance(player_starting_cards, HandState):
+        return simulate_hand_state(game_config, player_starting_cards, dealer_card_up, deck, ev_actions, ignore_dealer_blackjack, dealer_hole_card)
     player_total = game_config.score_hand(player_starting_cards)
     is_paired = player_starting_cards[0].get_card_value() == player_starting_cards[1].get_card_value() and len(player_starting_cards) == 2
     is_soft = is_soft_count(player_starting_cards)
-    player_hand_str = f"{player_total}"
-    if is_paired and is_soft:
-        player_hand_str = "paired_aces"
-    elif is_paired:
-        player_hand_str = f"paired_{player_total}"
-    elif is_soft:
-        player_hand_str = f"soft_{player_total}"
         
     if player_total > 20:
-        action = 'stand'
+        action = STAND
+    elif isinstance(ev_actions, StrategyTable):
+        action = ev_actions.lookup(hand_class(player_total, is_soft, is_paired), dealer_card_up.get_card_value())
     else:
+        player_hand_str = f"{player_total}"
+        if is_paired and is_soft:
+            player_hand_str = "paired_aces"
+        elif is_paired:
+            player_hand_str = f"paired_{player_total}"
+        elif is_soft:
+            player_hand_str = f"soft_{player_total}"
         try:
-            action = ev_actions[(ev_actions['player_total'] == player_hand_str) & (ev_actions['dealer_card_up'] == str(dealer_card_up.get_card_value()))]['best_action'].iloc[0]
+            action = ACTION_CODES[ev_actions[(ev_actions['player_total'] == player_hand_str) & (ev_actions['dealer_card_up'] == str(dealer_card_up.get_card_value()))]['best_action'].iloc[0]]
         except IndexError:
-            action = 'stand'
+            action = STAND
             print(f"player_total: {player_total}, dealer_card_up: {dealer_card_up.get_card_value()}, ev_actions: {ev_actions}")
     outcome_multiplier = 1
     can_keep_hitting = True
     player_cards = player_starting_cards.copy()
-    if action == 'hit':
+    if action == HIT:
         player_cards.append(deck.draw())
-    elif action == 'double':
+    elif action == DOUBLE:
         outcome_multiplier = 2
         can_keep_hitting = False
         player_cards.append(deck.draw())
-    elif action == 'stand':
+    elif action == STAND:
         can_keep_hitting = False
-    elif action == 'split':
+    elif action == SPLIT:
         player_cards_a = [player_cards[0]]
         player_cards_b = [player_cards[1]]
         player_cards_a.append(deck.draw())
         player_cards_b.append(deck.draw())
-        outcome_a = simulate_hand(game_config, player_cards_a, dealer_card_up, deck, ev_actions, ignore_dealer_blackjack)
-        outcome_b = simulate_hand(game_config, player_cards_b, dealer_card_up, deck, ev_actions, ignore_dealer_blackjack)
+        outcome_a = simulate_hand(game_config, player_cards_a, dealer_card_up, deck, ev_actions, ignore_dealer_blackjack, dealer_hole_card)
+        outcome_b = simulate_hand(game_config, player_cards_b, dealer_card_up, deck, ev_actions, ignore_dealer_blackjack, dealer_hole_card)
         return outcome_a + outcome_b
-    elif action == 'surrender':
+    elif action == SURRENDER:
         return -0.5
     player_total = game_config.score_hand(player_cards)
     if player_total > 20:
         can_keep_hitting = False
     if can_keep_hitting:
-        return simulate_hand(game_config, player_cards, dealer_card_up, deck, ev_actions, ignore_dealer_blackjack)
-    return outcome_multiplier * game_config.evaluate(player_cards, [dealer_card_up, deck.draw()], deck, ignore_dealer_blackjack)
+        return simulate_hand(game_config, player_cards, dealer_card_up, deck, ev_actions, ignore_dealer_blackjack, dealer_hole_card)
+    hole_card = deck.draw() if dealer_hole_card is None else dealer_hole_card
+    return outcome_multiplier * game_config.evaluate(player_cards, [dealer_card_up, hole_card], deck, ignore_dealer_blackjack)
+
+def simulate_hand_state(game_config: gc.GameConfig, player_hand: HandState, dealer_card_up: int, deck, ev_actions: StrategyTable, ignore_dealer_blackjack=False, dealer_hole_card=None):
+    """
+        compact engine version of simulate_hand, plays the same way on rank ints and running hand state
+        :param player_hand: the player's starting hand (not modified)
+        :param dealer_card_up: rank of the dealer up card
+        :param deck: a CompactShoe
+        :param dealer_hole_card: rank of the dealer hole card if it was already dealt
+    """
+    if not isinstance(ev_actions, StrategyTable):
+        ev_actions = StrategyTable.from_dataframe(ev_actions)
+    dealer_card_value = RANK_VALUES[dealer_card_up]
+    player_hand = player_hand.copy()
+    outcome_multiplier = 1
+    while player_hand.total <= 20:
+        action = ev_actions.lookup(hand_class(player_hand.total, player_hand.is_soft(), player_hand.is_paired), dealer_card_value)
+        if action == HIT:
+            player_hand.add(deck.draw())
+        elif action == DOUBLE:
+            outcome_multiplier = 2
+            player_hand.add(deck.draw())
+            break
+        elif action == SPLIT:
+            player_hand_a = HandState.from_ranks(player_hand.first_rank, deck.draw())
+            player_hand_b = HandState.from_ranks(player_hand.first_rank, deck.draw())
+            outcome_a = simulate_hand_state(game_config, player_hand_a, dealer_card_up, deck, ev_actions, ignore_dealer_blackjack, dealer_hole_card)
+            outcome_b = simulate_hand_state(game_config, player_hand_b, dealer_card_up, deck, ev_actions, ignore_dealer_blackjack, dealer_hole_card)
+            return outcome_a + outcome_b
+        elif action == SURRENDER:
+            return -0.5
+        else:
+            break
+    dealer_hand = HandState.from_ranks(dealer_card_up, deck.draw() if dealer_hole_card is None else dealer_hole_card)
+    return outcome_multiplier * game_config.evaluate_state(player_hand, dealer_hand, deck, ignore_dealer_blackjack)
 
 def build_combos():
     combos = {}
@@ -92,8 +147,12 @@ def build_combos():
     return combos
 
 
-def determine_best_action(row: pd.Series) -> pd.DataFrame:
-    if 'split' in row.index and row['split'] > row['hit'] and row['split'] > row['stand'] and row['split'] > row['double']:
+def determine_best_action(row: Mapping[str, float]) -> str:
+    """
+    :param row: odds row (dict or pandas Series) with hit, stand, double and optionally split EVs
+    :return: the action with the highest EV
+    """
+    if 'split' in row and row['split'] > row['hit'] and row['split'] > row['stand'] and row['split'] > row['double']:
         return 'split'
     if row['double'] > row['hit'] and row['double'] > row['stand']:
         return 'double'
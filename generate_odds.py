@@ -1,14 +1,31 @@
-import pandas as pd
 import blackjack_utils.game_config as gc
 import blackjack_utils.shoe as shoe
 import blackjack_utils.card as card
 import random
 import blackjack_utils.deck as deck
-from blackjack_utils.utils import simulate_hand, build_combos, determine_best_action
-import threading
+from blackjack_utils.utils import simulate_hand, build_combos, determine_best_action, PLAYER_TOTALS, PAIRED_TOTALS, BASE_TOTAL
+from blackjack_utils.strategy_table import HAND_LABELS, StrategyTable, hand_class, normalize_label, upcard_value
+from blackjack_utils.compact import CompactShoe, HandState, RANK_VALUES
+import blackjack_utils.dealer as dealer
+from blackjack_utils.solver import Solver, APPROXIMATE_ACTIONS
+from blackjack_utils.scheduler import CellScheduler, player_total_dependencies
+from blackjack_utils.shared_tables import SharedStrategyTables
+from blackjack_utils.shards import ShardPool, DirectoryStrategyTables, run_shard_worker, TABLES
+from blackjack_utils.stats import RunningStats, CellStats
+from blackjack_utils.checkpoint import RunCheckpoint, stats_path, read_cell_stats, write_cell_stats
+from blackjack_utils.instrumentation import EventLog, write_folded
+from blackjack_utils.counting import COUNT_SYSTEMS, count_bucket
+from blackjack_utils.session import Session
+from blackjack_utils.streams import seed_stream, stream_seed, chunk_sizes
 import multiprocessing
+import subprocess
+import sys
+from itertools import combinations
 import time
 import argparse
+import csv
+import json
+import os
 
 NUM_THREADS = 12
 ITERATIONS_PER_THREAD = 400_000 // NUM_THREADS
@@ -61,30 +78,179 @@ BLACKJACK_PAYS = 1.5
 # SURRENDER_ALLOWED = True
 # BLACKJACK_PAYS = 6/5
 DECKS_IN_SHOE = 6
+ENGINE = 'compact'
+SHOE = 'lazy'
+
+def copy_deck(base_deck):
+    """Copies a Shoe, CompactShoe, LazyShoe or CountShoe"""
+    if isinstance(base_deck, (CompactShoe, shoe.LazyShoe, shoe.CountShoe)):
+        return base_deck.copy()
+    deck_copy = shoe.Shoe(6)
+    deck_copy.cards = base_deck.cards.copy()
+    return deck_copy
+
+def fresh_deck(base_deck):
+    """
+    :return: a shuffled copy of the base shoe. A LazyShoe or CountShoe is just reset to its mark, it draws at random anyway
+    """
+    if isinstance(base_deck, (shoe.LazyShoe, shoe.CountShoe)):
+        base_deck.reset()
+        return base_deck
+    deck_copy = copy_deck(base_deck)
+    deck_copy.shuffle()
+    return deck_copy
+
+def new_shoe(engine, shoe_kind, shuffle=True):
+    """
+    :param shoe_kind: 'lazy' (LazyShoe), 'counts' (CountShoe) or 'shuffled' (a whole shoe shuffled, unless shuffle is False)
+    :return: a 6 deck shoe for the engine ('cards' or 'compact')
+    """
+    if shoe_kind == 'lazy':
+        return shoe.LazyShoe(6, compact=engine == 'compact')
+    if shoe_kind == 'counts':
+        return shoe.CountShoe(6, compact=engine == 'compact')
+    deck = CompactShoe(6) if engine == 'compact' else shoe.Shoe(6)
+    if shuffle:
+        deck.shuffle()
+    return deck
+
+def dealer_hand(dealer_card_up, hole_card):
+    """Starting dealer hand for either engine (Card up card -> list of Card, rank -> HandState)"""
+    if isinstance(dealer_card_up, int):
+        return HandState.from_ranks(dealer_card_up, hole_card)
+    return [dealer_card_up, hole_card]
+
+# CountShoes with a player combo and up card removed, keyed by (player card ranks, up card rank), so deal_cell
+# restores one instead of removing the cards again every iteration
+_conditioned_shoes = {}
+
+def deal_cell(engine, combos_for_total, dealer_card_rank, shoe_kind='shuffled', player_cards=None):
+    """
+    Deals a shuffled shoe with a random combo for the player total and the dealer up card removed
+    :param shoe_kind: see new_shoe
+    :param player_cards: the combo to deal (default: a random one from combos_for_total)
+    :return: (player_cards, dealer_card_up, deck) for the engine ('cards' or 'compact')
+    """
+    if player_cards is None:
+        player_cards = random.choice(combos_for_total)
+    if shoe_kind == 'counts':
+        key = (player_cards[0].rank, player_cards[1].rank, dealer_card_rank, engine)
+        if key not in _conditioned_shoes:
+            _conditioned_shoes[key] = base_cell(engine, player_cards, dealer_card_rank, shoe_kind)[2]
+        deck = _conditioned_shoes[key]
+        deck.reset()
+        if engine == 'compact':
+            return HandState.from_cards(player_cards), dealer_card_rank, deck
+        return list(player_cards), card.Card().from_ints(dealer_card_rank, 0), deck
+    deck = new_shoe(engine, shoe_kind)
+    if engine == 'compact':
+        deck.remove(player_cards[0].rank)
+        deck.remove(player_cards[1].rank)
+        deck.remove(dealer_card_rank)
+        return HandState.from_cards(player_cards), dealer_card_rank, deck
+    player_cards = list(player_cards)
+    dealer_card_up = card.Card().from_ints(dealer_card_rank, 0)
+    deck.remove(player_cards[0])
+    deck.remove(player_cards[1])
+    deck.remove(dealer_card_up)
+    return player_cards, dealer_card_up, deck
+
+def base_cell(engine, player_cards, dealer_card_rank, shoe_kind='shuffled'):
+    """
+    Unshuffled shoe with the player cards and dealer up card removed, for the stand and hit/double workers
+    :param shoe_kind: see new_shoe, a LazyShoe or CountShoe is marked after the removals so fresh_deck can reset it
+    :return: (player_cards, dealer_card_up, deck) for the engine ('cards' or 'compact')
+    """
+    deck = new_shoe(engine, shoe_kind, shuffle=False)
+    if engine == 'compact':
+        deck.remove(player_cards[0].rank)
+        deck.remove(player_cards[1].rank)
+        deck.remove(dealer_card_rank)
+        player_cards, dealer_card_up = HandState.from_cards(player_cards), dealer_card_rank
+    else:
+        dealer_card_up = card.Card().from_ints(dealer_card_rank, 0)
+        deck.remove(player_cards[0])
+        deck.remove(player_cards[1])
+        deck.remove(dealer_card_up)
+    if shoe_kind != 'shuffled':
+        deck.mark()
+    return player_cards, dealer_card_up, deck
+
+def base_player_cards():
+    """the king and queen the stand and hit/double phases are simulated from"""
+    return [card.Card().from_ints(11, 0), card.Card().from_ints(10, 0)]
+
+# per run state of a pool worker, set once by init_worker
+_worker = {}
+
+def init_worker(tables_name, num_slots, game_configs, slot_configs, engine, crn=False, seed=None, shoe_kind='shuffled', peek=False,
+                tables_class=SharedStrategyTables):
+    """
+    Pool initializer, attaches the worker to the shared strategy tables and sets up the state every task uses,
+    so task arguments are only a few integers
+    :param tables_name: SharedStrategyTables.name of the parent's tables
+    :param num_slots: the number of table slots
+    :param game_configs: the GameConfig of each odds table being generated
+    :param slot_configs: index into game_configs for each table slot
+    :param crn: play every action from the same shuffled shoe (see play_actions)
+    :param seed: the run's seed, or one per game config. Every task seeds its own random stream from it and the task's
+                 (rules, cell, chunk index), see seed_task
+    :param shoe_kind: the kind of shoe to deal from (see new_shoe)
+    :param peek: deal the player total workers' hole card on the condition the dealer has no blackjack (see peek_condition)
+    :param tables_class: SharedStrategyTables, or DirectoryStrategyTables for shard workers on other hosts
+    """
+    _worker['seeds'] = seed if isinstance(seed, list) else [seed] * len(game_configs)
+    _worker['tables'] = tables_class.attach(tables_name, num_slots)
+    _worker['forced'] = {}
+    _worker['game_configs'] = game_configs
+    _worker['slot_configs'] = slot_configs
+    _worker['engine'] = engine
+    _worker['crn'] = crn
+    _worker['shoe_kind'] = shoe_kind
+    _worker['peek'] = peek
+    _worker['combos'] = build_combos()
+
+def forced_tables(slot, player_total):
+    """
+    :return: dict of action -> the strategy in the slot with the player total forced to the action (built once per worker)
+    """
+    if slot not in _worker['forced']:
+        strategy = _worker['tables'].table(slot)
+        _worker['forced'][slot] = {action: strategy.with_action(player_total, action) for action in ['hit', 'double', 'stand', 'split']}
+    return _worker['forced'][slot]
+
+def seed_task(config_index, player_total, *cell):
+    """
+    Seeds the task's random stream from the run's seed and the task's (rules the rows depend on, cell, chunk index),
+    so a chunk deals the same cards whichever worker runs it, and tables sharing rows in a sweep share their streams
+    """
+    seed_stream(_worker['seeds'][config_index], rule_key(_worker['game_configs'][config_index], player_total), *cell)
 
 def simulate_stand_worker(args):
     """Worker function for stand simulation"""
-    num_iterations, dealer_card_up, base_deck, player_cards, game_config = args
+    num_iterations, dealer_card_rank, config_index, chunk_index = args
+    seed_task(config_index, BASE_TOTAL, 'stand', dealer_card_rank, chunk_index)
+    game_config = _worker['game_configs'][config_index]
+    player_cards, dealer_card_up, base_deck = base_cell(_worker['engine'], base_player_cards(), dealer_card_rank, _worker['shoe_kind'])
     local_results = []
     for _ in range(num_iterations):
-        deck_copy = shoe.Shoe(6)
-        deck_copy.cards = base_deck.cards.copy()
-        deck_copy.shuffle()
-        dealer_cards = [dealer_card_up, deck_copy.draw()]
+        deck_copy = fresh_deck(base_deck)
+        dealer_cards = dealer_hand(dealer_card_up, deck_copy.draw())
         result = game_config.evaluate(player_cards, dealer_cards, deck_copy)
         local_results.append(result)
     return local_results
 
 def simulate_hit_worker(args):
     """Worker function for hit/double simulation"""
-    num_iterations, dealer_card_up, base_deck, player_cards, game_config = args
+    num_iterations, dealer_card_rank, config_index, chunk_index = args
+    seed_task(config_index, BASE_TOTAL, 'hit', dealer_card_rank, chunk_index)
+    game_config = _worker['game_configs'][config_index]
+    player_cards, dealer_card_up, base_deck = base_cell(_worker['engine'], base_player_cards(), dealer_card_rank, _worker['shoe_kind'])
     local_results = []
     local_results_double = []
     for _ in range(num_iterations):
-        deck_copy = shoe.Shoe(6)
-        deck_copy.cards = base_deck.cards.copy()
-        deck_copy.shuffle()
-        dealer_cards = [dealer_card_up, deck_copy.draw()]
+        deck_copy = fresh_deck(base_deck)
+        dealer_cards = dealer_hand(dealer_card_up, deck_copy.draw())
         player_cards_copy = player_cards.copy()
         player_cards_copy.append(deck_copy.draw())
         result = game_config.evaluate(player_cards_copy, dealer_cards, deck_copy)
@@ -92,49 +258,713 @@ def simulate_hit_worker(args):
         local_results_double.append(result * 2)
     return local_results, local_results_double
 
+# ranks of the hole cards that give the dealer blackjack under an ace (the tens) and under a ten (the ace)
+TEN_RANKS = (8, 9, 10, 11)
+ACE_RANKS = (12,)
+_peek_conditions = {}
+
+def peek_condition(game_config, player_cards, dealer_card_rank):
+    """
+    The peek rule: the player only plays if the dealer doesn't have blackjack, and a dealer blackjack counts 0 in
+    the odds tables (ignore_dealer_blackjack), so the hole card can be drawn from the cards that don't make blackjack
+    and the outcome weighted by the probability of that, instead of wasting the iterations where the dealer has it
+    :param player_cards: the player's 2 Cards
+    :return: (ranks the hole card is drawn without, probability the hole card isn't one of them)
+    """
+    key = (player_cards[0].rank, player_cards[1].rank, dealer_card_rank, game_config.decks_in_shoe)
+    if key not in _peek_conditions:
+        up_card_value = RANK_VALUES[dealer_card_rank]
+        counts = dealer.remove_values(dealer.shoe_value_counts(game_config.decks_in_shoe), *(RANK_VALUES[c.rank] for c in player_cards), up_card_value)
+        excluded = TEN_RANKS if up_card_value == 11 else ACE_RANKS if up_card_value == 10 else ()
+        _peek_conditions[key] = (excluded, dealer.no_blackjack_probability(counts, up_card_value))
+    return _peek_conditions[key]
+
+def play_actions(game_config, player_cards, dealer_card_up, deck, strategies, crn, peek=None):
+    """
+    Plays a dealt hand once with each strategy
+    :param crn: common random numbers, every strategy plays from its own copy of the same shuffled shoe.
+                Otherwise they play one after another from the same shoe, like before
+    :param peek: peek_condition() of the hand, each strategy's hole card is dealt without the excluded ranks
+                 before it plays and its outcome is weighted by the probability
+    :return: the outcome for each strategy
+    """
+    excluded, weight = peek if peek is not None else ((), 1.0)
+
+    def play(deck_copy, strategy, hole_card=None):
+        if not excluded:
+            return simulate_hand(game_config, player_cards, dealer_card_up, deck_copy, strategy, ignore_dealer_blackjack=True)
+        if hole_card is None:
+            hole_card = deck_copy.draw_excluding(excluded)
+        return weight * simulate_hand(game_config, player_cards, dealer_card_up, deck_copy, strategy, ignore_dealer_blackjack=True, dealer_hole_card=hole_card)
+
+    if crn and isinstance(deck, (shoe.LazyShoe, shoe.CountShoe)):
+        # a lazy or count shoe picks its cards as it draws, so every action's copy draws from the same seed
+        seed = random.getrandbits(64)
+        return [play(deck.copy(seed), strategy) for strategy in strategies]
+    if crn:
+        # the hole card is drawn from a random position, so it is dealt once before the shoe is copied
+        hole_card = deck.draw_excluding(excluded) if excluded else None
+        return [play(copy_deck(deck), strategy, hole_card) for strategy in strategies]
+    return [play(deck, strategy) for strategy in strategies]
+
+def simulate_actions(args, actions):
+    """
+    Simulates the player total with its row forced to each action
+    :return: (dict of action -> RunningStats of the outcomes, dict of (action, action) -> RunningStats of the per hand differences)
+    """
+    num_iterations, dealer_card_rank, player_total, slot, chunk_index = args
+    seed_task(_worker['slot_configs'][slot], player_total, dealer_card_rank, chunk_index)
+    game_config = _worker['game_configs'][_worker['slot_configs'][slot]]
+    engine = _worker['engine']
+    crn = _worker['crn']
+    peek = _worker['peek']
+    combos_for_total = _worker['combos'][player_total]
+    tables = forced_tables(slot, player_total)
+    strategies = [tables[action] for action in actions]
+    pairs = list(combinations(range(len(actions)), 2))
+    stats = [RunningStats() for _ in actions]
+    differences = [RunningStats() for _ in pairs]
+
+    for _ in range(num_iterations):
+        combo = random.choice(combos_for_total)
+        player_cards, dealer_card_up, deck = deal_cell(engine, combos_for_total, dealer_card_rank, _worker['shoe_kind'], combo)
+        outcomes = play_actions(game_config, player_cards, dealer_card_up, deck, strategies, crn,
+                                peek_condition(game_config, combo, dealer_card_rank) if peek else None)
+        for action_stats, outcome in zip(stats, outcomes):
+            action_stats.add(outcome)
+        for pair_stats, (first, second) in zip(differences, pairs):
+            pair_stats.add(outcomes[first] - outcomes[second])
+
+    return (dict(zip(actions, stats)),
+            {(actions[first], actions[second]): pair_stats for pair_stats, (first, second) in zip(differences, pairs)})
+
 def simulate_player_total_worker(args):
     """Worker function for player total simulation"""
-    num_iterations, dealer_card_rank, combos_for_total, game_config, data_hit, data_double, data_stand = args
-    local_hit_total = 0
-    local_double_total = 0
-    local_stand_total = 0
-    
-    for _ in range(num_iterations):
-        deck = shoe.Shoe(6)
-        deck.shuffle()
-        player_cards = list(random.choice(combos_for_total))
-        dealer_card_up = card.Card().from_ints(dealer_card_rank, 0)
-        deck.remove(player_cards[0])
-        deck.remove(player_cards[1])
-        deck.remove(dealer_card_up)
-        local_hit_total += simulate_hand(game_config, player_cards, dealer_card_up, deck, data_hit, ignore_dealer_blackjack=True)
-        local_double_total += simulate_hand(game_config, player_cards, dealer_card_up, deck, data_double, ignore_dealer_blackjack=True)
-        local_stand_total += simulate_hand(game_config, player_cards, dealer_card_up, deck, data_stand, ignore_dealer_blackjack=True)
-    
-    return (local_hit_total, local_double_total, local_stand_total)
+    return simulate_actions(args, ['hit', 'double', 'stand'])
 
 def simulate_player_total_worker_splitable(args):
     """Worker function for player total simulation"""
-    num_iterations, dealer_card_rank, combos_for_total, game_config, data_hit, data_double, data_stand, data_split = args
-    local_hit_total = 0
-    local_double_total = 0
-    local_stand_total = 0
-    local_split_total = 0
-    
-    for _ in range(num_iterations):
-        deck = shoe.Shoe(6)
-        deck.shuffle()
-        player_cards = list(random.choice(combos_for_total))
+    return simulate_actions(args, ['hit', 'double', 'stand', 'split'])
+
+def best_action_margin(row, differences):
+    """
+    :param row: odds row with the action EVs and best_action
+    :param differences: (action, action) -> RunningStats of the per hand EV differences
+    :return: (runner up action, EV of the best action minus the runner up, standard error of that difference)
+    """
+    best_action = row['best_action']
+    others = [action for first, second in differences for action in (first, second) if action != best_action]
+    runner_up = max(dict.fromkeys(others), key=lambda action: row[action])
+    if (best_action, runner_up) in differences:
+        margin = differences[(best_action, runner_up)]
+        return runner_up, margin.mean, margin.standard_error
+    margin = differences[(runner_up, best_action)]
+    return runner_up, -margin.mean, margin.standard_error
+
+def merge_cell_results(cell_results):
+    """
+    :param cell_results: simulate_actions results for one cell, from every thread and round
+    :return: (dict of action -> RunningStats, dict of (action, action) -> RunningStats) for the whole cell
+    """
+    stats = {action: RunningStats.combine(result[0][action] for result in cell_results) for action in cell_results[0][0]}
+    differences = {pair: RunningStats.combine(result[1][pair] for result in cell_results) for pair in cell_results[0][1]}
+    return stats, differences
+
+def best_action_settled(stats, differences, confidence_z):
+    """
+    :return: True if the best action's EV is more than confidence_z standard errors above the runner up's
+    """
+    row = {action: action_stats.mean for action, action_stats in stats.items()}
+    row['best_action'] = determine_best_action(row)
+    _, margin, margin_se = best_action_margin(row, differences)
+    return margin > confidence_z * margin_se
+
+def cell_row(player_total, dealer_card_up, cell_stats):
+    """
+    :param cell_stats: CellStats of the cell
+    :return: odds row for the cell, with the stats themselves under 'stats' (kept in the checkpoint log, not the csv)
+    """
+    row = {action: action_stats.mean for action, action_stats in cell_stats.stats.items()}
+    row.update(cell_stats.exact)
+    row.update({f"{action}_se": action_stats.standard_error for action, action_stats in cell_stats.stats.items()})
+    row['samples'] = cell_stats.stats['hit'].n
+    row.update(player_total=player_total, dealer_card_up=dealer_card_up)
+    row['best_action'] = determine_best_action(row)
+    if cell_stats.differences:
+        row['runner_up'], row['margin'], row['margin_se'] = best_action_margin(row, cell_stats.differences)
+    row['stats'] = cell_stats.to_dict()
+    return row
+
+def solve_exact_worker(args):
+    """Worker function for the exact solver, solves every dealer card for one player total"""
+    game_config, player_total = args
+    return Solver(game_config).solve_table([player_total])
+
+def solve_exact(args, game_config):
+    """Writes the odds table computed by the exact solver instead of simulating it"""
+    import pandas as pd
+    start_time = time.time()
+    player_totals = PLAYER_TOTALS + PAIRED_TOTALS
+    rows = []
+    with multiprocessing.Pool(processes=args.num_threads) as pool:
+        for player_total, result in zip(player_totals, pool.imap(solve_exact_worker, [(game_config, player_total) for player_total in player_totals])):
+            rows.extend(result)
+            print(f"Solved player total {player_total}")
+    data = pd.DataFrame(rows, columns=['double', 'hit', 'stand', 'player_total', 'dealer_card_up', 'best_action', 'split'])
+    data.to_csv(args.output_file_name, index=False)
+    print(f"\nExact solve completed in {time.time() - start_time:.2f} seconds")
+    print(f"Results saved to {args.output_file_name}")
+    if args.validate:
+        validate_exact(rows, args.validate, args.confidence_z)
+
+def validate_exact(rows, file_name, confidence_z):
+    """
+    Compares a simulated odds table with the solver's rows and prints, for each action, the largest difference and the
+    cells more than confidence_z standard errors off (for tables with the _se columns).
+    Split is left out, the solver's split EVs are an approximation (see Solver.split_ev)
+    """
+    with open(file_name, newline='') as f:
+        simulated = {(normalize_label(row['player_total']), upcard_value(row['dealer_card_up'])): row for row in csv.DictReader(f)}
+    actions = [action for action in ['double', 'hit', 'stand'] if action not in APPROXIMATE_ACTIONS]
+    # action -> (largest difference, cell), and the cells off by more than confidence_z standard errors
+    largest = {}
+    off = []
+    for row in rows:
+        other = simulated.get((row['player_total'], int(row['dealer_card_up'])))
+        if other is None:
+            continue
+        for action in actions:
+            if other.get(action) in (None, ''):
+                continue
+            difference = float(other[action]) - row[action]
+            if abs(difference) > largest.get(action, (0.0, None))[0]:
+                largest[action] = (abs(difference), f"{row['player_total']}:{row['dealer_card_up']}")
+            standard_error = other.get(f"{action}_se")
+            if standard_error not in (None, '') and float(standard_error) > 0 and abs(difference) > confidence_z * float(standard_error):
+                off.append((row['player_total'], row['dealer_card_up'], action, row[action], float(other[action]), difference / float(standard_error)))
+    print(f"\nValidation against {file_name} (split left out, the solver's split EVs are approximate):")
+    for action, (difference, cell) in sorted(largest.items()):
+        print(f"  {action}: largest difference {difference:.4f} at {cell}")
+    print(f"  Cells more than {confidence_z} standard errors from the exact EV: {len(off)}")
+    for player_total, dealer_card_up, action, exact, simulated_ev, z in off:
+        print(f"    {player_total}:{dealer_card_up} {action} exact {exact:.4f} simulated {simulated_ev:.4f} ({z:+.1f} standard errors)")
+
+def count_odds_worker(args):
+    """
+    Worker function for the true count tables. Deals rounds from multi-round shoes, and before each round plays
+    the first seat's hand with every action (each from its own copy of the shoe, so they see the same cards)
+    :return: (count bucket, player total, dealer card value) -> dict of action -> RunningStats of the outcomes
+    """
+    game_config, strategy, num_rounds, count_system, max_bucket, penetration, seed = args
+    if seed is not None:
+        random.seed(seed)
+    session = Session(game_config, strategy, penetration=penetration, count_system=count_system)
+    simulated = set(PLAYER_TOTALS + PAIRED_TOTALS)
+    forced = {}
+    cells = {}
+    for _ in range(num_rounds):
+        bucket = count_bucket(session.true_count, max_bucket)
+        # the uncounted shoe under the CountingShoe, its next cards are the ones the round is dealt
+        deck = session.shoe.shoe.copy()
+        first_rank = deck.draw()
+        dealer_card_up = deck.draw()
+        player_hand = HandState.from_ranks(first_rank, deck.draw())
+        player_total = HAND_LABELS[hand_class(player_hand.total, player_hand.is_soft(), player_hand.is_paired)]
+        if player_total in simulated:
+            if player_total not in forced:
+                actions = ['hit', 'double', 'stand', 'split'] if player_total.startswith('paired') else ['hit', 'double', 'stand']
+                forced[player_total] = {action: strategy.with_action(player_total, action) for action in actions}
+            key = (bucket, player_total, RANK_VALUES[dealer_card_up])
+            if key not in cells:
+                cells[key] = {action: RunningStats() for action in forced[player_total]}
+            for action, action_stats in cells[key].items():
+                action_stats.add(simulate_hand(game_config, player_hand, dealer_card_up, deck.copy(), forced[player_total][action], ignore_dealer_blackjack=True))
+        session.play_round()
+    return cells
+
+COUNT_COLUMNS = ['count_bucket', 'player_total', 'dealer_card_up', 'double', 'hit', 'stand', 'split', 'best_action',
+                 'double_se', 'hit_se', 'stand_se', 'split_se', 'samples']
+
+def generate_count_odds(args, game_config):
+    """
+    Writes an odds table bucketed by true count, from samples binned by the count of multi-round shoes
+    (every bucket in one pass, instead of a table per count)
+    """
+    import pandas as pd
+    start_time = time.time()
+    strategy_file = args.strategy_file or os.path.join('data2', game_config.odds_file_name())
+    strategy = StrategyTable.from_csv(strategy_file)
+    seed = args.seed if args.seed is not None else random.randrange(2 ** 32)
+    rules = (game_config.decks_in_shoe, game_config.dealer_hit_soft_17, game_config.double_after_split, game_config.surrender_allowed, game_config.blackjack_pays)
+    tasks = [(game_config, strategy, chunk, args.count_system, args.max_count_bucket, args.penetration, stream_seed(seed, rules, 'true_count', index))
+             for index, chunk in enumerate(chunk_sizes(args.iterations, args.chunk_iterations))]
+    with multiprocessing.Pool(processes=args.num_threads) as pool:
+        results = pool.map(count_odds_worker, tasks)
+
+    cells = {}
+    for result in results:
+        for key, stats in result.items():
+            cells.setdefault(key, []).append(stats)
+    rows = []
+    labels = PLAYER_TOTALS + PAIRED_TOTALS
+    for bucket, player_total, dealer_card_value in sorted(cells, key=lambda key: (key[0], labels.index(key[1]), key[2])):
+        stats = {action: RunningStats.combine(result[action] for result in cells[(bucket, player_total, dealer_card_value)])
+                 for action in cells[(bucket, player_total, dealer_card_value)][0]}
+        row = {action: action_stats.mean for action, action_stats in stats.items()}
+        row.update({f"{action}_se": action_stats.standard_error for action, action_stats in stats.items()})
+        row.update(count_bucket=bucket, player_total=player_total, dealer_card_up=str(dealer_card_value), samples=stats['hit'].n)
+        row['best_action'] = determine_best_action(row)
+        rows.append(row)
+    pd.DataFrame(rows, columns=COUNT_COLUMNS).to_csv(args.output_file_name, index=False)
+    print(f"\nTrue count tables for {len({row['count_bucket'] for row in rows})} buckets ({len(rows)} cells, seed {seed}) completed in {time.time() - start_time:.2f} seconds")
+    print(f"Results saved to {args.output_file_name}")
+
+ODDS_COLUMNS = ['double', 'hit', 'stand', 'player_total', 'dealer_card_up', 'best_action', 'split', 'runner_up', 'margin', 'margin_se',
+                'double_se', 'hit_se', 'stand_se', 'split_se', 'samples']
+DEALER_CARD_RANKS = list(range(9)) + [12]
+
+def upcard(dealer_card_rank):
+    return str(card.Card().from_ints(dealer_card_rank, 0).get_card_value())
+
+def rule_key(game_config, player_total):
+    """
+    :return: the player total with the rules its rows depend on, tables with the same key can share the rows.
+             Hands that can't be split never reach a 2 card 21, so only the dealer's soft 17 rule matters to them
+    """
+    if player_total.startswith('paired'):
+        return (player_total, game_config.decks_in_shoe, game_config.dealer_hit_soft_17, game_config.double_after_split, game_config.blackjack_pays)
+    return (player_total, game_config.decks_in_shoe, game_config.dealer_hit_soft_17)
+
+def table_order(cells):
+    """
+    :param cells: (player_total, dealer_card_up) keys
+    :return: the keys in the table's order (not the order the cells finished in)
+    """
+    labels = PLAYER_TOTALS + PAIRED_TOTALS + sorted({player_total for player_total, _ in cells} - set(PLAYER_TOTALS + PAIRED_TOTALS))
+    return [(label, upcard(dealer_card_rank)) for label in labels for dealer_card_rank in DEALER_CARD_RANKS if (label, upcard(dealer_card_rank)) in cells]
+
+def write_odds_csv(file_name, cells):
+    """
+    Writes odds rows in the table's order
+    :param cells: (player_total, dealer_card_up) -> odds row
+    """
+    import pandas as pd
+    data = pd.DataFrame([cells[key] for key in table_order(cells)], columns=ODDS_COLUMNS)
+    data.to_csv(file_name, index=False)
+
+RULE_SETTINGS = ['decks_in_shoe', 'dealer_hit_soft_17', 'double_after_split', 'surrender_allowed', 'blackjack_pays']
+
+def merge_tables(args):
+    """
+    Merges odds tables simulated separately (on other machines or days) into one, by adding up each cell's stats.
+    The runs must have independent random streams (different seeds) for the merged table to be right, tables
+    from the same seed are refused
+    """
+    import pandas as pd
+    rules = {}
+    # seed -> the table whose manifest has it
+    seeds = {}
+    cells = {}
+    # rows of cells without stats (e.g. from a table written before the stats were kept), the first file's wins
+    rows = {}
+    for file_name in args.merge:
+        checkpoint = RunCheckpoint(file_name)
+        if checkpoint.exists():
+            manifest = checkpoint.load_manifest()
+            config = manifest['config']
+            for setting in RULE_SETTINGS:
+                if rules.setdefault(setting, config[setting]) != config[setting]:
+                    print(f"Error: {file_name} has {setting} {config[setting]}, the tables before it have {rules[setting]}")
+                    return
+            seed = manifest['seed']
+            if seed in seeds:
+                print(f"Error: {file_name} and {seeds[seed]} were simulated with the same seed {seed}, their samples are the same")
+                return
+            seeds[seed] = file_name
+        cell_stats = read_cell_stats(file_name)
+        data = pd.read_csv(file_name, dtype={'player_total': str, 'dealer_card_up': str})
+        for row in data.to_dict('records'):
+            key = (row['player_total'], row['dealer_card_up'])
+            if key not in cell_stats:
+                rows.setdefault(key, row)
+            elif key in cells:
+                try:
+                    cells[key].merge(cell_stats[key])
+                except ValueError as error:
+                    print(f"Error: {file_name} cell {key[0]}:{key[1]}: {error}")
+                    return
+            else:
+                cells[key] = cell_stats[key]
+        print(f"Merged {file_name}: {len(data)} cells, {len(cell_stats)} with stats")
+    rows.update({key: cell_row(key[0], key[1], cell_stats) for key, cell_stats in cells.items()})
+    write_odds_csv(args.output_file_name, rows)
+    write_cell_stats(args.output_file_name, {key: cells[key] for key in table_order(cells)})
+    print(f"Results saved to {args.output_file_name} ({len(cells)} merged cells, {len(rows) - len(cells)} without stats)")
+
+class OddsRun:
+    """
+    Simulation of one odds table (one GameConfig), run as player total nodes on a CellScheduler.
+    Keeps the table's finished cells and checkpoint, and builds the tasks for its player totals.
+    Several runs can share one pool and one set of shared strategy tables (see --sweep).
+    """
+
+    def __init__(self, args, game_config, config_index, output_file_name):
+        self.args = args
+        self.game_config = game_config
+        self.config_index = config_index
+        self.output_file_name = output_file_name
+        self.label = f"[{os.path.basename(output_file_name)}] " if args.sweep else ''
+        self.max_iterations = args.max_iterations or 4 * args.iterations
+        self.player_cards = base_player_cards()
+        self.checkpoint = RunCheckpoint(output_file_name)
+        # player total -> (run, player total) whose rows this run copies instead of simulating
+        self.copies = {}
+        # player total -> first table slot, set by assign_slots
+        self.slots = {}
+        # iterations left to hand out for each player total in adaptive mode
+        self.budgets = {}
+        # base row worker results waiting on the other action's cell
+        self.base_results = {}
+        self.total_start_times = {}
+        self.timings = {}
+        # cells whose best action is within 2 standard errors of the runner up
+        self.unresolved = []
+        # (player_total, dealer_card_up) -> the row a topped up cell had before, its stats are merged into the new row
+        self.prior = {}
+
+    def load(self):
+        """
+        Loads the finished cells from the checkpoint (or starts a new one)
+        :return: False if the checkpoint is for different settings
+        """
+        import pandas as pd
+        args = self.args
+        # finished cells, (player_total, dealer_card_up) -> odds row. Each one is appended to the checkpoint log as it finishes
+        config = json.loads(json.dumps({
+            'decks_in_shoe': self.game_config.decks_in_shoe, 'dealer_hit_soft_17': self.game_config.dealer_hit_soft_17,
+            'double_after_split': self.game_config.double_after_split, 'surrender_allowed': self.game_config.surrender_allowed,
+            'blackjack_pays': self.game_config.blackjack_pays, 'iterations': args.iterations,
+            'engine': args.engine, 'shoe': args.shoe, 'stand_method': args.stand_method, 'crn': args.crn, 'peek': args.peek, 'adaptive': args.adaptive,
+            'round_iterations': args.round_iterations, 'max_iterations': self.max_iterations, 'confidence_z': args.confidence_z,
+            'top_up': args.top_up, 'chunk_iterations': args.chunk_iterations}))
+        if args.top_up is not None:
+            return self.load_top_up(config)
+        if self.checkpoint.exists() and not args.restart:
+            manifest = self.checkpoint.load_manifest()
+            if manifest['config'] != config:
+                print(f"Error: {self.checkpoint.manifest_path} is for a run with different settings, use --restart to start over")
+                return False
+            self.seed = manifest['seed']
+            self.cells = self.checkpoint.completed_cells()
+            print(f"{self.label}Resuming from {self.checkpoint.log_path}, {len(self.cells)} cells already done")
+        else:
+            self.seed = args.seed if args.seed is not None else random.randrange(2 ** 32)
+            self.cells = {}
+            if args.start_at is not None and os.path.exists(self.output_file_name):
+                # no checkpoint, keep the rows already in the csv
+                data = pd.read_csv(self.output_file_name, dtype={'player_total': str, 'dealer_card_up': str})
+                self.cells = {(row['player_total'], row['dealer_card_up']): row for row in data.to_dict('records')}
+            self.checkpoint.start(config, self.seed)
+            for row in self.cells.values():
+                self.checkpoint.append(row)
+
+        if args.start_at is not None:
+            # recompute the player total and everything after it
+            redo = (PLAYER_TOTALS + PAIRED_TOTALS)[(PLAYER_TOTALS + PAIRED_TOTALS).index(args.start_at):]
+            self.cells = {key: row for key, row in self.cells.items() if key[0] not in redo}
+            self.checkpoint.start(config, self.seed)
+            for row in self.cells.values():
+                self.checkpoint.append(row)
+        return True
+
+    def load_top_up(self, config):
+        """
+        Starts (or resumes) a top up run: every cell of the csv is kept except the ones being topped up, which are
+        simulated again and merged with their stats from before. The csv is only rewritten when the run finishes,
+        so an interrupted top up resumes from the checkpoint with the same stats to merge
+        :return: False if the csv has no stats for a cell being topped up, or the checkpoint is for different settings
+        """
+        import pandas as pd
+        args = self.args
+        if not os.path.exists(self.output_file_name):
+            print(f"Error: {self.output_file_name} doesn't exist, there is nothing to top up")
+            return False
+        data = pd.read_csv(self.output_file_name, dtype={'player_total': str, 'dealer_card_up': str})
+        self.cells = {(row['player_total'], row['dealer_card_up']): row for row in data.to_dict('records')}
+        for key, cell_stats in read_cell_stats(self.output_file_name).items():
+            if key in self.cells:
+                self.cells[key]['stats'] = cell_stats.to_dict()
+        if args.top_up == 'unresolved':
+            chosen = [key for key, row in self.cells.items() if abs(row['margin']) < 2 * row['margin_se']]
+        else:
+            chosen = [tuple(cell.split(':')) for cell in args.top_up.split(',')]
+        missing = [f"{player_total}:{dealer_card_up}" for player_total, dealer_card_up in chosen if 'stats' not in self.cells.get((player_total, dealer_card_up), {})]
+        if missing:
+            print(f"Error: no stats in {stats_path(self.output_file_name)} for {', '.join(missing)}")
+            return False
+        csv_cells = set(self.cells)
+        self.prior = {key: self.cells.pop(key) for key in chosen}
+        if self.checkpoint.exists() and not args.restart:
+            manifest = self.checkpoint.load_manifest()
+            if manifest['config'] == config:
+                self.seed = manifest['seed']
+                self.cells = self.checkpoint.completed_cells()
+                print(f"{self.label}Resuming the top up from {self.checkpoint.log_path}, {len(self.cells)} cells already done")
+                return True
+            # the checkpoint of the run that wrote the csv can be replaced, unless it has cells the csv doesn't
+            if manifest['config'].get('top_up') is not None or set(self.checkpoint.completed_cells()) - csv_cells:
+                print(f"Error: {self.checkpoint.manifest_path} is for an unfinished run with different settings, use --restart to start over")
+                return False
+        # a seed already in the cells' stats would deal their samples again, and the merge would count them twice
+        used_seeds = {seed for row in self.prior.values() for seed in CellStats.from_dict(row['stats']).seeds}
+        if self.checkpoint.exists():
+            used_seeds.add(self.checkpoint.load_manifest()['seed'])
+        if args.seed is not None and args.seed in used_seeds:
+            print(f"Error: --seed {args.seed} was already used for the cells being topped up, use a different seed")
+            return False
+        self.seed = args.seed
+        while self.seed is None or self.seed in used_seeds:
+            self.seed = random.randrange(2 ** 32)
+        self.checkpoint.start(config, self.seed)
+        for row in self.cells.values():
+            self.checkpoint.append(row)
+        print(f"{self.label}Topping up {len(chosen)} cells of {self.output_file_name}")
+        return True
+
+    def remaining_ranks(self, player_total):
+        return [dealer_card_rank for dealer_card_rank in DEALER_CARD_RANKS if (player_total, upcard(dealer_card_rank)) not in self.cells]
+
+    def player_totals(self):
+        """the player totals that still have cells to simulate (or copy)"""
+        return [player_total for player_total in PLAYER_TOTALS + PAIRED_TOTALS if self.remaining_ranks(player_total)]
+
+    def copy_rows(self, source, player_total):
+        """Takes every row of a player total from another run with the same rules for it"""
+        for dealer_card_rank in DEALER_CARD_RANKS:
+            row = dict(source.cells[(player_total, upcard(dealer_card_rank))])
+            self.cells[(player_total, upcard(dealer_card_rank))] = row
+            self.checkpoint.append(row)
+
+    def write_rows(self):
+        write_odds_csv(self.output_file_name, self.cells)
+
+    def first_chunk(self, player_total, dealer_card_rank):
+        """
+        :return: the index of the cell's first chunk. A topped up cell's chunks carry on past the samples it already has
+                 (a chunk is at least one sample), so they never replay the streams of the runs that recorded them
+        """
+        prior = self.prior.get((player_total, upcard(dealer_card_rank)))
+        return CellStats.from_dict(prior['stats']).samples if prior is not None and 'stats' in prior else 0
+
+    def make_tasks(self, player_total, tables):
+        print(f"{self.label}Processing player total {player_total}...")
+        self.total_start_times[player_total] = time.time()
+        args = self.args
+        if player_total in self.copies:
+            return []
+        ranks = self.remaining_ranks(player_total)
+        if player_total == BASE_TOTAL:
+            # stand and hit/double from a king and a queen, against the full dealer hand
+            tasks = []
+            for dealer_card_rank in ranks:
+                if args.stand_method == 'simulate':
+                    tasks += [(('stand', dealer_card_rank), simulate_stand_worker, (chunk, dealer_card_rank, self.config_index, chunk_index))
+                              for chunk_index, chunk in enumerate(chunk_sizes(args.iterations, args.chunk_iterations), self.first_chunk(player_total, dealer_card_rank))]
+                tasks += [(('hit', dealer_card_rank), simulate_hit_worker, (chunk, dealer_card_rank, self.config_index, chunk_index))
+                          for chunk_index, chunk in enumerate(chunk_sizes(args.iterations, args.chunk_iterations), self.first_chunk(player_total, dealer_card_rank))]
+            return tasks
+
+        # publish the strategy so far once, workers force the player total's row themselves
+        slot = self.slots[player_total]
+        # cells being topped up play their old best action until they are done
+        rows = list(self.cells.values()) + [row for key, row in self.prior.items() if key not in self.cells]
+        tables.publish(slot, StrategyTable.from_rows((row['player_total'], row['dealer_card_up'], row['best_action']) for row in rows))
+        worker = simulate_player_total_worker_splitable if player_total.startswith('paired') else simulate_player_total_worker
+        if args.adaptive:
+            # a first round for every cell, the rest of the player total's budget is handed out by more_tasks
+            first_round = min(args.round_iterations, self.max_iterations)
+            self.budgets[player_total] = args.iterations * len(ranks) - first_round * len(ranks)
+            return [(dealer_card_rank, worker, (chunk, dealer_card_rank, player_total, slot, chunk_index))
+                    for dealer_card_rank in ranks
+                    for chunk_index, chunk in enumerate(chunk_sizes(first_round, args.chunk_iterations), self.first_chunk(player_total, dealer_card_rank))]
+        return [(dealer_card_rank, worker, (chunk, dealer_card_rank, player_total, slot, chunk_index))
+                for dealer_card_rank in ranks
+                for chunk_index, chunk in enumerate(chunk_sizes(args.iterations, args.chunk_iterations), self.first_chunk(player_total, dealer_card_rank))]
+
+    def more_tasks(self, player_total, dealer_card_rank, cell_results):
+        args = self.args
+        if not args.adaptive or player_total == BASE_TOTAL or self.budgets[player_total] <= 0:
+            return []
+        stats, differences = merge_cell_results(cell_results)
+        samples = stats['hit'].n
+        if samples >= self.max_iterations or best_action_settled(stats, differences, args.confidence_z):
+            return []
+        round_iterations = min(args.round_iterations, self.max_iterations - samples, self.budgets[player_total])
+        self.budgets[player_total] -= round_iterations
+        worker = simulate_player_total_worker_splitable if player_total.startswith('paired') else simulate_player_total_worker
+        # chunk indexes carry on from the cell's earlier rounds
+        return [(worker, (chunk, dealer_card_rank, player_total, self.slots[player_total], chunk_index))
+                for chunk_index, chunk in enumerate(chunk_sizes(round_iterations, args.chunk_iterations), self.first_chunk(player_total, dealer_card_rank) + len(cell_results))]
+
+    def base_row(self, dealer_card_rank, stand_results, hit_results):
+        game_config = self.game_config
         dealer_card_up = card.Card().from_ints(dealer_card_rank, 0)
-        deck.remove(player_cards[0])
-        deck.remove(player_cards[1])
-        deck.remove(dealer_card_up)
-        local_hit_total += simulate_hand(game_config, player_cards, dealer_card_up, deck, data_hit, ignore_dealer_blackjack=True)
-        local_double_total += simulate_hand(game_config, player_cards, dealer_card_up, deck, data_double, ignore_dealer_blackjack=True)
-        local_stand_total += simulate_hand(game_config, player_cards, dealer_card_up, deck, data_stand, ignore_dealer_blackjack=True)
-        local_split_total += simulate_hand(game_config, player_cards, dealer_card_up, deck, data_split, ignore_dealer_blackjack=True)
-    
-    return (local_hit_total, local_double_total, local_stand_total, local_split_total)
+        if self.args.stand_method == 'exact':
+            counts = dealer.remove_values(dealer.shoe_value_counts(game_config.decks_in_shoe), *(c.get_card_value() for c in self.player_cards + [dealer_card_up]))
+            distribution = dealer.dealer_distribution(dealer_card_up.get_card_value(), counts, game_config.dealer_hit_soft_17)
+            stand = dealer.stand_ev(game_config, game_config.score_hand(self.player_cards), distribution, game_config.hand_is_blackjack(self.player_cards))
+            cell_stats = CellStats(exact={'stand': stand})
+        else:
+            stand_stats = RunningStats()
+            for res in stand_results:
+                for result in res:
+                    stand_stats.add(result)
+            cell_stats = CellStats({'stand': stand_stats})
+        hit_stats = RunningStats()
+        double_stats = RunningStats()
+        for res_hit, res_double in hit_results:
+            for result, result_double in zip(res_hit, res_double):
+                hit_stats.add(result)
+                double_stats.add(result_double)
+        cell_stats.stats.update(hit=hit_stats, double=double_stats)
+        return self.merged_row(str(game_config.score_hand(self.player_cards)), str(dealer_card_up.get_card_value()), cell_stats)
+
+    def merged_row(self, player_total, dealer_card_up, cell_stats):
+        """
+        :return: cell_row() for the cell, with the stats it had before a top up merged in
+        """
+        cell_stats.seeds = [self.seed]
+        prior = self.prior.get((player_total, dealer_card_up))
+        if prior is not None and 'stats' in prior:
+            cell_stats.merge(CellStats.from_dict(prior['stats']))
+        return cell_row(player_total, dealer_card_up, cell_stats)
+
+    def player_total_row(self, player_total, dealer_card_rank, cell_results):
+        # merge the threads' (and rounds') stats
+        stats, differences = merge_cell_results(cell_results)
+        return self.merged_row(player_total, upcard(dealer_card_rank), CellStats(stats, differences))
+
+    def on_cell_done(self, player_total, cell, cell_results):
+        if player_total == BASE_TOTAL:
+            action, dealer_card_rank = cell
+            print(f"  {self.label}Completed {player_total} {action} simulation for dealer card {upcard(dealer_card_rank)}")
+            self.base_results[cell] = cell_results
+            if ('hit', dealer_card_rank) not in self.base_results or (self.args.stand_method == 'simulate' and ('stand', dealer_card_rank) not in self.base_results):
+                return
+            row = self.base_row(dealer_card_rank, self.base_results.pop(('stand', dealer_card_rank), None), self.base_results.pop(('hit', dealer_card_rank)))
+        else:
+            dealer_card_rank = cell
+            print(f"  {self.label}Completed {player_total} dealer card {upcard(dealer_card_rank)}")
+            row = self.player_total_row(player_total, dealer_card_rank, cell_results)
+            if abs(row['margin']) < 2 * row['margin_se']:
+                self.unresolved.append((player_total, row['dealer_card_up']))
+        self.cells[(row['player_total'], row['dealer_card_up'])] = row
+        self.checkpoint.append(row)
+
+    def on_total_done(self, player_total):
+        if player_total in self.copies:
+            source, _ = self.copies[player_total]
+            self.copy_rows(source, player_total)
+            print(f"{self.label}Player total {player_total} copied from {source.output_file_name}")
+            return
+        self.timings[player_total] = time.time() - self.total_start_times[player_total]
+        print(f"{self.label}Player total {player_total} completed in {self.timings[player_total]:.2f} seconds")
+
+    def finish(self):
+        """Closes the checkpoint and writes the csv, rebuilt from every finished cell, and the cells' stats"""
+        self.checkpoint.close()
+        self.write_rows()
+        write_cell_stats(self.output_file_name, {key: CellStats.from_dict(self.cells[key]['stats']) for key in table_order(self.cells)
+                                                 if isinstance(self.cells[key].get('stats'), dict)})
+        if self.args.top_up is not None:
+            # the csv and stats have the merged cells now, so the same top up can be run again for more
+            self.checkpoint.discard()
+
+    def print_summary(self):
+        print(f"{self.label}Player totals simulated: {len(self.timings)}, copied: {len(self.copies)}")
+        if BASE_TOTAL in self.timings:
+            print(f"{self.label}Stand/Hit/Double simulations: {self.timings[BASE_TOTAL]:.2f} seconds")
+        print(f"{self.label}Cells with the best action within 2 standard errors of the runner up: {len(self.unresolved)}")
+        simulated_rows = [row for (player_total, _), row in self.cells.items() if player_total in self.timings and player_total != BASE_TOTAL]
+        if simulated_rows:
+            print(f"{self.label}Iterations per cell: {sum(row['samples'] for row in simulated_rows) / len(simulated_rows):,.0f} average, {max(row['samples'] for row in simulated_rows):,} max")
+        print(f"{self.label}Results saved to {self.output_file_name}")
+
+def run_tables(args, runs, events=None):
+    """
+    Simulates the odds tables for every run on one worker pool. A player total whose rows another run
+    (with the same rules for it) also has to simulate is copied from that run instead
+    :param events: optional EventLog for the scheduler's task, cell and player total events and the run's phases
+    """
+    events = events or EventLog()
+    owners = {}
+    nodes = []
+    dependencies = {}
+    for run in runs:
+        for player_total in run.player_totals():
+            key = rule_key(run.game_config, player_total)
+            done = [other for other in runs if other is not run and not other.remaining_ranks(player_total) and rule_key(other.game_config, player_total) == key]
+            if done:
+                # already finished in another table's checkpoint
+                run.copy_rows(done[0], player_total)
+                continue
+            node = (run.config_index, player_total)
+            dependencies[node] = [(run.config_index, dependency) for dependency in player_total_dependencies(player_total)]
+            if key in owners:
+                run.copies[player_total] = owners[key]
+                dependencies[node].append((owners[key][0].config_index, player_total))
+            else:
+                owners[key] = (run, player_total)
+            nodes.append(node)
+
+    # a strategy table slot for each player total that is simulated
+    slot_configs = []
+    for run_index, player_total in nodes:
+        run = runs[run_index]
+        if player_total != BASE_TOTAL and player_total not in run.copies:
+            run.slots[player_total] = len(slot_configs)
+            slot_configs.append(run.config_index)
+
+    if not nodes:
+        print("Every cell is already in the checkpoint log")
+        return
+
+    # one pool for every table, each player total starts as soon as the totals it plays into are done.
+    # Strategy tables go through shared memory (a slot per player total), so tasks only carry a few integers.
+    # With --shard_dir the pool is the shared directory instead, and the tables are files in it
+    game_configs = [run.game_config for run in runs]
+    num_slots = max(len(slot_configs), 1)
+    worker_args = (game_configs, slot_configs, args.engine, args.crn, [run.seed for run in runs], args.shoe, args.peek)
+    events.emit('run', nodes=len(nodes), slots=len(slot_configs), num_threads=args.num_threads, iterations=args.iterations)
+    startup = time.time()
+    local_workers = []
+    if args.shard_dir:
+        tables = DirectoryStrategyTables(num_slots, os.path.join(args.shard_dir, TABLES))
+        pool = ShardPool(args.shard_dir, init_worker, (tables.name, num_slots) + worker_args + (DirectoryStrategyTables,), shard_timeout=args.shard_timeout)
+        # stand-ins for other nodes, started once the directory is set up
+        local_workers = [subprocess.Popen([sys.executable, os.path.abspath(__file__), '--shard_worker', args.shard_dir]) for _ in range(args.local_workers)]
+        print(f"Shards written to {args.shard_dir}, run workers with: python generate_odds.py --shard_worker {args.shard_dir}")
+    else:
+        tables = SharedStrategyTables(num_slots)
+        pool = multiprocessing.Pool(processes=args.num_threads, initializer=init_worker, initargs=(tables.name, num_slots) + worker_args)
+    with tables, pool:
+        # pool workers start in the background, the first tasks' queue_wait shows how long they take to be ready
+        events.emit('phase', phase='pool_startup', seconds=time.time() - startup)
+        # every worker's first argument is its number of iterations (hands)
+        scheduler = CellScheduler(pool, events, task_units=lambda worker_args: worker_args[0], profile_interval=args.profile_interval / 1000)
+        with events.phase('simulate'):
+            scheduler.run(
+                nodes, dependencies,
+                lambda node: runs[node[0]].make_tasks(node[1], tables),
+                lambda node, results: runs[node[0]].on_total_done(node[1]),
+                lambda node, cell, cell_results: runs[node[0]].on_cell_done(node[1], cell, cell_results),
+                (lambda node, cell, cell_results: runs[node[0]].more_tasks(node[1], cell, cell_results)) if args.adaptive else None)
+    # the pool wrote its done file on close, the local workers exit when they see it
+    for process in local_workers:
+        process.wait()
+    if scheduler.profile:
+        write_folded(f"{events.file_name}.folded", scheduler.profile)
+        print(f"Worker profile saved to {events.file_name}.folded")
 
 def main():
     parser = argparse.ArgumentParser(description='Generate blackjack odds using Monte Carlo simulation')
@@ -145,9 +975,48 @@ def main():
     parser.add_argument('--double_after_split', type=lambda x: x.lower() == 'true', default=DOUBLE_AFTER_SPLIT, help=f'Allow double after split (default: {DOUBLE_AFTER_SPLIT})')
     parser.add_argument('--surrender_allowed', type=lambda x: x.lower() == 'true', default=SURRENDER_ALLOWED, help=f'Allow surrender (default: {SURRENDER_ALLOWED})')
     parser.add_argument('--blackjack_pays', type=float, default=BLACKJACK_PAYS, help=f'Blackjack payout multiplier (default: {BLACKJACK_PAYS})')
-    parser.add_argument('--start_at', type=str, default=None, help=f'player hand to start at')
+    parser.add_argument('--engine', type=str, choices=['cards', 'compact'], default=ENGINE, help=f'Simulation engine, Card objects or compact rank ints (default: {ENGINE})')
+    parser.add_argument('--shoe', type=str, choices=['lazy', 'counts', 'shuffled'], default=SHOE,
+                        help=f'Draw cards lazily from the cards left, draw ranks from a count of the cards left (removing the dealt cards once per combo), or shuffle a whole shoe per hand (default: {SHOE})')
+    parser.add_argument('--stand_method', type=str, choices=['exact', 'simulate'], default='exact', help='Compute stand EVs from the exact dealer distribution or by simulation (default: exact)')
+    parser.add_argument('--exact', action='store_true', help='Compute the table with the exact solver instead of Monte Carlo simulation (split EVs are an approximation, see Solver.split_ev)')
+    parser.add_argument('--validate', type=str, default=None, help='With --exact, compare this simulated odds csv with the solved table (split is left out)')
+    parser.add_argument('--crn', action='store_true', help='Common random numbers, play every action from the same shuffled shoe so the action comparisons share their randomness')
+    parser.add_argument('--peek', action='store_true', help='Deal the player total cells\' hole card on the condition the dealer has no blackjack (the peek rule) and weight the outcomes, so no iterations are spent on dealer blackjacks that count 0')
+    parser.add_argument('--adaptive', action='store_true', help='Sample each cell in rounds and stop once the best action is settled, spare iterations go to the close cells (in the order cells come back, so unlike the other modes the split of the budget can change with --num_threads)')
+    parser.add_argument('--round_iterations', type=int, default=20_000, help='Iterations per cell per round in adaptive mode (default: 20000)')
+    parser.add_argument('--max_iterations', type=int, default=None, help='Most iterations for one cell in adaptive mode (default: 4x --iterations)')
+    parser.add_argument('--confidence_z', type=float, default=3.0, help='Standard errors the best action must lead the runner up by to stop sampling a cell in adaptive mode (default: 3.0)')
+    parser.add_argument('--true_count', action='store_true', help='Generate an odds table bucketed by true count (count_bucket column), --iterations is the number of rounds dealt from multi-round shoes')
+    parser.add_argument('--count_system', type=str, choices=sorted(COUNT_SYSTEMS), default='hi_lo', help='Card counting system for --true_count (default: hi_lo)')
+    parser.add_argument('--max_count_bucket', type=int, default=5, help='True counts are rounded down and clipped to +/- this for --true_count (default: 5)')
+    parser.add_argument('--penetration', type=float, default=0.75, help='Fraction of the shoe dealt before it is reshuffled for --true_count (default: 0.75)')
+    parser.add_argument('--strategy_file', type=str, default=None, help='Odds table played after the first decision for --true_count (default: the config\'s table in data2)')
+    parser.add_argument('--top_up', type=str, default=None,
+                        help='Simulate --iterations more for these cells of the existing output csv (player_total:dealer_card_up,... or "unresolved" for the cells within 2 standard errors) and merge them with the cells\' stats')
+    parser.add_argument('--merge', type=str, nargs='+', default=None, help='Merge these odds csvs (and their .stats.jsonl) from separate runs into --output_file_name instead of simulating, the runs must have different seeds')
+    parser.add_argument('--start_at', type=str, default=None, help=f'player hand to start at (recomputes it and every hand after it)')
+    parser.add_argument('--restart', action='store_true', help='Ignore the checkpoint of an earlier run and start over')
+    parser.add_argument('--seed', type=int, default=None, help='Random seed for the run, each chunk of a cell gets its own stream from it, so results don\'t depend on --num_threads (default: random, recorded in the manifest)')
+    parser.add_argument('--chunk_iterations', type=int, default=25_000, help='Iterations per task, the unit of work that gets its own random stream (default: 25000)')
+    parser.add_argument('--sweep', action='store_true', help='Generate the odds table for every combination of the --sweep_* rules in one job, sharing rows that don\'t depend on the rule that varies')
+    parser.add_argument('--sweep_dealer_hit_soft_17', type=lambda x: [value.lower() == 'true' for value in x.split(',')], default=[True, False], help='Dealer hits soft 17 values to sweep (default: true,false)')
+    parser.add_argument('--sweep_double_after_split', type=lambda x: [value.lower() == 'true' for value in x.split(',')], default=[True, False], help='Double after split values to sweep (default: true,false)')
+    parser.add_argument('--sweep_blackjack_pays', type=lambda x: [float(value) for value in x.split(',')], default=[1.5, 1.2], help='Blackjack payouts to sweep (default: 1.5,1.2)')
+    parser.add_argument('--output_dir', type=str, default='data2', help='Directory for the sweep csv files, named like load_data.parse_filename expects (default: data2)')
+    parser.add_argument('--events', type=str, default=None, help='Append JSON-lines timing events (tasks, cells, player totals, phases, worker hands/sec, ETA) to this file')
+    parser.add_argument('--shard_dir', type=str, default=None,
+                        help='Coordinate the run through this shared directory instead of a local pool: every (config, cell, chunk) task is written to it as a shard for --shard_worker processes on any host that mounts it (at the same path) to claim, and the results are merged here')
+    parser.add_argument('--local_workers', type=int, default=0, help='With --shard_dir, shard workers to start on this machine (default: 0, only outside workers)')
+    parser.add_argument('--shard_timeout', type=float, default=600.0, help='With --shard_dir, seconds a claimed shard can go without a heartbeat before it is handed to another worker (default: 600)')
+    parser.add_argument('--shard_worker', type=str, default=None, help='Run as a shard worker for the coordinator using this directory, until its run is done')
+    parser.add_argument('--profile_interval', type=float, default=0, help='With --events, sample the worker call stacks every this many milliseconds and save them to <events>.folded (default: 0, off)')
     
     args = parser.parse_args()
+
+    if args.shard_worker:
+        print(f"Shard worker done, ran {run_shard_worker(args.shard_worker)} shards")
+        return
     
     print("Starting odds generation...")
     print(f"Configuration:")
@@ -158,212 +1027,66 @@ def main():
     print(f"  Double after split: {args.double_after_split}")
     print(f"  Surrender allowed: {args.surrender_allowed}")
     print(f"  Blackjack pays: {args.blackjack_pays}")
+    print(f"  Engine: {args.engine}")
+    print(f"  Shoe: {args.shoe}")
+    print(f"  Stand method: {args.stand_method}")
+    print(f"  Common random numbers: {args.crn}")
+    print(f"  Peek: {args.peek}")
+    print(f"  Adaptive: {args.adaptive}")
+    if args.sweep:
+        print(f"  Sweep: dealer hits soft 17 {args.sweep_dealer_hit_soft_17}, double after split {args.sweep_double_after_split}, blackjack pays {args.sweep_blackjack_pays}")
+        print(f"  Output directory: {args.output_dir}")
     print()
     
+    if args.shard_dir and (args.true_count or args.exact):
+        print("Error: --shard_dir runs the simulated odds tables, not --true_count or --exact")
+        return
+    if args.validate and not args.exact:
+        print("Error: --validate compares a table with the --exact solver's")
+        return
+    if args.exact:
+        solve_exact(args, gc.GameConfig(DECKS_IN_SHOE, args.dealer_hit_soft_17, args.double_after_split, args.surrender_allowed, args.blackjack_pays))
+        return
+    if args.merge:
+        merge_tables(args)
+        return
+    if args.top_up is not None and args.sweep:
+        print("Error: --top_up works on one table, not a --sweep")
+        return
+    if args.true_count:
+        generate_count_odds(args, gc.GameConfig(DECKS_IN_SHOE, args.dealer_hit_soft_17, args.double_after_split, args.surrender_allowed, args.blackjack_pays))
+        return
+
     start_time = time.time()
-    num_threads = args.num_threads
-    iterations_per_thread = args.iterations // num_threads
-    
-    if args.start_at is not None:
-        data = pd.read_csv(args.output_file_name)
+    if args.sweep:
+        # every combination of the sweep rules, one csv each in --output_dir
+        game_configs = [gc.GameConfig(DECKS_IN_SHOE, dealer_hit_soft_17, double_after_split, args.surrender_allowed, blackjack_pays)
+                        for dealer_hit_soft_17 in args.sweep_dealer_hit_soft_17
+                        for double_after_split in args.sweep_double_after_split
+                        for blackjack_pays in args.sweep_blackjack_pays]
+        runs = [OddsRun(args, game_config, index, os.path.join(args.output_dir, game_config.odds_file_name())) for index, game_config in enumerate(game_configs)]
     else:
-        data = pd.DataFrame()
-    player_cards = [card.Card().from_ints(11, 0), card.Card().from_ints(10, 0)]
-
-    game_config = gc.GameConfig(DECKS_IN_SHOE, args.dealer_hit_soft_17, args.double_after_split, args.surrender_allowed, args.blackjack_pays)
-
-    # stand 
-    print("\nStarting STAND simulations...")
-    stand_start_time = time.time()
-    if args.start_at is None:
-        for i in list(range(9)) + [12]:
-            dealer_card_up = card.Card().from_ints(i, 0)
-            deck = shoe.Shoe(6)
-            deck.remove(player_cards[0])
-            deck.remove(player_cards[1])
-            deck.remove(dealer_card_up)
-            
-            pool_args = [(iterations_per_thread, dealer_card_up, deck, player_cards, game_config) for _ in range(num_threads)]
-
-            with multiprocessing.Pool(processes=num_threads) as pool:
-                results = pool.map(simulate_stand_worker, pool_args)
-
-            all_results = []
-            for res in results:
-                all_results.extend(res)
-            
-            mean = sum(all_results) / len(all_results)
-            data = pd.concat([data, pd.DataFrame({'player_total': [game_config.score_hand(player_cards)], 'action': ['stand'], 'dealer_card_up': [dealer_card_up.get_card_value()], 'expected_value': [mean]})], ignore_index=True)
-            print(f"Completed stand simulation for dealer card {dealer_card_up.get_card_value()}")
-
-        stand_end_time = time.time()
-        print(f"STAND simulations completed in {stand_end_time - stand_start_time:.2f} seconds\n")
-
-        # hit/double 
-        print("Starting HIT/DOUBLE simulations...")
-        hit_start_time = time.time()
-        for i in list(range(9)) + [12]:
-            dealer_card_up = card.Card().from_ints(i, 0)
-            deck = shoe.Shoe(6)
-            deck.remove(player_cards[0])
-            deck.remove(player_cards[1])
-            deck.remove(dealer_card_up)
-            
-            pool_args = [(iterations_per_thread, dealer_card_up, deck, player_cards, game_config) for _ in range(num_threads)]
-
-            with multiprocessing.Pool(processes=num_threads) as pool:
-                results = pool.map(simulate_hit_worker, pool_args)
-
-            all_results = []
-            all_results_double = []
-            for res_hit, res_double in results:
-                all_results.extend(res_hit)
-                all_results_double.extend(res_double)
-            
-            mean = sum(all_results) / len(all_results)
-            mean_double = sum(all_results_double) / len(all_results_double)
-            data = pd.concat([data, pd.DataFrame({'player_total': [game_config.score_hand(player_cards)], 'action': ['hit'], 'dealer_card_up': [dealer_card_up.get_card_value()], 'expected_value': [mean]})], ignore_index=True)
-            data = pd.concat([data, pd.DataFrame({'player_total': [game_config.score_hand(player_cards)], 'action': ['double'], 'dealer_card_up': [dealer_card_up.get_card_value()], 'expected_value': [mean_double]})], ignore_index=True)
-            print(f"Completed hit/double simulation for dealer card {dealer_card_up.get_card_value()}")
-
-        hit_end_time = time.time()
-        print(f"HIT/DOUBLE simulations completed in {hit_end_time - hit_start_time:.2f} seconds\n")
-
-        print("Processing results...")
-        data.sort_values(by=['player_total', 'dealer_card_up', 'action'])
-        data = data.pivot_table(index=['player_total', 'dealer_card_up'], columns='action', values='expected_value')
-        data['player_total'] = data.index.get_level_values(0)
-        data['dealer_card_up'] = data.index.get_level_values(1)
-        data.reset_index(drop=True, inplace=True)
-        data['best_action'] = data.apply(determine_best_action, axis=1)
-        data['player_total'] = data['player_total'].astype(str)
-        data['dealer_card_up'] = data['dealer_card_up'].astype(str)
-
-        print("\nStarting PLAYER TOTALS simulations...")
-        player_totals_start_time = time.time()
-
-    combos = build_combos()
-    player_amts = ['19', '18', '17', '16', '15', '14', '13', '12', '11', '10',
-                    'soft_20', 'soft_19', 'soft_18', 'soft_17', 'soft_16', 'soft_15', 'soft_14', 'soft_13', 
-                    '9', '8', '7', '6', '5']
-    if args.start_at is not None and args.start_at in player_amts:
-        player_amts = player_amts[player_amts.index(args.start_at):]
-    elif args.start_at is not None:
-        player_amts = []
-    # now do it for 19-12
-    for player_amt in player_amts:
-        print(f"Processing player total {player_amt}...")
-        player_total_start = time.time()
-        
-        data_stand = data.copy()
-        data_stand['player_total'] = player_amt
-        data_stand.drop_duplicates(subset=['player_total', 'dealer_card_up'], inplace=True)
-        data_stand['best_action'] = 'stand'
-        data_double = data_stand.copy()
-        data_double['best_action'] = 'double'
-        data_hit = data_double.copy()
-        data_hit['best_action'] = 'hit'
-        
-        data_stand = pd.concat([data, data_stand], ignore_index=True)
-        data_double = pd.concat([data, data_double], ignore_index=True)
-        data_hit = pd.concat([data, data_hit], ignore_index=True)
-        
-        combos_for_total = combos[player_amt]
-        
-        for dealer_card_rank in list(range(9)) + [12]:
-            pool_args = [(iterations_per_thread, dealer_card_rank, combos_for_total, game_config, data_hit, data_double, data_stand) for _ in range(num_threads)]
-
-            with multiprocessing.Pool(processes=num_threads) as pool:
-                results = pool.map(simulate_player_total_worker, pool_args)
-
-            hit_total = 0
-            double_total = 0
-            stand_total = 0
-            for res_hit, res_double, res_stand in results:
-                hit_total += res_hit
-                double_total += res_double
-                stand_total += res_stand
-            
-            total_iterations = num_threads * iterations_per_thread
-            data = pd.concat([data, pd.DataFrame({'player_total': [str(player_amt)], 'dealer_card_up': [str(card.Card().from_ints(dealer_card_rank, 0).get_card_value())], 'double': [double_total/total_iterations], 'hit': [hit_total/total_iterations], 'stand': [stand_total/total_iterations]})], ignore_index=True)
-            data['best_action'] = data.apply(determine_best_action, axis=1)
-            print(f"  Completed dealer card {card.Card().from_ints(dealer_card_rank, 0).get_card_value()}")
-        
-        player_total_end = time.time()
-        data.to_csv(args.output_file_name, index=False)
-        print(f"Player total {player_amt} completed in {player_total_end - player_total_start:.2f} seconds")
-        
-    data['player_total'] = data['player_total'].astype(str)
-    data['dealer_card_up'] = data['dealer_card_up'].astype(str)
-    data = data[~data['player_total'].str.startswith('paired')]
-
-    combos = build_combos()
-    player_amts = ['paired_20', 'paired_18', 'paired_16', 'paired_14', 'paired_12', 'paired_10', 'paired_8', 'paired_6', 'paired_4', 'paired_aces']
-    if args.start_at is not None and args.start_at in player_amts:
-        player_amts = player_amts[player_amts.index(args.start_at):]
-    elif args.start_at is not None:
-        player_amts = []
-    for player_amt in player_amts:
-        print(f"Processing player total {player_amt}...")
-        player_total_start = time.time()
-        
-        data_stand = data[data['player_total'] == '20'].copy()
-        data_stand['player_total'] = player_amt
-        data_stand.drop_duplicates(subset=['player_total', 'dealer_card_up'], inplace=True)
-        data_stand['best_action'] = 'stand'
-        data_double = data_stand.copy()
-        data_double['best_action'] = 'double'
-        data_hit = data_double.copy()
-        data_hit['best_action'] = 'hit'
-        data_split = data_hit.copy()
-        data_split['best_action'] = 'split'
-        
-        data_stand = pd.concat([data, data_stand], ignore_index=True)
-        data_double = pd.concat([data, data_double], ignore_index=True)
-        data_hit = pd.concat([data, data_hit], ignore_index=True)
-        data_split = pd.concat([data, data_split], ignore_index=True)
-        
-        combos_for_total = combos[player_amt]
-        game_config = gc.GameConfig(6, args.dealer_hit_soft_17, args.double_after_split, args.surrender_allowed, args.blackjack_pays)
-        
-        for dealer_card_rank in list(range(9)) + [12]:
-            pool_args = [(iterations_per_thread, dealer_card_rank, combos_for_total, game_config, data_hit, data_double, data_stand, data_split) for _ in range(num_threads)]
-
-            with multiprocessing.Pool(processes=num_threads) as pool:
-                results = pool.map(simulate_player_total_worker_splitable, pool_args)
-
-            hit_total = 0
-            double_total = 0
-            stand_total = 0
-            split_total = 0
-            for res_hit, res_double, res_stand, res_split in results:
-                hit_total += res_hit
-                double_total += res_double
-                stand_total += res_stand
-                split_total += res_split
-            
-            total_iterations = num_threads * iterations_per_thread
-            data = pd.concat([data, pd.DataFrame({'player_total': [str(player_amt)], 'dealer_card_up': [str(card.Card().from_ints(dealer_card_rank, 0).get_card_value())], 'double': [double_total/total_iterations], 'hit': [hit_total/total_iterations], 'stand': [stand_total/total_iterations], 'split': [split_total/total_iterations]})], ignore_index=True)
-            data['best_action'] = data.apply(determine_best_action, axis=1)
-            print(f"  Completed dealer card {card.Card().from_ints(dealer_card_rank, 0).get_card_value()}")
-        
-        player_total_end = time.time()
-        data.to_csv(args.output_file_name, index=False)
-        print(f"Player total {player_amt} completed in {player_total_end - player_total_start:.2f} seconds")
-            
-    data.to_csv(args.output_file_name, index=False)
+        game_config = gc.GameConfig(DECKS_IN_SHOE, args.dealer_hit_soft_17, args.double_after_split, args.surrender_allowed, args.blackjack_pays)
+        runs = [OddsRun(args, game_config, 0, args.output_file_name)]
 
-    player_totals_end_time = time.time()
-    print(f"\nPLAYER TOTALS simulations completed in {player_totals_end_time - player_totals_start_time:.2f} seconds\n")
+    events = EventLog(args.events)
+    with events.phase('load'):
+        loaded = all([run.load() for run in runs])
+    if not loaded:
+        events.close()
+        return
+    run_tables(args, runs, events)
+    with events.phase('write'):
+        for run in runs:
+            run.finish()
 
-    end_time = time.time()
-    total_time = end_time - start_time
+    total_time = time.time() - start_time
     print(f"\n=== TIMING SUMMARY ===")
-    print(f"Stand simulations: {stand_end_time - stand_start_time:.2f} seconds")
-    print(f"Hit/Double simulations: {hit_end_time - hit_start_time:.2f} seconds")
-    print(f"Player totals simulations: {player_totals_end_time - player_totals_start_time:.2f} seconds")
+    for run in runs:
+        run.print_summary()
     print(f"Total execution time: {total_time:.2f} seconds")
-    print(f"Results saved to {args.output_file_name}")
+    events.emit('phase', phase='total', seconds=total_time)
+    events.close()
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
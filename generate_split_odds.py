@@ -1,17 +1,40 @@
-import pandas as pd
 import blackjack_utils.game_config as gc
 import blackjack_utils.shoe as shoe
 import blackjack_utils.card as card
 import random
 import blackjack_utils.deck as deck
 from blackjack_utils.utils import simulate_hand, build_combos, determine_best_action
-import threading
+from blackjack_utils.strategy_table import StrategyTable
+from blackjack_utils.scheduler import CellScheduler
+from blackjack_utils.shared_tables import SharedStrategyTables
+from blackjack_utils.streams import seed_stream, chunk_sizes
 import multiprocessing
 import time
 
+# each chunk of a cell gets its own random stream from the seed, so results don't depend on the number of threads (None for unseeded)
+SEED = None
+CHUNK_ITERATIONS = 5_000
+
+# per run state of a pool worker, set once by init_worker
+_worker = {}
+
+def init_worker(tables_name, game_config):
+    """Pool initializer, attaches to the shared strategy table so tasks only pass a few integers"""
+    _worker['tables'] = SharedStrategyTables.attach(tables_name, 1)
+    _worker['strategy'] = _worker['tables'].table(0)
+    _worker['forced'] = {}
+    _worker['game_config'] = game_config
+    _worker['combos'] = build_combos()
+
 def simulate_player_total_worker(args):
     """Worker function for player total simulation"""
-    num_iterations, dealer_card_rank, combos_for_total, game_config, data_hit, data_double, data_stand, data_split = args
+    num_iterations, dealer_card_rank, player_amt, chunk_index = args
+    seed_stream(SEED, player_amt, dealer_card_rank, chunk_index)
+    game_config = _worker['game_config']
+    combos_for_total = _worker['combos'][player_amt]
+    if player_amt not in _worker['forced']:
+        _worker['forced'][player_amt] = [_worker['strategy'].with_action(player_amt, action) for action in ['hit', 'double', 'stand', 'split']]
+    data_hit, data_double, data_stand, data_split = _worker['forced'][player_amt]
     local_hit_total = 0
     local_double_total = 0
     local_stand_total = 0
@@ -33,10 +56,12 @@ def simulate_player_total_worker(args):
     return (local_hit_total, local_double_total, local_stand_total, local_split_total)
 
 def main():
+    # only the csv in and out needs pandas, the spawned workers don't import it
+    import pandas as pd
     print("Starting odds generation...")
     start_time = time.time()
     num_threads = 12
-    iterations_per_thread = 50_000 // num_threads
+    chunks = chunk_sizes(50_000, CHUNK_ITERATIONS)
     player_totals_start_time = time.time()
 
     game_config = gc.GameConfig(6, True, True, True, 1.5)
@@ -47,55 +72,34 @@ def main():
     data['dealer_card_up'] = data['dealer_card_up'].astype(str)
     data = data[~data['player_total'].str.startswith('paired')]
 
-    combos = build_combos()
-    # now do it for 19-12
-    for player_amt in ['paired_18', 'paired_16', 'paired_14', 'paired_12', 'paired_10', 'paired_8', 'paired_6', 'paired_4', 'paired_aces']:
+    dealer_card_ranks = list(range(9)) + [12]
+    total_iterations = sum(chunks)
+    # the non-paired rows are already in odds.csv, so every paired total can be scheduled at once
+    strategy = StrategyTable.from_dataframe(data)
+    new_rows = {}
+
+    def make_tasks(player_amt):
         print(f"Processing player total {player_amt}...")
-        player_total_start = time.time()
-        
-        data_stand = data[data['player_total'] == '20'].copy()
-        data_stand['player_total'] = player_amt
-        data_stand.drop_duplicates(subset=['player_total', 'dealer_card_up'], inplace=True)
-        data_stand['best_action'] = 'stand'
-        data_double = data_stand.copy()
-        data_double['best_action'] = 'double'
-        data_hit = data_double.copy()
-        data_hit['best_action'] = 'hit'
-        data_split = data_hit.copy()
-        data_split['best_action'] = 'split'
-        
-        data_stand = pd.concat([data, data_stand], ignore_index=True)
-        data_double = pd.concat([data, data_double], ignore_index=True)
-        data_hit = pd.concat([data, data_hit], ignore_index=True)
-        data_split = pd.concat([data, data_split], ignore_index=True)
-        
-        combos_for_total = combos[player_amt]
-        game_config = gc.GameConfig(6, True, True, True, 1.5)
-        
-        for dealer_card_rank in list(range(9)) + [12]:
-            pool_args = [(iterations_per_thread, dealer_card_rank, combos_for_total, game_config, data_hit, data_double, data_stand, data_split) for _ in range(num_threads)]
+        return [(dealer_card_rank, simulate_player_total_worker, (chunk, dealer_card_rank, player_amt, chunk_index))
+                for dealer_card_rank in dealer_card_ranks for chunk_index, chunk in enumerate(chunks)]
+
+    def on_total_done(player_amt, results):
+        new_rows[player_amt] = []
+        for dealer_card_rank in dealer_card_ranks:
+            hit_total, double_total, stand_total, split_total = [sum(values) for values in zip(*results[dealer_card_rank])]
+            row = {'player_total': str(player_amt), 'dealer_card_up': str(card.Card().from_ints(dealer_card_rank, 0).get_card_value()), 'double': double_total/total_iterations, 'hit': hit_total/total_iterations, 'stand': stand_total/total_iterations, 'split': split_total/total_iterations}
+            row['best_action'] = determine_best_action(row)
+            new_rows[player_amt].append(row)
+        print(f"Player total {player_amt} completed")
 
-            with multiprocessing.Pool(processes=num_threads) as pool:
-                results = pool.map(simulate_player_total_worker, pool_args)
+    player_amts = ['paired_18', 'paired_16', 'paired_14', 'paired_12', 'paired_10', 'paired_8', 'paired_6', 'paired_4', 'paired_aces']
+    # the strategy table is published once in shared memory, workers attach to it in init_worker
+    with SharedStrategyTables(1) as tables:
+        tables.publish(0, strategy)
+        with multiprocessing.Pool(processes=num_threads, initializer=init_worker, initargs=(tables.name, game_config)) as pool:
+            CellScheduler(pool).run(player_amts, {}, make_tasks, on_total_done)
+    data = pd.concat([data, pd.DataFrame([row for player_amt in player_amts for row in new_rows[player_amt]])], ignore_index=True)
 
-            hit_total = 0
-            double_total = 0
-            stand_total = 0
-            split_total = 0
-            for res_hit, res_double, res_stand, res_split in results:
-                hit_total += res_hit
-                double_total += res_double
-                stand_total += res_stand
-                split_total += res_split
-            
-            total_iterations = num_threads * iterations_per_thread
-            data = pd.concat([data, pd.DataFrame({'player_total': [str(player_amt)], 'dealer_card_up': [str(card.Card().from_ints(dealer_card_rank, 0).get_card_value())], 'double': [double_total/total_iterations], 'hit': [hit_total/total_iterations], 'stand': [stand_total/total_iterations], 'split': [split_total/total_iterations]})], ignore_index=True)
-            data['best_action'] = data.apply(determine_best_action, axis=1)
-            print(f"  Completed dealer card {card.Card().from_ints(dealer_card_rank, 0).get_card_value()}")
-        
-        player_total_end = time.time()
-        print(f"Player total {player_amt} completed in {player_total_end - player_total_start:.2f} seconds")
-            
     data.to_csv('odds.csv', index=False)
 
     player_totals_end_time = time.time()
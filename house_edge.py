@@ -1,7 +1,11 @@
-import pandas as pd
 import blackjack_utils.game_config as gc
 import blackjack_utils.shoe as shoe
+from blackjack_utils.compact import HandState
 from blackjack_utils.utils import simulate_hand
+from blackjack_utils.strategy_table import StrategyTable
+from blackjack_utils.shared_tables import SharedStrategyTables
+from blackjack_utils.stats import RunningStats
+from blackjack_utils.streams import seed_stream, chunk_sizes
 
 import multiprocessing
 import time
@@ -13,20 +17,43 @@ SURRENDER_ALLOWED = True
 BLACKJACK_PAYS = 6/5
 
 SAMPLE_SIZE = 4_000_000
+# each chunk of hands gets its own random stream from the seed, so results don't depend on the number of processes (None for unseeded)
+SEED = None
+CHUNK_SIZE = 50_000
+ENGINE = 'batch' # 'compact' or 'cards' to play hand by hand with simulate_hand, 'session' to deal rounds from multi-round shoes
+# for the session engine
+NUM_SEATS = 1
+PENETRATION = 0.75
 
-def run_simulation_batch(batch_size, game_config, data):
+# per run state of a pool worker, set once by init_worker
+_worker = {}
+
+def init_worker(tables_name, game_config):
+    """Pool initializer, attaches to the shared strategy table so tasks only pass a batch size."""
+    tables = SharedStrategyTables.attach(tables_name, 1)
+    _worker['tables'] = tables
+    _worker['data'] = tables.table(0)
+    _worker['game_config'] = game_config
+
+def run_simulation_batch(args):
     """Runs a batch of simulations and returns the total outcome."""
+    batch_size, chunk_index = args
+    seed_stream(SEED, 'house_edge', ENGINE, chunk_index)
+    game_config = _worker['game_config']
+    data = _worker['data']
     local_outcomes = 0.0
     for _ in range(batch_size):
-        deck = shoe.Shoe(6)
-        deck.shuffle()
+        # draws lazily from the cards left, so there is no full shuffle per hand
+        deck = shoe.LazyShoe(6, compact=ENGINE == 'compact')
         player_cards = [deck.draw(), deck.draw()]
+        if ENGINE == 'compact':
+            player_cards = HandState.from_ranks(*player_cards)
         dealer_card_up = deck.draw()
         local_outcomes += simulate_hand(game_config, player_cards, dealer_card_up, deck, data)
     return local_outcomes
 
 if __name__ == '__main__':
-    data = pd.read_csv(OUTPUT_FILE_NAME, dtype={'dealer_card_up': str})
+    data = StrategyTable.from_csv(OUTPUT_FILE_NAME)
     game_config = gc.GameConfig(
         decks_in_shoe=6, 
         dealer_hit_soft_17=DEALER_HIT_SOFT_17, 
@@ -35,31 +62,46 @@ if __name__ == '__main__':
         blackjack_pays=BLACKJACK_PAYS
     )
 
-    num_processes = multiprocessing.cpu_count()
-    batch_size = SAMPLE_SIZE // num_processes
-    
-    # Handle any remainder
-    batch_sizes = [batch_size] * num_processes
-    batch_sizes[-1] += SAMPLE_SIZE % num_processes
+    if ENGINE == 'batch':
+        from blackjack_utils.batch import simulate_batch
+        start_time = time.time()
+        print(f"Running {SAMPLE_SIZE:,} simulations with the batch engine.")
+        result = simulate_batch(game_config, data, SAMPLE_SIZE, seed=SEED)
+        print(f"Result: {result.mean} (standard error {result.standard_error})")
+        print(f"Outcome histogram: {result.histogram}")
+        print(f"Total duration: {time.time() - start_time:.2f} seconds")
+
+    elif ENGINE == 'session':
+        from blackjack_utils.session import Session
+        start_time = time.time()
+        num_rounds = SAMPLE_SIZE // NUM_SEATS
+        print(f"Running {num_rounds:,} rounds of {NUM_SEATS} seats, reshuffling at {PENETRATION:.0%} penetration.")
+        seed_stream(SEED, 'house_edge', ENGINE)
+        session = Session(game_config, data, num_seats=NUM_SEATS, penetration=PENETRATION)
+        stats = RunningStats.combine(session.play(num_rounds))
+        print(f"Result: {stats.mean} (standard error {stats.standard_error}, treating the seats as independent)")
+        print(f"Shoes shuffled: {session.shoe_number + 1:,}")
+        print(f"Total duration: {time.time() - start_time:.2f} seconds")
 
-    # Prepare arguments for each process
-    # Note: passing large dataframes can be slow due to pickling, but for this size it should be fine.
-    # Alternatively, we could load data inside the worker if it was read-only and loaded from disk, 
-    # but here we pass it.
-    args = [(b, game_config, data) for b in batch_sizes]
+    else:
+        num_processes = multiprocessing.cpu_count()
+        batch_sizes = chunk_sizes(SAMPLE_SIZE, CHUNK_SIZE)
 
-    start_time = time.time()
-    print(f"Starting simulation at {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(start_time))}")
-    print(f"Running {SAMPLE_SIZE:,} simulations across {num_processes} processes.")
-    print(f"Target simulations per process: {batch_size:,} (last process takes remainder: {batch_sizes[-1]:,})")
+        start_time = time.time()
+        print(f"Starting simulation at {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(start_time))}")
+        print(f"Running {SAMPLE_SIZE:,} simulations across {num_processes} processes.")
+        print(f"Simulations per chunk: {CHUNK_SIZE:,} ({len(batch_sizes)} chunks, the last one has {batch_sizes[-1]:,})")
 
-    with multiprocessing.Pool(processes=num_processes) as pool:
-        results = pool.starmap(run_simulation_batch, args)
+        # the strategy table is published once in shared memory, workers attach to it in init_worker
+        with SharedStrategyTables(1) as tables:
+            tables.publish(0, data)
+            with multiprocessing.Pool(processes=num_processes, initializer=init_worker, initargs=(tables.name, game_config)) as pool:
+                results = pool.map(run_simulation_batch, [(batch_size, chunk_index) for chunk_index, batch_size in enumerate(batch_sizes)])
 
-    total_outcomes = sum(results)
-    print(f"Result: {total_outcomes / SAMPLE_SIZE}")
+        total_outcomes = sum(results)
+        print(f"Result: {total_outcomes / SAMPLE_SIZE}")
     
-    end_time = time.time()
-    duration = end_time - start_time
-    print(f"Finished at {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(end_time))}")
-    print(f"Total duration: {duration:.2f} seconds")
\ No newline at end of file
+        end_time = time.time()
+        duration = end_time - start_time
+        print(f"Finished at {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(end_time))}")
+        print(f"Total duration: {duration:.2f} seconds")
\ No newline at end of file
@@ -1,11 +1,67 @@
-import os
+import argparse
+import hashlib
+import io
 import os
 import psycopg2
-from psycopg2 import extras
 import pandas as pd
 from dotenv import load_dotenv
 import numpy as np
 
+# count bucketed tables (generate_odds.py --true_count) have a row per count bucket for each cell, they aren't loaded
+COUNT_ODDS_SUFFIX = '_count_odds.csv'
+
+# the blackjack_odds columns loaded from each csv (id is generated)
+ODDS_COLUMNS = ['player_total', 'dealer_card_up', 'double_ev', 'hit_ev', 'stand_ev', 'split_ev',
+                'best_action', 'dealer_hit_soft_17', 'double_after_split', 'blackjack_pays', 'surrender_allowed']
+
+# content hash of every csv loaded, so unchanged files are skipped on the next load
+LEDGER_SCHEMA = """
+CREATE TABLE IF NOT EXISTS loaded_files (
+    file_name VARCHAR(255) PRIMARY KEY,
+    content_hash CHAR(64) NOT NULL,
+    rows_loaded INTEGER NOT NULL,
+    loaded_at TIMESTAMP NOT NULL DEFAULT now()
+);
+"""
+
+# temp table the csv is copied into, emptied at the end of each file's transaction
+STAGING_SCHEMA = """
+CREATE TEMP TABLE IF NOT EXISTS blackjack_odds_staging (
+    player_total VARCHAR(20),
+    dealer_card_up VARCHAR(10),
+    double_ev FLOAT,
+    hit_ev FLOAT,
+    stand_ev FLOAT,
+    split_ev FLOAT,
+    best_action VARCHAR(10),
+    dealer_hit_soft_17 BOOLEAN,
+    double_after_split BOOLEAN,
+    blackjack_pays FLOAT,
+    surrender_allowed BOOLEAN
+) ON COMMIT DELETE ROWS;
+"""
+
+COPY_QUERY = f"COPY blackjack_odds_staging ({', '.join(ODDS_COLUMNS)}) FROM STDIN WITH (FORMAT csv)"
+
+# one set-based upsert of the staged rows, and the file's ledger entry, in a single round trip
+MERGE_QUERY = f"""
+INSERT INTO blackjack_odds ({', '.join(ODDS_COLUMNS)})
+SELECT {', '.join(ODDS_COLUMNS)} FROM blackjack_odds_staging
+ON CONFLICT (player_total, dealer_card_up, dealer_hit_soft_17, double_after_split, blackjack_pays, surrender_allowed)
+DO UPDATE SET
+double_ev = EXCLUDED.double_ev,
+hit_ev = EXCLUDED.hit_ev,
+stand_ev = EXCLUDED.stand_ev,
+split_ev = EXCLUDED.split_ev,
+best_action = EXCLUDED.best_action;
+INSERT INTO loaded_files (file_name, content_hash, rows_loaded, loaded_at)
+VALUES (%(file_name)s, %(content_hash)s, %(rows_loaded)s, now())
+ON CONFLICT (file_name) DO UPDATE SET
+content_hash = EXCLUDED.content_hash,
+rows_loaded = EXCLUDED.rows_loaded,
+loaded_at = EXCLUDED.loaded_at;
+"""
+
 def create_table(conn):
     """Creates the blackjack_odds table using the schema.sql file."""
     with conn.cursor() as cur:
@@ -13,6 +69,7 @@ def create_table(conn):
         with open('schema.sql', 'r') as f:
             # Drop the table if it exists to ensure a clean slate
             cur.execute("DROP TABLE IF EXISTS blackjack_odds;")
+            cur.execute("DROP TABLE IF EXISTS loaded_files;")
             cur.execute(f.read())
         print("Table 'blackjack_odds' created successfully.")
     conn.commit()
@@ -25,18 +82,112 @@ def parse_filename(filename):
         'blackjack_pays': 1.5,
         'surrender_allowed': True  # Based on generate_odds.py, this is always true
     }
-    
+
     if 'hit_soft_17' in filename:
         rules['dealer_hit_soft_17'] = True
     if 'double_after_splitting' in filename or 'double_after_split' in filename:
         rules['double_after_split'] = True
     if '6-5' in filename:
         rules['blackjack_pays'] = 1.2 # 6/5
-        
+
     return rules
 
+def file_hash(file_path):
+    """:return: sha256 hex digest of the file's contents"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def loaded_hashes(conn):
+    """:return: dict of file name -> content hash for every file in the ledger"""
+    with conn.cursor() as cur:
+        cur.execute("SELECT file_name, content_hash FROM loaded_files;")
+        return dict(cur.fetchall())
+
+def staging_csv(file_path, rules):
+    """
+    Reads an odds csv and adds the rule columns from its file name
+    :return: (csv text in ODDS_COLUMNS order with no header, for COPY, number of rows)
+    """
+    df = pd.read_csv(file_path)
+
+    # Add rule columns
+    df['dealer_hit_soft_17'] = rules['dealer_hit_soft_17']
+    df['double_after_split'] = rules['double_after_split']
+    df['blackjack_pays'] = rules['blackjack_pays']
+    df['surrender_allowed'] = rules['surrender_allowed']
+
+    # Rename columns to match DB schema
+    df.rename(columns={
+        'double': 'double_ev',
+        'hit': 'hit_ev',
+        'stand': 'stand_ev',
+        'split': 'split_ev'
+    }, inplace=True)
+
+    # Ensure all required columns are present
+    if 'split_ev' not in df.columns:
+        df['split_ev'] = np.nan
+
+    # missing values are written as empty unquoted fields, which COPY reads as NULL
+    return df[ODDS_COLUMNS].to_csv(index=False, header=False), len(df)
+
+def load_file(conn, file_path, content_hash=None):
+    """
+    Loads one odds csv in its own transaction: COPY into the staging table, then a single upsert into
+    blackjack_odds along with the file's ledger entry. Nothing from the file is kept if any step fails.
+    :param content_hash: file_hash(file_path), if already computed
+    :return: the number of rows loaded
+    """
+    file_name = os.path.basename(file_path)
+    payload, rows_loaded = staging_csv(file_path, parse_filename(file_name))
+    try:
+        with conn.cursor() as cur:
+            cur.execute(STAGING_SCHEMA)
+            cur.copy_expert(COPY_QUERY, io.StringIO(payload))
+            cur.execute(MERGE_QUERY, {'file_name': file_name, 'content_hash': content_hash or file_hash(file_path), 'rows_loaded': rows_loaded})
+        conn.commit()
+    except psycopg2.Error:
+        conn.rollback()
+        raise
+    return rows_loaded
+
+def load_directory(conn, data_dir='data2', force=False):
+    """
+    Loads every odds csv in a directory, skipping files whose contents match the ledger (and count bucketed tables)
+    :param force: load every file, even unchanged ones
+    :return: dict of file name -> rows loaded (0 for skipped files)
+    """
+    with conn.cursor() as cur:
+        cur.execute(LEDGER_SCHEMA)
+    conn.commit()
+    previous = {} if force else loaded_hashes(conn)
+
+    loaded = {}
+    for csv_file in sorted(f for f in os.listdir(data_dir) if f.endswith('.csv')):
+        if csv_file.endswith(COUNT_ODDS_SUFFIX):
+            print(f"Skipping {csv_file}, count bucketed tables aren't loaded.")
+            continue
+        file_path = os.path.join(data_dir, csv_file)
+        content_hash = file_hash(file_path)
+        if previous.get(csv_file) == content_hash:
+            print(f"Skipping {csv_file}, unchanged since it was loaded.")
+            loaded[csv_file] = 0
+            continue
+        print(f"Processing {csv_file}...")
+        loaded[csv_file] = load_file(conn, file_path, content_hash)
+        print(f"  -> Loaded {loaded[csv_file]} rows from {csv_file}.")
+    return loaded
+
 def main():
     """Main function to load data from CSVs into the PostgreSQL database."""
+    parser = argparse.ArgumentParser(description='Load odds csvs into the blackjack_odds table')
+    parser.add_argument('--data_dir', type=str, default='data2', help='Directory of odds csvs to load (default: data2)')
+    parser.add_argument('--force', action='store_true', help='Reload every file, even ones unchanged since they were last loaded')
+    args = parser.parse_args()
+
     load_dotenv()
     db_conn_string = os.getenv("DATABASE_CONN_STRING")
     if not db_conn_string:
@@ -51,62 +202,7 @@ def main():
 
         # create_table(conn)
 
-        data_dir = 'data2'
-        csv_files = [f for f in os.listdir(data_dir) if f.endswith('.csv')]
-
-        with conn.cursor() as cur:
-            for csv_file in csv_files:
-                print(f"Processing {csv_file}...")
-                rules = parse_filename(csv_file)
-                
-                file_path = os.path.join(data_dir, csv_file)
-                df = pd.read_csv(file_path)
-
-                # Add rule columns
-                df['dealer_hit_soft_17'] = rules['dealer_hit_soft_17']
-                df['double_after_split'] = rules['double_after_split']
-                df['blackjack_pays'] = rules['blackjack_pays']
-                df['surrender_allowed'] = rules['surrender_allowed']
-
-                # Rename columns to match DB schema
-                df.rename(columns={
-                    'double': 'double_ev',
-                    'hit': 'hit_ev',
-                    'stand': 'stand_ev',
-                    'split': 'split_ev'
-                }, inplace=True)
-                
-                # Ensure all required columns are present
-                if 'split_ev' not in df.columns:
-                    df['split_ev'] = np.nan
-
-                # Reorder columns to match the table definition for insertion
-                df = df[['player_total', 'dealer_card_up', 'double_ev', 'hit_ev', 'stand_ev', 'split_ev', 
-                         'best_action', 'dealer_hit_soft_17', 'double_after_split', 'blackjack_pays', 'surrender_allowed']]
-
-                # Convert DataFrame to list of tuples for insertion
-                data_to_insert = [tuple(row) for row in df.itertuples(index=False)]
-
-                # SQL INSERT statement
-                insert_query = """
-                INSERT INTO blackjack_odds (player_total, dealer_card_up, double_ev, hit_ev, stand_ev, split_ev, 
-                                          best_action, dealer_hit_soft_17, double_after_split, blackjack_pays, surrender_allowed)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                ON CONFLICT (player_total, dealer_card_up, dealer_hit_soft_17, double_after_split, blackjack_pays, surrender_allowed) 
-                DO UPDATE SET 
-                double_ev = EXCLUDED.double_ev,
-                hit_ev = EXCLUDED.hit_ev,
-                stand_ev = EXCLUDED.stand_ev,
-                split_ev = EXCLUDED.split_ev,
-                best_action = EXCLUDED.best_action;
-                """
-                
-                # Insert data row by row
-                for record in data_to_insert:
-                    cur.execute(insert_query, record)
-                print(f"  -> Inserted {len(data_to_insert)} rows from {csv_file}.")
-
-        conn.commit()
+        load_directory(conn, args.data_dir, args.force)
         print("\nAll data has been successfully loaded into the database.")
 
     except psycopg2.Error as e:
@@ -1,3 +1,18 @@
+# every rule set in one job (one csv per config in data2/, rows that do not depend on the varying rule are simulated once)
+# python generate_odds.py --num_threads 14 --iterations 700000 --sweep --output_dir data2
+# binary copies of the odds tables (memory mapped by blackjack_utils.odds_file.OddsTable.load and StrategyIndex.from_directory)
+# python -m blackjack_utils.odds_file --data_dir data2
+# more iterations for the close cells of a finished table (merged with the <csv>.stats.jsonl kept next to it)
+# python generate_odds.py --num_threads 14 --iterations 700000 --output_file_name "data2\double_after_splitting_odds.csv" --dealer_hit_soft_17 False --top_up unresolved
+# tables of the same rules simulated on different machines (different --seed) merged into one
+# python generate_odds.py --merge "run_a\double_after_splitting_odds.csv" "run_b\double_after_splitting_odds.csv" --output_file_name "data2\double_after_splitting_odds.csv"
+# one table spread over several machines: the coordinator writes the (config, cell, chunk) shards to a shared directory,
+# workers on any machine that mounts it (at the same path) claim them, same results as a local run with the same --seed
+# python generate_odds.py --iterations 700000 --seed 1 --output_file_name "data2\double_after_splitting_odds.csv" --dealer_hit_soft_17 False --shard_dir "\\nas\sims\shards" --local_workers 14
+# python generate_odds.py --shard_worker "\\nas\sims\shards"
+# hi-lo true count bucketed table (blackjack_utils.counting.CountStrategyTable.from_csv), --iterations is rounds dealt
+# (kept out of data2, which load_data.py and StrategyIndex read one row per cell from)
+# python generate_odds.py --num_threads 14 --iterations 20000000 --true_count --output_file_name "data_count\double_after_splitting_hit_soft_17_count_odds.csv"
 python generate_odds.py --num_threads 14 --iterations 700000 --output_file_name "data2\double_after_splitting_odds.csv" --dealer_hit_soft_17 False --double_after_split True --blackjack_pays 1.5 --start_at "paired_4"
 python generate_odds.py --num_threads 14 --iterations 700000 --output_file_name "data2\6-5_double_after_splitting_hit_soft_17_odds.csv" --dealer_hit_soft_17 True --double_after_split True --blackjack_pays 1.2 --start_at "paired_10"
 python generate_odds.py --num_threads 14 --iterations 700000 --output_file_name "data2\6-5_double_after_split_odds.csv" --dealer_hit_soft_17 False --double_after_split True --blackjack_pays 1.2 --start_at "soft_13"
\ No newline at end of file
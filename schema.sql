@@ -13,3 +13,10 @@ CREATE TABLE blackjack_odds (
     surrender_allowed BOOLEAN NOT NULL,
     UNIQUE (player_total, dealer_card_up, dealer_hit_soft_17, double_after_split, blackjack_pays, surrender_allowed)
 );
+
+CREATE TABLE IF NOT EXISTS loaded_files (
+    file_name VARCHAR(255) PRIMARY KEY,
+    content_hash CHAR(64) NOT NULL,
+    rows_loaded INTEGER NOT NULL,
+    loaded_at TIMESTAMP NOT NULL DEFAULT now()
+);
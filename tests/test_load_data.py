@@ -0,0 +1,155 @@
+import csv
+import os
+
+import psycopg2
+import pytest
+
+import load_data
+
+ROWS = [
+    {'double': -1.7, 'hit': -0.85, 'stand': 0.63, 'player_total': '20', 'dealer_card_up': '2', 'best_action': 'stand', 'split': ''},
+    {'double': -0.4, 'hit': -0.3, 'stand': -0.5, 'player_total': '16', 'dealer_card_up': '10', 'best_action': 'hit', 'split': ''},
+    {'double': -0.9, 'hit': -0.2, 'stand': -0.5, 'player_total': 'paired_16', 'dealer_card_up': '10', 'best_action': 'split', 'split': -0.1},
+]
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        pass
+
+    def execute(self, query, params=None):
+        self.conn.calls.append(('execute', query, params))
+        if query == load_data.MERGE_QUERY:
+            if params['file_name'] in self.conn.fail_files:
+                raise psycopg2.Error(f"merge of {params['file_name']} failed")
+            self.conn.pending[params['file_name']] = params['content_hash']
+        elif query.startswith('SELECT file_name, content_hash'):
+            self.result = list(self.conn.ledger.items())
+
+    def copy_expert(self, query, file):
+        self.conn.calls.append(('copy', query, file.read()))
+
+    def fetchall(self):
+        return self.result
+
+
+class FakeConnection:
+    """
+    Stands in for a psycopg2 connection: records every statement and COPY, and keeps the loaded_files ledger
+    (entries only count once their transaction commits)
+    """
+
+    def __init__(self, fail_files=()):
+        self.calls = []
+        self.ledger = {}
+        self.pending = {}
+        self.fail_files = set(fail_files)
+        self.commits = 0
+        self.rollbacks = 0
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        self.ledger.update(self.pending)
+        self.pending = {}
+        self.commits += 1
+
+    def rollback(self):
+        self.pending = {}
+        self.rollbacks += 1
+
+    def copies(self):
+        return [payload for kind, _, payload in self.calls if kind == 'copy']
+
+    def merges(self):
+        return [params['file_name'] for kind, query, params in self.calls if kind == 'execute' and query == load_data.MERGE_QUERY]
+
+
+def write_odds_csv(file_name, rows=ROWS):
+    with open(file_name, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+@pytest.fixture
+def data_dir(tmp_path):
+    write_odds_csv(tmp_path / 'double_after_splitting_hit_soft_17_odds.csv')
+    write_odds_csv(tmp_path / '6-5_stand_soft_17_odds.csv')
+    return str(tmp_path)
+
+
+def test_load_directory_copies_every_file_with_its_rules(data_dir):
+    conn = FakeConnection()
+    loaded = load_data.load_directory(conn, data_dir)
+    assert loaded == {'6-5_stand_soft_17_odds.csv': 3, 'double_after_splitting_hit_soft_17_odds.csv': 3}
+    six_five, double_after_split = [list(csv.reader(payload.splitlines())) for payload in conn.copies()]
+    # the rule columns come from the file name, in ODDS_COLUMNS order
+    assert [row[-4:] for row in six_five] == [['False', 'False', '1.2', 'True']] * 3
+    assert [row[-4:] for row in double_after_split] == [['True', 'True', '1.5', 'True']] * 3
+    # a missing split EV is an empty field, which COPY reads as NULL
+    assert [row[load_data.ODDS_COLUMNS.index('split_ev')] for row in six_five] == ['', '', '-0.1']
+    assert set(conn.ledger) == set(loaded)
+
+
+def test_one_round_trip_per_file(data_dir):
+    conn = FakeConnection()
+    load_data.load_directory(conn, data_dir)
+    file_calls = [call for call in conn.calls if call[1] != load_data.LEDGER_SCHEMA and not call[1].startswith('SELECT')]
+    # per file: create the staging table, COPY the rows, and one statement for the upsert and the ledger entry
+    assert [(kind, query) for kind, query, _ in file_calls] == [('execute', load_data.STAGING_SCHEMA), ('copy', load_data.COPY_QUERY),
+                                                                ('execute', load_data.MERGE_QUERY)] * 2
+    # the ledger schema commit, then one transaction per file
+    assert conn.commits == 3
+
+
+def test_unchanged_files_are_skipped(data_dir):
+    conn = FakeConnection()
+    load_data.load_directory(conn, data_dir)
+    conn.calls = []
+    loaded = load_data.load_directory(conn, data_dir)
+    assert loaded == {'6-5_stand_soft_17_odds.csv': 0, 'double_after_splitting_hit_soft_17_odds.csv': 0}
+    assert conn.copies() == []
+
+
+def test_changed_file_is_reloaded(data_dir):
+    conn = FakeConnection()
+    load_data.load_directory(conn, data_dir)
+    conn.calls = []
+    write_odds_csv(os.path.join(data_dir, '6-5_stand_soft_17_odds.csv'), ROWS[:2])
+    loaded = load_data.load_directory(conn, data_dir)
+    assert loaded == {'6-5_stand_soft_17_odds.csv': 2, 'double_after_splitting_hit_soft_17_odds.csv': 0}
+    assert conn.merges() == ['6-5_stand_soft_17_odds.csv']
+
+
+def test_force_reloads_unchanged_files(data_dir):
+    conn = FakeConnection()
+    load_data.load_directory(conn, data_dir)
+    conn.calls = []
+    loaded = load_data.load_directory(conn, data_dir, force=True)
+    assert loaded == {'6-5_stand_soft_17_odds.csv': 3, 'double_after_splitting_hit_soft_17_odds.csv': 3}
+    assert len(conn.copies()) == 2
+
+
+def test_failed_file_is_rolled_back_and_not_ledgered(data_dir):
+    conn = FakeConnection(fail_files={'6-5_stand_soft_17_odds.csv'})
+    with pytest.raises(psycopg2.Error):
+        load_data.load_directory(conn, data_dir)
+    assert conn.rollbacks == 1
+    assert conn.ledger == {}
+
+
+def test_count_bucketed_tables_are_not_loaded(data_dir):
+    # a row per count bucket for each cell, and a name that parses as the DAS/H17 rules
+    write_odds_csv(os.path.join(data_dir, 'double_after_splitting_hit_soft_17_count_odds.csv'), [dict(row, count_bucket=bucket) for bucket in (-1, 0, 1) for row in ROWS])
+    conn = FakeConnection()
+    loaded = load_data.load_directory(conn, data_dir)
+    assert loaded == {'6-5_stand_soft_17_odds.csv': 3, 'double_after_splitting_hit_soft_17_odds.csv': 3}
+    assert len(conn.copies()) == 2